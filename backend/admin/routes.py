@@ -1,17 +1,19 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import TaxSubmission, Payment
+from database import async_pool_metrics, get_db, pool_metrics, pool_status
+from models import TaxSubmission, Payment, User
 from auth.routes import get_current_user
+from tax_engine import recompute
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+class RecomputeRequest(BaseModel):
+    statuses: Optional[List[str]] = None  # None re-prices recompute.DEFAULT_STATUSES
+    tax_year: Optional[int] = None
+    chunk_size: int = Field(recompute.DEFAULT_CHUNK_SIZE, gt=0, le=recompute.MAX_CHUNK_SIZE)
+    workers: int = Field(recompute.DEFAULT_WORKERS, gt=0, le=recompute.MAX_WORKERS)
 
 def is_admin(user):
     # For demo, treat the first registered user as admin
@@ -29,7 +31,9 @@ def get_all_submissions(current_user = Depends(get_current_user), db: Session =
                 "user_email": s.user_email,
                 "status": s.status,
                 "submitted_at": s.submitted_at,
-                "filing_type": s.form_data,
+                "filing_type": s.filing_status,
+                "state": s.state,
+                "tax_year": s.tax_year,
                 "tax_owed": s.tax_owed,
                 "refund_amount": s.refund_amount
             } for s in subs
@@ -86,4 +90,43 @@ def get_all_users(
             "created_at": u.created_at.isoformat() if u.created_at else None,
             "is_active": getattr(u, 'is_active', True)
         } for u in users
-    ]
\ No newline at end of file
+    ]
+
+@router.post("/recompute")
+def start_recompute(req: RecomputeRequest, current_user = Depends(get_current_user)):
+    """Start re-pricing stored submissions with the current tax rules"""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    try:
+        job = recompute.start_recompute_job(
+            statuses=req.statuses,
+            tax_year=req.tax_year,
+            chunk_size=req.chunk_size,
+            workers=req.workers
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.to_dict()
+
+@router.get("/recompute")
+def get_recompute_status(current_user = Depends(get_current_user)):
+    """Get progress of the current or last recompute job"""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return recompute.current_job.to_dict()
+
+@router.get("/db-pool")
+def get_db_pool_stats(current_user = Depends(get_current_user)):
+    """Get connection pool occupancy, checkout wait times and overflow/timeout counts"""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return pool_status()
+
+@router.post("/db-pool/reset")
+def reset_db_pool_stats(current_user = Depends(get_current_user)):
+    """Reset the connection pool counters"""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    pool_metrics.reset()
+    async_pool_metrics.reset()
+    return pool_status()
@@ -1,16 +1,9 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from models import Document, User
-from database import SessionLocal
+from database import get_db
 from routes import routes  # This is your auth routes file
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 router = APIRouter()
 
 @router.get("/files/user-documents")
@@ -0,0 +1,180 @@
+"""Benchmark the draft lookup (user_email + status = 'draft') as tax_submissions grows.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_draft_lookup --sizes 10000 100000 1000000 --output draft.json
+
+Each size gets a fresh SQLite file with one draft and a few filed returns per
+user, plus a handful of heavy accounts (preparers) with thousands of filed
+returns each. The lookup is timed with three index layouts on the same data:
+no index, the original ``user_email`` index, and the composite
+``(user_email, status)`` index from the models. With the composite index the
+latency stays flat as the table grows, including for heavy accounts.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, create_engine, select, text
+
+from models import TaxSubmission
+
+table = TaxSubmission.__table__
+
+INDEXES = {index.name: index for index in table.indexes}
+# Index layouts to compare, by the models' index names
+LAYOUTS = {
+    "none": [],
+    "user_email": ["ix_tax_submissions_user_email"],
+    "user_email_status": ["ix_tax_submissions_user_email_status"],
+}
+
+def populate(engine, size: int, heavy_users: int, heavy_rows: int, seed: int) -> List[str]:
+    """Insert ``size`` submissions; returns the emails of the regular users."""
+    rng = random.Random(seed)
+    rows: List[Dict[str, Any]] = []
+    heavy_total = min(heavy_users * heavy_rows, size // 2)
+    for i in range(heavy_total):
+        rows.append({"id": f"h{i}", "user_email": f"preparer{i % heavy_users}@example.com",
+                     "user_id": i % heavy_users, "status": "submitted", "form_data": {}})
+    for h in range(heavy_users):
+        rows.append({"id": f"hd{h}", "user_email": f"preparer{h}@example.com",
+                     "user_id": h, "status": "draft", "form_data": {}})
+    emails = []
+    user = 0
+    while len(rows) < size:
+        email = f"user{user}@example.com"
+        emails.append(email)
+        filed = rng.randint(0, 4)
+        for n in range(filed):
+            rows.append({"id": f"u{user}-{n}", "user_email": email, "user_id": heavy_users + user,
+                         "status": rng.choice(["submitted", "accepted", "pending"]), "form_data": {}})
+        rows.append({"id": f"u{user}-d", "user_email": email, "user_id": heavy_users + user,
+                     "status": "draft", "form_data": {}})
+        user += 1
+    rng.shuffle(rows)
+    with engine.begin() as conn:
+        table.create(conn)
+        _drop_indexes(conn)
+        for start in range(0, len(rows), 50_000):
+            conn.execute(table.insert(), rows[start:start + 50_000])
+    return emails
+
+def _drop_indexes(conn) -> None:
+    for name in INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+def _use_layout(engine, layout: str) -> str:
+    with engine.begin() as conn:
+        _drop_indexes(conn)
+        for name in LAYOUTS[layout]:
+            INDEXES[name].create(conn)
+        conn.execute(text("ANALYZE"))
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM tax_submissions WHERE user_email = 'x' AND status = 'draft'"
+        )).all()
+    return "; ".join(row[-1] for row in plan)
+
+def _time_lookups(engine, emails: List[str], queries: int) -> Dict[str, float]:
+    stmt = select(table).where(table.c.user_email == bindparam("email"), table.c.status == "draft").limit(1)
+    timings = []
+    with engine.connect() as conn:
+        for i in range(queries):
+            email = emails[i % len(emails)]
+            started = time.perf_counter()
+            conn.execute(stmt, {"email": email}).first()
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "p50_us": round(timings[len(timings) // 2] * 1e6, 1),
+        "p95_us": round(timings[int(len(timings) * 0.95)] * 1e6, 1),
+        "mean_us": round(sum(timings) / len(timings) * 1e6, 1),
+    }
+
+def bench_size(size: int, args) -> List[Dict[str, Any]]:
+    workdir = tempfile.mkdtemp(prefix="draftbench-")
+    try:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        emails = populate(engine, size, args.heavy_users, args.heavy_rows, args.seed)
+        rng = random.Random(args.seed)
+        regular = rng.sample(emails, min(len(emails), args.queries))
+        heavy = [f"preparer{h}@example.com" for h in range(args.heavy_users)]
+        results = []
+        for layout in LAYOUTS:
+            if layout == "none" and size > args.max_unindexed:
+                continue  # full scans at this size only add minutes to the run
+            plan = _use_layout(engine, layout)
+            queries = args.queries if layout != "none" else max(10, args.queries // 100)
+            results.append({
+                "rows": size,
+                "layout": layout,
+                "plan": plan,
+                "regular": _time_lookups(engine, regular, queries),
+                "heavy": _time_lookups(engine, heavy, queries) if heavy else None,
+            })
+            print(f"{size:>9} {layout:<18} regular p50 {results[-1]['regular']['p50_us']:>9} us"
+                  + (f"  heavy p50 {results[-1]['heavy']['p50_us']:>9} us" if heavy else ""),
+                  file=sys.stderr)
+        engine.dispose()
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="tax_submissions row counts to test")
+    parser.add_argument("--queries", type=int, default=2000, help="lookups timed per layout")
+    parser.add_argument("--heavy-users", type=int, default=5, help="accounts with many filed returns")
+    parser.add_argument("--heavy-rows", type=int, default=5000, help="filed returns per heavy account")
+    parser.add_argument("--max-unindexed", type=int, default=100_000,
+                        help="largest size to time without any index")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        results += bench_size(size, args)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": args.sizes,
+            "queries": args.queries,
+            "heavy_users": args.heavy_users,
+            "heavy_rows": args.heavy_rows,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
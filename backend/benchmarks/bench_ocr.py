@@ -0,0 +1,313 @@
+"""OCR throughput and accuracy benchmark over a synthetic form corpus.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_ocr --count 5 --dpi 150 --dpi 300 --noise 0 --noise 0.05 --output ocr.json
+
+Pillow renders W-2, 1099-NEC and W-9 pages with known field values (boxes are
+placed where the layout templates expect them) as PNG and image-only PDF files
+at each DPI and noise level. Each backend (``real``: file_service.ocr,
+``mock``: file_service.ocr_mock) runs over the corpus in its own process so its
+peak RSS is its own; ``--tier`` repeats the real backend once per
+preprocessing tier. Results are written as JSON. The real backend needs the
+tesseract and poppler binaries and is skipped when they are missing.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+PAGE_INCHES = (8.5, 11)
+DOCUMENT_TYPES = ("W-2", "1099-NEC", "W-9")
+
+def _money(rng: random.Random, low: float, high: float) -> float:
+    return round(rng.uniform(low, high), 2)
+
+def _tin(rng: random.Random) -> str:
+    return f"{rng.randint(10, 99)}-{rng.randint(1000000, 9999999)}"
+
+def _font(dpi: int, points: float) -> ImageFont.ImageFont:
+    size = max(8, int(points * dpi / 72))
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+# Page text as (x, y, text, points); x/y are fractions of the page
+def _w2_page(values: Dict[str, Any]) -> List[Tuple[float, float, str, float]]:
+    return [
+        (0.04, 0.060, "a Employee's social security number", 7),
+        (0.04, 0.088, "b Employer identification number (EIN)", 7),
+        (0.04, 0.100, values["employer_ein"], 10),
+        (0.51, 0.058, "1 Wages, tips, other compensation", 7),
+        (0.51, 0.070, f"{values['wages']:,.2f}", 10),
+        (0.74, 0.058, "2 Federal income tax withheld", 7),
+        (0.74, 0.070, f"{values['federal_withholding']:,.2f}", 10),
+        (0.04, 0.42, "Form W-2 Wage and Tax Statement", 12),
+    ]
+
+def _nec_page(values: Dict[str, Any]) -> List[Tuple[float, float, str, float]]:
+    return [
+        (0.72, 0.05, "Nonemployee Compensation", 12),
+        (0.72, 0.08, "Form 1099-NEC", 10),
+        (0.04, 0.168, "PAYER'S TIN", 7),
+        (0.04, 0.185, values["payer_tin"], 10),
+        (0.51, 0.168, "1 Nonemployee compensation", 7),
+        (0.51, 0.185, f"{values['nonemployee_compensation']:,.2f}", 10),
+        (0.51, 0.23, "4 Federal income tax withheld", 7),
+    ]
+
+def _w9_page(values: Dict[str, Any]) -> List[Tuple[float, float, str, float]]:
+    return [
+        (0.04, 0.04, "Form W-9 Request for Taxpayer Identification Number and Certification", 12),
+        (0.04, 0.20, f"Part I Taxpayer Identification Number (TIN) {values['taxpayer_id']}", 9),
+    ]
+
+def make_values(document_type: str, rng: random.Random) -> Dict[str, Any]:
+    if document_type == "W-2":
+        return {"employer_ein": _tin(rng), "wages": _money(rng, 20000, 180000),
+                "federal_withholding": _money(rng, 1000, 30000)}
+    if document_type == "1099-NEC":
+        return {"payer_tin": _tin(rng), "nonemployee_compensation": _money(rng, 1000, 90000)}
+    return {"taxpayer_id": _tin(rng)}
+
+PAGE_BUILDERS = {"W-2": _w2_page, "1099-NEC": _nec_page, "W-9": _w9_page}
+
+def render_page(document_type: str, values: Dict[str, Any], dpi: int, noise: float,
+                rng: random.Random) -> Image.Image:
+    """A letter-size page with the form's labels and values; ``noise`` is the speckle fraction."""
+    size = (int(PAGE_INCHES[0] * dpi), int(PAGE_INCHES[1] * dpi))
+    page = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(page)
+    for x, y, text, points in PAGE_BUILDERS[document_type](values):
+        draw.text((x * size[0], y * size[1]), text, fill=0, font=_font(dpi, points))
+    if noise:
+        pixels = page.load()
+        for _ in range(int(size[0] * size[1] * noise)):
+            pixels[rng.randrange(size[0]), rng.randrange(size[1])] = rng.choice((0, 255))
+        # Scans are rarely straight
+        page = page.rotate(rng.uniform(-1.5, 1.5) * noise * 10, fillcolor=255, expand=False)
+    return page
+
+def _filler_page(dpi: int) -> Image.Image:
+    size = (int(PAGE_INCHES[0] * dpi), int(PAGE_INCHES[1] * dpi))
+    page = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(page)
+    font = _font(dpi, 9)
+    for line in range(40):
+        draw.text((0.06 * size[0], (0.05 + line * 0.022) * size[1]),
+                  "Instructions for recipient. Keep this copy for your records.", fill=0, font=font)
+    return page
+
+def make_corpus(directory: str, count: int, dpis: List[int], noises: List[float], formats: List[str],
+                pages: int, seed: int) -> List[Dict[str, Any]]:
+    """Write the corpus to ``directory`` and return its manifest."""
+    rng = random.Random(seed)
+    manifest = []
+    for document_type in DOCUMENT_TYPES:
+        for dpi in dpis:
+            for noise in noises:
+                for i in range(count):
+                    values = make_values(document_type, rng)
+                    page = render_page(document_type, values, dpi, noise, rng)
+                    slug = document_type.lower().replace("-", "")
+                    for fmt in formats:
+                        path = os.path.join(directory, f"{slug}-{dpi}dpi-n{noise:g}-{i:03d}.{fmt}")
+                        if fmt == "pdf":
+                            extra = [_filler_page(dpi) for _ in range(pages - 1)]
+                            page.save(path, "PDF", resolution=dpi, save_all=True, append_images=extra)
+                        else:
+                            page.save(path, dpi=(dpi, dpi))
+                        manifest.append({
+                            "path": path,
+                            "document_type": document_type,
+                            "values": values,
+                            "dpi": dpi,
+                            "noise": noise,
+                            "format": fmt,
+                            "pages": pages if fmt == "pdf" else 1,
+                        })
+    return manifest
+
+def _matches(expected: Any, actual: Any) -> bool:
+    if isinstance(expected, float):
+        try:
+            return abs(float(actual) - expected) < 0.005
+        except (TypeError, ValueError):
+            return False
+    return expected == actual
+
+def _percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+def _peak_rss_kb() -> Dict[str, int]:
+    # ru_maxrss is KiB on Linux; tesseract and pdftoppm run as child processes
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+def run_backend(name: str, manifest: List[Dict[str, Any]], tier: Optional[str] = None) -> Dict[str, Any]:
+    if name == "real":
+        from file_service.ocr import extract_document_data as real_extract
+
+        def extract_document_data(path, content_type):
+            return real_extract(path, content_type, tier)
+    else:
+        from file_service.ocr_mock import extract_document_data
+
+    latencies, errors = [], 0
+    stage_ms: Dict[str, float] = {}
+    fields_total = fields_correct = types_correct = 0
+    groups: Dict[str, Dict[str, int]] = {}
+    paths: Dict[str, int] = {}
+    pages = 0
+    started = time.perf_counter()
+    for item in manifest:
+        t0 = time.perf_counter()
+        try:
+            result = extract_document_data(item["path"], "application/pdf" if item["format"] == "pdf" else "image/png")
+        except Exception as e:
+            print(f"{name}: {os.path.basename(item['path'])}: {e}", file=sys.stderr)
+            result, errors = {}, errors + 1
+        latencies.append(time.perf_counter() - t0)
+        pages += item["pages"]
+
+        correct = sum(_matches(v, result.get(k)) for k, v in item["values"].items())
+        fields_total += len(item["values"])
+        fields_correct += correct
+        types_correct += result.get("document_type") == item["document_type"]
+        group = groups.setdefault(f"{item['document_type']}@{item['dpi']}dpi/n{item['noise']:g}/{item['format']}",
+                                  {"fields": 0, "correct": 0})
+        group["fields"] += len(item["values"])
+        group["correct"] += correct
+        extraction = result.get("extraction") or {}
+        if extraction.get("extraction_path"):
+            paths[extraction["extraction_path"]] = paths.get(extraction["extraction_path"], 0) + 1
+        for stage, ms in (extraction.get("preprocess_ms") or {}).items():
+            stage_ms[stage] = stage_ms.get(stage, 0.0) + ms
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "backend": name,
+        "tier": tier if name == "real" else None,
+        "documents": len(manifest),
+        "pages": pages,
+        "errors": errors,
+        "seconds": elapsed,
+        "pages_per_s": pages / elapsed if elapsed else None,
+        "p50_ms": _percentile(latencies, 0.50) * 1000 if latencies else None,
+        "p95_ms": _percentile(latencies, 0.95) * 1000 if latencies else None,
+        "field_accuracy": fields_correct / fields_total if fields_total else None,
+        "document_type_accuracy": types_correct / len(manifest) if manifest else None,
+        "accuracy_by_group": {
+            key: round(g["correct"] / g["fields"], 4) for key, g in sorted(groups.items())
+        },
+        "extraction_paths": paths,
+        "preprocess_ms_per_page": {stage: ms / pages for stage, ms in sorted(stage_ms.items())} if pages else {},
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+def _child(name: str, manifest: List[Dict[str, Any]], tier: Optional[str], queue) -> None:
+    queue.put(run_backend(name, manifest, tier))
+
+def run_isolated(name: str, manifest: List[Dict[str, Any]], tier: Optional[str] = None) -> Dict[str, Any]:
+    """Run a backend in a fresh process so peak RSS is not shared with other runs."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_child, args=(name, manifest, tier, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def real_backend_available() -> Optional[str]:
+    """None when tesseract and poppler are installed, else why the real backend is skipped."""
+    missing = [tool for tool in ("tesseract", "pdftoppm", "pdfinfo") if shutil.which(tool) is None]
+    return f"missing {', '.join(missing)}" if missing else None
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=3, help="documents per type, DPI and noise level")
+    parser.add_argument("--dpi", type=int, action="append", help="render DPI (repeatable, default 150 and 300)")
+    parser.add_argument("--noise", type=float, action="append", help="speckle fraction (repeatable, default 0 and 0.02)")
+    parser.add_argument("--format", action="append", choices=["png", "pdf"], dest="formats")
+    parser.add_argument("--pages", type=int, default=1, help="pages per PDF; extra pages are filler")
+    parser.add_argument("--backend", action="append", choices=["real", "mock"], dest="backends")
+    parser.add_argument("--tier", action="append", dest="tiers",
+                        help="preprocessing tier for the real backend (repeatable, default: deployment default)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", help="keep the corpus here instead of a temp directory")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="ocrbench-")
+    os.makedirs(corpus_dir, exist_ok=True)
+    manifest = make_corpus(corpus_dir, args.count, args.dpi or [150, 300], args.noise or [0.0, 0.02],
+                           args.formats or ["png", "pdf"], max(1, args.pages), args.seed)
+
+    results, skipped = [], {}
+    for backend in args.backends or ["real", "mock"]:
+        reason = real_backend_available() if backend == "real" else None
+        if reason:
+            print(f"Skipping real OCR backend: {reason}", file=sys.stderr)
+            skipped[backend] = reason
+            continue
+        for tier in (args.tiers or [None]) if backend == "real" else [None]:
+            results.append(run_isolated(backend, manifest, tier))
+
+    if not args.corpus_dir:
+        shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "documents": len(manifest),
+            "count": args.count,
+            "dpi": args.dpi or [150, 300],
+            "noise": args.noise or [0.0, 0.02],
+            "formats": args.formats or ["png", "pdf"],
+            "pages": args.pages,
+            "seed": args.seed,
+            "tiers": args.tiers,
+            "skipped": skipped,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
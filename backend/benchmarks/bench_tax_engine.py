@@ -0,0 +1,271 @@
+"""Benchmarks for the tax engine and the /api/tax/calculate request path.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_tax_engine --size 10000 --output bench.json
+    python -m benchmarks.bench_tax_engine --compare bench.json
+
+Results are written as JSON so runs from different commits can be diffed; with
+``--compare`` each benchmark is reported as a ratio against an earlier file.
+The end-to-end benchmark needs ``httpx`` for FastAPI's TestClient.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# The end-to-end benchmark runs against a throwaway SQLite file, which has to be
+# configured before `database` is imported anywhere.
+_BENCH_DB = os.path.join(tempfile.mkdtemp(prefix="taxbench-"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_BENCH_DB}"
+
+from tax_engine.calculator import TaxCalculator
+from tax_engine.mapping import map_document_to_form1040
+from tax_engine.state_rules import STATE_CODES
+from tax_engine.tax_return import TaxReturn
+
+FILING_STATUSES = ["single", "married_filing_jointly", "married_filing_separately",
+                   "head_of_household", "qualifying_widow"]
+
+def _money(rng: random.Random, low: float, high: float, as_text: bool) -> Any:
+    value = round(rng.uniform(low, high), 2)
+    return f"{value:,.2f}" if as_text else value
+
+def make_population(size: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Synthetic returns shaped like merged request + draft data, including string amounts."""
+    rng = random.Random(seed)
+    population = []
+    for _ in range(size):
+        text = rng.random() < 0.3
+        form = {
+            "wages": _money(rng, 0, 250000, text),
+            "federal_withholding": _money(rng, 0, 40000, text),
+            "state_withholding": _money(rng, 0, 12000, text),
+        }
+        if rng.random() < 0.3:
+            form["business_income"] = _money(rng, 0, 90000, text)
+        if rng.random() < 0.3:
+            form["interest_income"] = _money(rng, 0, 5000, text)
+            form["dividend_income"] = _money(rng, 0, 8000, text)
+        if rng.random() < 0.2:
+            form["mortgage_interest"] = _money(rng, 0, 25000, text)
+            form["state_local_taxes"] = _money(rng, 0, 15000, text)
+            form["charitable_contributions"] = _money(rng, 0, 6000, text)
+        if rng.random() < 0.1:
+            form["gross_receipts"] = _money(rng, 0, 150000, text)
+            form["business_expenses"] = _money(rng, 0, 60000, text)
+        if rng.random() < 0.05:
+            form["medical_expenses"] = ""
+        population.append({
+            "form_data": form,
+            "filing_status": rng.choice(FILING_STATUSES),
+            "state": rng.choice(STATE_CODES),
+        })
+    return population
+
+def make_documents(size: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    kinds = ["W-2", "1099-NEC", "W-9", "Unknown"]
+    return [
+        {
+            "document_type": rng.choice(kinds),
+            "wages": round(rng.uniform(20000, 150000), 2),
+            "nonemployee_compensation": round(rng.uniform(1000, 60000), 2),
+            "federal_withholding": round(rng.uniform(0, 20000), 2),
+        }
+        for _ in range(size)
+    ]
+
+def _measure(name: str, fn: Callable[[], int], repeat: int) -> Dict[str, Any]:
+    """Run ``fn`` (which returns its op count) ``repeat`` times and keep the best run."""
+    timings = []
+    ops = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops = fn()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        "name": name,
+        "ops": ops,
+        "best_s": best,
+        "mean_s": sum(timings) / len(timings),
+        "per_op_us": best / ops * 1e6 if ops else None,
+        "ops_per_s": ops / best if best else None,
+    }
+
+def bench_engine(population: List[Dict[str, Any]], repeat: int) -> List[Dict[str, Any]]:
+    calculator = TaxCalculator()
+    normalized = [TaxReturn.parse(r["form_data"]) for r in population]
+    taxable = [max(f.amount("wages") - 14600, 0.0) for f in normalized]
+    documents = make_documents(len(population))
+
+    def tax_for_brackets():
+        for amount in taxable:
+            calculator._tax_for_brackets(amount)
+        return len(taxable)
+
+    def calculate():
+        for row, form in zip(population, normalized):
+            calculator.calculate(form, row["filing_status"], row["state"])
+        return len(normalized)
+
+    def calculate_batch():
+        columns: Dict[str, List[float]] = {}
+        for form in normalized:
+            for name, value in calculator.columns_from_form_data(form).items():
+                columns.setdefault(name, []).append(value)
+        calculator.calculate_batch(
+            filing_status=[r["filing_status"] for r in population],
+            state=[r["state"] for r in population],
+            **columns
+        )
+        return len(normalized)
+
+    def parse_return():
+        for row in population:
+            TaxReturn.parse(row["form_data"])
+        return len(population)
+
+    def mapping():
+        for doc in documents:
+            map_document_to_form1040(doc)
+        return len(documents)
+
+    return [
+        _measure("tax_for_brackets", tax_for_brackets, repeat),
+        _measure("calculate", calculate, repeat),
+        _measure("calculate_batch", calculate_batch, repeat),
+        _measure("parse_return", parse_return, repeat),
+        _measure("map_document_to_form1040", mapping, repeat),
+    ]
+
+def bench_endpoint(population: List[Dict[str, Any]], repeat: int) -> List[Dict[str, Any]]:
+    """POST /api/tax/calculate in-process against SQLite, with and without the result cache."""
+    try:
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+    except ImportError as e:
+        print(f"Skipping end-to-end benchmark: {e}", file=sys.stderr)
+        return []
+
+    # database.py reports its connection on stdout; keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        import database
+        import models
+        from auth.routes import get_current_user
+        from tax_engine.cache import result_cache
+        from tax_engine.routes import router as tax_router
+
+    models.Base.metadata.create_all(database.engine)
+    user = models.User(email="bench@example.com", name="Bench")
+    db = database.SessionLocal()
+    db.merge(user)
+    db.merge(models.TaxSubmission(
+        id="bench-draft", user_email=user.email, status="draft",
+        form_data=TaxReturn.parse(population[0]["form_data"]).to_dict()
+    ))
+    db.commit()
+    db.close()
+
+    app = FastAPI()
+    app.include_router(tax_router, prefix="/api/tax")
+    app.dependency_overrides[get_current_user] = lambda: user
+    client = TestClient(app)
+    payloads = [
+        {"form_1040": row["form_data"], "filing_status": row["filing_status"], "state": row["state"]}
+        for row in population
+    ]
+
+    def uncached():
+        for payload in payloads:
+            result_cache.clear()
+            response = client.post("/api/tax/calculate", json=payload)
+            response.raise_for_status()
+        return len(payloads)
+
+    def cached():
+        for payload in payloads:
+            client.post("/api/tax/calculate", json=payload).raise_for_status()
+        return len(payloads)
+
+    results = [
+        _measure("e2e_calculate_uncached", uncached, repeat),
+        _measure("e2e_calculate_cached", cached, repeat),
+    ]
+    result_cache.clear()
+    return results
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    before = {r["name"]: r for r in baseline.get("results", [])}
+    rows = []
+    for result in current["results"]:
+        old = before.get(result["name"])
+        if old and old.get("per_op_us") and result.get("per_op_us"):
+            rows.append({
+                "name": result["name"],
+                "baseline_us": old["per_op_us"],
+                "current_us": result["per_op_us"],
+                "ratio": result["per_op_us"] / old["per_op_us"],
+            })
+    return rows
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=5000, help="synthetic returns per benchmark")
+    parser.add_argument("--e2e-size", type=int, default=500, help="requests for the end-to-end benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-e2e", action="store_true")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--compare", help="earlier results file to report ratios against")
+    args = parser.parse_args(argv)
+
+    population = make_population(args.size, args.seed)
+    results = bench_engine(population, args.repeat)
+    if not args.skip_e2e:
+        results += bench_endpoint(population[:args.e2e_size], args.repeat)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "size": args.size,
+            "e2e_size": 0 if args.skip_e2e else min(args.e2e_size, args.size),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,6 +1,14 @@
+import json
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Any, Dict, Optional
+from sqlalchemy import JSON, create_engine, event, func, literal
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 # Get database URL from environment
 DATABASE_URL = os.environ.get("DATABASE_URL")
@@ -16,16 +24,181 @@ if not DATABASE_URL:
 
 print(f"Using database: {DATABASE_URL.split('@')[0] if '@' in DATABASE_URL else DATABASE_URL}")
 
+# Async handlers use the same database through an asyncio driver
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def _async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+ASYNC_DATABASE_URL = _async_url(DATABASE_URL)
+
+# Connection pool sizing; size + overflow bounds the connections one process opens
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))  # reconnect connections older than this
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "30000"))  # 0 disables
+
 try:
-    if DATABASE_URL.startswith("sqlite"):
-        engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    import orjson
+
+    def json_serializer(value: Any) -> str:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    json_deserializer = orjson.loads
+except ImportError:  # stdlib codec when orjson is not installed
+    json_serializer, json_deserializer = json.dumps, json.loads
+
+class PoolMetrics:
+    """Counters for connection checkouts, kept across pool re-creation (``engine.dispose()``)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.wait_ms_total = 0.0
+            self.wait_ms_max = 0.0
+            self.overflow_events = 0  # checkouts that opened a connection beyond pool_size
+            self.timeouts = 0
+
+    def record(self, wait_ms: float, overflowed: bool, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.overflow_events += overflowed
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "wait_ms_total": round(self.wait_ms_total, 1),
+                "wait_ms_avg": round(self.wait_ms_total / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_ms_max, 1),
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+            }
+
+pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+
+class _MeteredPool:
+    """Records how long each checkout waited and whether it overflowed."""
+    metrics = pool_metrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        overflow_before = self._overflow
+        try:
+            record = super()._do_get()
+        except sa_exc.TimeoutError:
+            self.metrics.record((time.perf_counter() - started) * 1000, False, timed_out=True)
+            raise
+        overflowed = self._overflow > overflow_before and self._overflow > 0
+        self.metrics.record((time.perf_counter() - started) * 1000, overflowed)
+        return record
+
+class MeteredQueuePool(_MeteredPool, QueuePool):
+    pass
+
+class MeteredAsyncQueuePool(_MeteredPool, AsyncAdaptedQueuePool):
+    metrics = async_pool_metrics
+
+def _engine_options(url: str, asynchronous: bool = False) -> dict:
+    # JSON/JSONB columns are encoded and decoded with the faster codec
+    codec = {"json_serializer": json_serializer, "json_deserializer": json_deserializer}
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False}, **codec}
+        if ":memory:" in url or url in ("sqlite://", "sqlite:///"):
+            return options  # one shared in-memory connection; nothing to pool
     else:
-        engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-    
+        options = {"pool_pre_ping": True, **codec}
+        if DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql+asyncpg"):
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        elif DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    options.update(
+        poolclass=MeteredAsyncQueuePool if asynchronous else MeteredQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return options
+
+try:
+    engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL, asynchronous=True))
+
+    if DATABASE_URL.startswith("sqlite") and DB_STATEMENT_TIMEOUT_MS:
+        def _sqlite_busy_timeout(dbapi_connection, connection_record):
+            # SQLite has no statement timeout; bound how long a statement waits on a lock instead
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"PRAGMA busy_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+            cursor.close()
+        event.listen(engine, "connect", _sqlite_busy_timeout)
+        event.listen(async_engine.sync_engine, "connect", _sqlite_busy_timeout)
+
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # Objects stay loaded after commit so handlers never trigger lazy (blocking) refreshes
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
     Base = declarative_base()
     
     print("Database connection established successfully")
 except Exception as e:
     print(f"Database connection error: {e}")
-    raise
\ No newline at end of file
+    raise
+
+def json_merge_patch(column, patch: Dict[str, Any], dialect_name: str) -> Optional[Any]:
+    """SQL that merges ``patch`` into a JSON object column in place, or None if the
+    dialect cannot; a ``None`` value in ``patch`` removes that key (RFC 7396).
+
+    Only the patch is sent to the database, so large documents are not read back
+    and rewritten from Python for a small change.
+    """
+    if dialect_name == "postgresql":
+        merged = func.coalesce(column, literal({}, JSONB)).op("||")(literal(patch, JSONB))
+        return func.jsonb_strip_nulls(merged, type_=JSONB)
+    if dialect_name == "sqlite":
+        return func.json_patch(func.coalesce(column, "{}"), literal(patch, JSON), type_=JSON)
+    return None
+
+def get_db():
+    """Request-scoped session dependency shared by all routers."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    """Request-scoped AsyncSession dependency for ``async def`` handlers."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _pool_status(pool, metrics):
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "timeout_s": pool.timeout(),
+        })
+    status.update(metrics.snapshot())
+    return status
+
+def pool_status():
+    """Live pool occupancy plus the checkout counters since start (or the last reset)."""
+    status = _pool_status(engine.pool, pool_metrics)
+    status["async"] = _pool_status(async_engine.pool, async_pool_metrics)
+    return status
@@ -0,0 +1,232 @@
+"""Per-form field extractors, compiled into one scanner.
+
+Each ``Extractor`` lists the titles that identify its form and the box labels
+whose values we want. The ``Scanner`` indexes every title and label of every
+registered form, so a single pass over the text both classifies the document
+and locates all of its fields; adding a form does not add another scan.
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Values that follow a label. Amounts need cents, a thousands separator or three
+# digits so a neighbouring box number ("2 Federal ...") is not taken as the value.
+VALUE_PATTERNS = {
+    "amount": re.compile(r"(?<![\w-])\$?\s*(\d[\d,]*\.\d{2}|\d{1,3}(?:,\d{3})+|\d{3,})(?![\w-])"),
+    "tin": re.compile(r"(?<![\d-])(\d{2}-\d{7})(?![\d-])"),
+}
+
+TITLE_WEIGHT = 3
+LABEL_WEIGHT = 1
+
+@dataclass(frozen=True)
+class Field:
+    name: str
+    label: str  # regex source, matched case-insensitively
+    kind: str = "amount"  # key into VALUE_PATTERNS
+    required: bool = True  # must be found before OCR of later pages can be skipped
+
+@dataclass(frozen=True)
+class Extractor:
+    document_type: str
+    titles: Tuple[str, ...]  # regex sources that identify the form
+    fields: Tuple[Field, ...]
+
+    @property
+    def required_fields(self) -> Tuple[str, ...]:
+        return tuple(field.name for field in self.fields if field.required)
+
+EXTRACTORS: Dict[str, Extractor] = {}
+
+def register_extractor(extractor: Extractor) -> Extractor:
+    global _scanner
+    EXTRACTORS[extractor.document_type] = extractor
+    _scanner = None
+    return extractor
+
+def _parse_value(raw: str, kind: str) -> Any:
+    if kind == "amount":
+        return float(raw.replace(",", ""))
+    return raw
+
+def _value_after(text: str, label_start: int, label_end: int, kind: str) -> Optional[str]:
+    """First value after a label on its line, else the value on the next line nearest its column.
+
+    The column fallback handles layout text where values sit under the labels.
+    """
+    pattern = VALUE_PATTERNS[kind]
+    line_end = text.find("\n", label_end)
+    line_end = len(text) if line_end < 0 else line_end
+    match = pattern.search(text, label_end, line_end)
+    if match:
+        return match.group(1)
+    if line_end >= len(text):
+        return None
+    next_end = text.find("\n", line_end + 1)
+    next_end = len(text) if next_end < 0 else next_end
+    column = label_start - (text.rfind("\n", 0, label_start) + 1)
+    best = None
+    for candidate in pattern.finditer(text, line_end + 1, next_end):
+        distance = abs((candidate.start(1) - line_end - 1) - column)
+        if best is None or distance < best[0]:
+            best = (distance, candidate.group(1))
+    return best[1] if best else None
+
+_WORD = re.compile(r"[A-Za-z0-9]+")
+_LEADING_WORD = re.compile(r"(?:\\b)?([A-Za-z0-9]+)")
+
+class Scanner:
+    """Finds every registered title and label in one pass over the text.
+
+    Each title/label regex is indexed by the literal word it starts with. The
+    scan walks the words of the text once and only tries the patterns indexed
+    under each word, so its cost depends on the text length and not on how many
+    forms are registered.
+    """
+
+    def __init__(self, extractors: List[Extractor]):
+        self.extractors = extractors
+        self.order = {extractor.document_type: i for i, extractor in enumerate(extractors)}
+        # Several forms share a label (box 4 federal withholding); match it once
+        compiled: Dict[str, Tuple[re.Pattern, List[Tuple[str, Optional[Field]]]]] = {}
+        for extractor in extractors:
+            targets = [(title, None) for title in extractor.titles]
+            targets += [(field.label, field) for field in extractor.fields]
+            for source, field in targets:
+                if source not in compiled:
+                    compiled[source] = (re.compile(source, re.I), [])
+                compiled[source][1].append((extractor.document_type, field))
+
+        self._index: Dict[str, List[Tuple[re.Pattern, List[Tuple[str, Optional[Field]]]]]] = {}
+        for source, entry in compiled.items():
+            leading = _LEADING_WORD.match(source)
+            if not leading:
+                raise ValueError(f"Extractor pattern must start with a literal word: {source!r}")
+            self._index.setdefault(leading.group(1).lower(), []).append(entry)
+
+    def scan(self, text: str) -> Tuple[str, Dict[str, Any]]:
+        """Classify ``text`` and extract the fields of the winning form in one pass."""
+        scores: Dict[str, int] = {}
+        found: Dict[str, Dict[str, Any]] = {}
+        index = self._index
+        for word in _WORD.finditer(text):
+            candidates = index.get(word.group().lower())
+            if not candidates:
+                continue
+            for pattern, targets in candidates:
+                match = pattern.match(text, word.start())
+                if match:
+                    self._record(text, match, targets, scores, found)
+
+        if not scores:
+            return "Unknown", {}
+        # Highest score wins; ties go to the form registered first
+        document_type = max(scores, key=lambda code: (scores[code], -self.order[code]))
+        return document_type, found.get(document_type, {})
+
+    @staticmethod
+    def _record(text, match, targets, scores, found) -> None:
+        for document_type, field in targets:
+            if field is None:
+                scores[document_type] = scores.get(document_type, 0) + TITLE_WEIGHT
+                continue
+            scores[document_type] = scores.get(document_type, 0) + LABEL_WEIGHT
+            values = found.setdefault(document_type, {})
+            if field.name not in values:
+                raw = _value_after(text, match.start(), match.end(), field.kind)
+                if raw is not None:
+                    values[field.name] = _parse_value(raw, field.kind)
+
+    def is_complete(self, text: str) -> bool:
+        """Whether ``text`` already identifies a form and holds all of its required fields."""
+        document_type, data = self.scan(text)
+        extractor = EXTRACTORS.get(document_type)
+        return extractor is not None and all(name in data for name in extractor.required_fields)
+
+_scanner: Optional[Scanner] = None
+
+def get_scanner() -> Scanner:
+    """The scanner for the current registry, compiled on first use."""
+    global _scanner
+    if _scanner is None:
+        _scanner = Scanner(list(EXTRACTORS.values()))
+    return _scanner
+
+def extract_fields(text: str) -> Dict[str, Any]:
+    """Classify text from content and return its fields plus ``document_type``."""
+    document_type, data = get_scanner().scan(text)
+    data = dict(data)
+    data["document_type"] = document_type
+    return data
+
+_PAYER_TIN = Field("payer_tin", r"PAYER'?S?\s+(?:federal\s+identification\s+number|TIN)", "tin")
+_FEDERAL_BOX_4 = Field("federal_withholding", r"\b4\s+Federal\s+income\s+tax\s+withheld", required=False)
+
+register_extractor(Extractor(
+    document_type="W-2",
+    titles=(r"Wage\s+and\s+Tax\s+Statement", r"\bForm\s+W-?2\b"),
+    fields=(
+        Field("employer_ein", r"Employer(?:'s)?\s+(?:identification\s+number|ID\s+number|EIN)", "tin"),
+        Field("wages", r"\b1\s+Wages"),
+        Field("federal_withholding", r"\b2\s+Federal\s+income\s+tax"),
+        Field("social_security_wages", r"\b3\s+Social\s+security\s+wages", required=False),
+        Field("social_security_withholding", r"\b4\s+Social\s+security\s+tax", required=False),
+        Field("medicare_wages", r"\b5\s+Medicare\s+wages", required=False),
+        Field("medicare_withholding", r"\b6\s+Medicare\s+tax", required=False),
+    ),
+))
+
+register_extractor(Extractor(
+    document_type="1099-NEC",
+    titles=(r"\b1099-NEC\b",),
+    fields=(
+        _PAYER_TIN,
+        Field("nonemployee_compensation", r"\b1\s+Nonemployee\s+compensation"),
+        _FEDERAL_BOX_4,
+    ),
+))
+
+register_extractor(Extractor(
+    document_type="1099-INT",
+    titles=(r"\b1099-INT\b",),
+    fields=(
+        _PAYER_TIN,
+        Field("interest_income", r"\b1\s+Interest\s+income"),
+        Field("early_withdrawal_penalty", r"\b2\s+Early\s+withdrawal\s+penalty", required=False),
+        Field("us_bond_interest", r"\b3\s+Interest\s+on\s+U\.?\s?S\.?\s+Savings", required=False),
+        _FEDERAL_BOX_4,
+        Field("tax_exempt_interest", r"\b8\s+Tax-exempt\s+interest", required=False),
+    ),
+))
+
+register_extractor(Extractor(
+    document_type="1099-DIV",
+    titles=(r"\b1099-DIV\b", r"Dividends\s+and\s+Distributions"),
+    fields=(
+        _PAYER_TIN,
+        Field("ordinary_dividends", r"\b1a\s+Total\s+ordinary\s+dividends"),
+        Field("qualified_dividends", r"\b1b\s+Qualified\s+dividends", required=False),
+        Field("capital_gain_distributions", r"\b2a\s+Total\s+capital\s+gain", required=False),
+        _FEDERAL_BOX_4,
+    ),
+))
+
+register_extractor(Extractor(
+    document_type="1098",
+    titles=(r"\bForm\s+1098\b(?!-)", r"Mortgage\s+Interest\s+Statement"),
+    fields=(
+        Field("recipient_tin", r"RECIPIENT'?S?(?:/LENDER'?S?)?\s+(?:federal\s+identification\s+number|TIN)", "tin"),
+        Field("mortgage_interest", r"\b1\s+Mortgage\s+interest\s+received"),
+        Field("outstanding_principal", r"\b2\s+Outstanding\s+mortgage\s+principal", required=False),
+        Field("mortgage_insurance_premiums", r"\b5\s+Mortgage\s+insurance\s+premiums", required=False),
+        Field("points_paid", r"\b6\s+Points\s+paid", required=False),
+    ),
+))
+
+register_extractor(Extractor(
+    document_type="W-9",
+    titles=(r"Request\s+for\s+Taxpayer\s+Identification\s+Number", r"\bForm\s+W-?9\b"),
+    fields=(
+        Field("taxpayer_id", r"Part\s+I\b[^\n]*?TIN", "tin"),
+    ),
+))
@@ -0,0 +1,292 @@
+"""DB-backed OCR job queue.
+
+Uploads insert an ``OcrJob`` row and return straight away; ``OcrWorker`` claims
+queued jobs, runs ``extract_stored`` in a process pool and writes the
+result back to the document and the user's draft. Because the queue lives in
+the ``ocr_jobs`` table, jobs that were queued (or left running) when the server
+stopped are picked up again on the next start.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from sqlalchemy import select, update
+
+from database import SessionLocal
+from models import Document, OcrJob
+from .ocr import extract_document_data
+from .ocr_cache import ocr_cache
+from .storage import get_storage
+from tax_engine.cache import result_cache
+from tax_engine.drafts import merge_into_draft
+from tax_engine.mapping import combine_document_fields, map_document_to_form1040
+
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", "2"))
+OCR_POLL_INTERVAL = float(os.environ.get("OCR_POLL_INTERVAL", "2"))
+# A running job older than this is assumed lost (worker crash, restart) and requeued
+OCR_JOB_TIMEOUT = int(os.environ.get("OCR_JOB_TIMEOUT", "600"))
+OCR_MAX_ATTEMPTS = int(os.environ.get("OCR_MAX_ATTEMPTS", "3"))
+
+def extract_stored(key: str, content_type: str, tier: Optional[str] = None) -> Dict[str, Any]:
+    """``extract_document_data`` for a stored upload; runs in the OCR process pool."""
+    with get_storage().local_copy(key) as path:
+        return extract_document_data(path, content_type, tier)
+
+def enqueue_ocr_job(db, doc: Document, tier: Optional[str] = None) -> OcrJob:
+    """Add a queued job for ``doc``; the caller commits and then calls ``ocr_worker.notify()``."""
+    job = OcrJob(id=str(uuid4()), document_id=doc.id, user_email=doc.user_email, status="queued",
+                 preprocess_tier=tier)
+    db.add(job)
+    return job
+
+def completed_ocr_job(db, doc: Document, tier: Optional[str] = None) -> OcrJob:
+    """Record a job that was answered from the OCR cache without queueing."""
+    now = datetime.utcnow()
+    job = OcrJob(id=str(uuid4()), document_id=doc.id, user_email=doc.user_email, status="done",
+                 preprocess_tier=tier, attempts=0, created_at=now, started_at=now, finished_at=now)
+    db.add(job)
+    return job
+
+def document_totals(db, user_email: str) -> Dict[str, float]:
+    """Form 1040 amounts summed over the user's extracted documents.
+
+    Each distinct file counts once, so a W-2 uploaded twice (in one batch or in
+    two uploads) adds its wages once.
+    """
+    db.flush()
+    rows = db.execute(
+        select(Document.id, Document.content_hash, Document.extracted_data)
+        .where(Document.user_email == user_email, Document.extracted_data.is_not(None))
+        .order_by(Document.uploaded_at, Document.id)
+    ).all()
+    seen, field_sets = set(), []
+    for doc_id, content_hash, data in rows:
+        key = content_hash or doc_id
+        if key in seen or not isinstance(data, dict):
+            continue
+        seen.add(key)
+        field_sets.append(map_document_to_form1040(data))
+    return combine_document_fields(field_sets)
+
+def sync_draft_with_documents(db, user_email: str, user_id: Optional[int] = None) -> Dict[str, float]:
+    """Merge ``document_totals`` into the user's draft.
+
+    ``/upload``, ``/upload-batch`` and the OCR worker all update the draft this
+    way, so the same documents give the same draft whichever endpoint took them.
+    """
+    totals = document_totals(db, user_email)
+    merge_into_draft(db, user_email, totals, user_id=user_id)
+    return totals
+
+def apply_extraction(db, doc: Document, extracted_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Store extracted data on the document and auto-populate the user's draft."""
+    doc.document_type = extracted_data.get("document_type", "Unknown")
+    doc.extracted_data = extracted_data
+
+    # Map extracted data to Form 1040 fields and auto-populate draft
+    auto_fields = map_document_to_form1040(extracted_data)
+    sync_draft_with_documents(db, doc.user_email, doc.user_id)
+    return auto_fields or None
+
+class OcrWorker:
+    """Feeds queued jobs to a process pool from a single dispatcher thread."""
+
+    def __init__(self, workers: int = OCR_WORKERS, poll_interval: float = OCR_POLL_INTERVAL):
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        # Separate from _lock, which stop() holds while joining the dispatcher
+        self._pool_lock = threading.Lock()
+        self._in_flight: Dict[Future, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            self._pool = self._new_pool()
+            self._thread = threading.Thread(target=self._run, name="ocr-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        with self._lock:
+            self._stopping.set()
+            self._wake.set()
+            if self._thread is not None and wait:
+                self._thread.join()
+            self._thread = None
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
+
+    def submit(self, fn, *args) -> Future:
+        """Run ``fn`` on the OCR process pool outside the job queue."""
+        self.start()
+        pool = self._pool
+        try:
+            return pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            return self._pool.submit(fn, *args)
+
+    def notify(self) -> None:
+        """Wake the dispatcher after enqueueing, starting it on first use."""
+        if not self.running:
+            self.start()
+        self._wake.set()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # Forking a server process that already runs threads can copy held locks
+        # into the child, so workers start from a fresh interpreter
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace_pool(self, broken) -> None:
+        """Swap in a fresh pool after a worker process died (OOM kill, native crash).
+
+        A broken pool refuses all further work, so without this every later job
+        would fail until the server restarted.
+        """
+        with self._pool_lock:
+            if self._pool is not broken or self._stopping.is_set():
+                return
+            print("OCR process pool broke; starting a new one")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._new_pool()
+
+    def _run(self) -> None:
+        self._requeue_stale()
+        last_sweep = datetime.utcnow()
+        while not self._stopping.is_set():
+            try:
+                self._dispatch()
+                if datetime.utcnow() - last_sweep > timedelta(seconds=OCR_JOB_TIMEOUT):
+                    self._requeue_stale()
+                    last_sweep = datetime.utcnow()
+            except Exception as e:
+                print(f"OCR dispatcher error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _dispatch(self) -> None:
+        free = self.workers - len(self._in_flight)
+        if free <= 0:
+            return
+        db = SessionLocal()
+        try:
+            candidates = db.query(OcrJob.id).filter(OcrJob.status == "queued") \
+                .order_by(OcrJob.created_at).limit(free).all()
+            for (job_id,) in candidates:
+                # Conditional update so only one dispatcher (or process) claims a job
+                claimed = db.execute(
+                    update(OcrJob)
+                    .where(OcrJob.id == job_id, OcrJob.status == "queued")
+                    .values(status="running", started_at=datetime.utcnow(), attempts=OcrJob.attempts + 1)
+                ).rowcount
+                db.commit()
+                if not claimed:
+                    continue
+                job = db.get(OcrJob, job_id)
+                doc = db.get(Document, job.document_id)
+                if doc is None:
+                    self._finish(db, job, error="Document not found")
+                    continue
+                # A duplicate of this file may have been processed since it was queued
+                cached = ocr_cache.get(db, doc.content_hash, job.preprocess_tier, count_miss=False)
+                if cached is not None:
+                    apply_extraction(db, doc, cached)
+                    self._finish(db, job)
+                    result_cache.invalidate_user(doc.user_email)
+                    continue
+                pool = self._pool
+                try:
+                    future = pool.submit(extract_stored, doc.file_path, doc.content_type, job.preprocess_tier)
+                except BrokenProcessPool:
+                    # The job never ran; hand it back to the queue for the new pool
+                    job.status, job.attempts = "queued", job.attempts - 1
+                    db.commit()
+                    self._replace_pool(pool)
+                    return
+                self._in_flight[future] = job_id
+                future.add_done_callback(self._on_done)
+        finally:
+            db.close()
+
+    def _on_done(self, future: Future) -> None:
+        job_id = self._in_flight.pop(future, None)
+        if job_id is None:
+            return
+        db = SessionLocal()
+        try:
+            job = db.get(OcrJob, job_id)
+            if job is None or job.status != "running":
+                return
+            if future.cancelled():
+                # Shut down before the job started; leave it for the next start
+                job.status, job.attempts = "queued", job.attempts - 1
+                db.commit()
+                return
+            try:
+                extracted_data = future.result()
+            except Exception as e:
+                print(f"OCR job {job_id} failed: {e}")
+                self._finish(db, job, error=str(e) or type(e).__name__)
+                return
+            doc = db.get(Document, job.document_id)
+            if doc is None:
+                self._finish(db, job, error="Document not found")
+                return
+            apply_extraction(db, doc, extracted_data)
+            self._finish(db, job)
+            result_cache.invalidate_user(doc.user_email)
+            ocr_cache.put(db, doc.content_hash, extracted_data, job.preprocess_tier)
+        except Exception as e:
+            db.rollback()
+            print(f"OCR job {job_id} could not be saved: {e}")
+        finally:
+            db.close()
+            self._wake.set()
+
+    def _finish(self, db, job: OcrJob, error: Optional[str] = None) -> None:
+        if error is None:
+            job.status, job.error = "done", None
+        else:
+            job.error = error
+            job.status = "queued" if job.attempts < OCR_MAX_ATTEMPTS else "failed"
+        if job.status != "queued":
+            job.finished_at = datetime.utcnow()
+            if job.status == "failed":
+                doc = db.get(Document, job.document_id)
+                if doc is not None and doc.document_type == "Pending":
+                    doc.document_type = "Unknown"
+        db.commit()
+
+    def _requeue_stale(self) -> None:
+        """Put back jobs left running by a crashed or restarted worker."""
+        cutoff = datetime.utcnow() - timedelta(seconds=OCR_JOB_TIMEOUT)
+        active = set(self._in_flight.values())
+        db = SessionLocal()
+        try:
+            stale = db.query(OcrJob).filter(OcrJob.status == "running", OcrJob.started_at < cutoff).all()
+            for job in stale:
+                if job.id in active:
+                    continue
+                job.status = "failed" if job.attempts >= OCR_MAX_ATTEMPTS else "queued"
+                job.error = "Worker stopped before the job finished"
+            db.commit()
+        finally:
+            db.close()
+
+ocr_worker = OcrWorker()
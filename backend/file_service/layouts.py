@@ -0,0 +1,121 @@
+"""Layout templates for forms whose boxes sit at fixed positions on the page.
+
+Instead of OCR'ing a whole page and regex-searching the text, a template crops
+the handful of boxes we need and OCRs each one with settings suited to its
+contents (a single line of digits). A template only applies when the text in its
+anchor region identifies the form; otherwise callers fall back to full-page OCR.
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytesseract
+from PIL import Image
+
+# (left, top, right, bottom) as fractions of the page width and height
+Box = Tuple[float, float, float, float]
+
+# tesseract settings and value patterns per kind of box
+FIELD_CONFIGS = {
+    "amount": "--psm 7 -c tessedit_char_whitelist=0123456789.,$",
+    "tin": "--psm 7 -c tessedit_char_whitelist=0123456789-",
+}
+FIELD_PATTERNS = {
+    "amount": re.compile(r"\$?\s*(\d[\d,]*\.\d{2})"),
+    "tin": re.compile(r"(\d{2}-\d{7})"),
+}
+ANCHOR_CONFIG = "--psm 6"
+
+@dataclass(frozen=True)
+class Region:
+    field: str
+    box: Box
+    kind: str  # key into FIELD_CONFIGS / FIELD_PATTERNS
+
+@dataclass(frozen=True)
+class LayoutTemplate:
+    name: str
+    document_type: str
+    anchor_box: Box
+    anchor_pattern: re.Pattern
+    regions: Tuple[Region, ...]
+    aspect_ratio: float = 8.5 / 11  # width / height of the page
+    aspect_tolerance: float = 0.05
+
+    def fits(self, image: Image.Image) -> bool:
+        width, height = image.size
+        return abs(width / height - self.aspect_ratio) <= self.aspect_tolerance
+
+LAYOUTS: Dict[str, List[LayoutTemplate]] = {}
+
+def register_layout(template: LayoutTemplate) -> LayoutTemplate:
+    LAYOUTS.setdefault(template.document_type, []).append(template)
+    return template
+
+def _crop(image: Image.Image, box: Box) -> Image.Image:
+    width, height = image.size
+    left, top, right, bottom = box
+    return image.crop((int(left * width), int(top * height), int(right * width), int(bottom * height))).convert("L")
+
+def _ocr_box(image: Image.Image, box: Box, config: str) -> str:
+    region = _crop(image, box)
+    try:
+        return pytesseract.image_to_string(region, config=config)
+    finally:
+        region.close()
+
+def match_layout(image: Image.Image, document_type: Optional[str] = None) -> Optional[LayoutTemplate]:
+    """The first registered template (for ``document_type``, or any) whose anchor text is on the page."""
+    if document_type is None:
+        templates = [template for group in LAYOUTS.values() for template in group]
+    else:
+        templates = LAYOUTS.get(document_type, [])
+    for template in templates:
+        if template.fits(image) and template.anchor_pattern.search(
+            _ocr_box(image, template.anchor_box, ANCHOR_CONFIG)
+        ):
+            return template
+    return None
+
+def extract_regions(image: Image.Image, template: LayoutTemplate) -> Dict[str, Any]:
+    """OCR each of the template's boxes; fields whose box did not parse are left out."""
+    data: Dict[str, Any] = {}
+    for region in template.regions:
+        text = _ocr_box(image, region.box, FIELD_CONFIGS[region.kind])
+        match = FIELD_PATTERNS[region.kind].search(text)
+        if match:
+            raw = match.group(1)
+            data[region.field] = float(raw.replace(",", "")) if region.kind == "amount" else raw
+    return data
+
+def extract_with_layout(
+    image: Image.Image, document_type: Optional[str] = None
+) -> Tuple[Optional[LayoutTemplate], Dict[str, Any]]:
+    template = match_layout(image, document_type)
+    if template is None:
+        return None, {}
+    return template, extract_regions(image, template)
+
+# Standard IRS layouts with one copy printed at the top of a letter-size page
+register_layout(LayoutTemplate(
+    name="irs-w2",
+    document_type="W-2",
+    anchor_box=(0.03, 0.40, 0.60, 0.49),
+    anchor_pattern=re.compile(r"Wage\s+and\s+Tax\s+Statement", re.I),
+    regions=(
+        Region("employer_ein", (0.03, 0.085, 0.50, 0.115), "tin"),
+        Region("wages", (0.50, 0.055, 0.73, 0.085), "amount"),
+        Region("federal_withholding", (0.73, 0.055, 0.97, 0.085), "amount"),
+    ),
+))
+
+register_layout(LayoutTemplate(
+    name="irs-1099-nec",
+    document_type="1099-NEC",
+    anchor_box=(0.70, 0.02, 0.97, 0.12),
+    anchor_pattern=re.compile(r"Nonemployee\s+Compensation", re.I),
+    regions=(
+        Region("payer_tin", (0.03, 0.165, 0.27, 0.21), "tin"),
+        Region("nonemployee_compensation", (0.50, 0.165, 0.74, 0.22), "amount"),
+    ),
+))
@@ -1,57 +1,244 @@
 import os
-import re
-from typing import Dict, Any, List
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple, Union
 
 import pytesseract
 from PIL import Image
-from pdf2image import convert_from_path
-
-W2_REGEX = {
-    "employer_ein": re.compile(r"Employer.*EIN.*?(\d{2}-\d{7})", re.I),
-    "wages": re.compile(r"1\s+wages.*?\$?([\d,\.]+)", re.I),
-    "federal_withholding": re.compile(r"2\s+federal.*?\$?([\d,\.]+)", re.I),
-}
-NEC_REGEX = {
-    "payer_tin": re.compile(r"PAYER.*TIN.*?(\d{2}-\d{7})", re.I),
-    "nonemployee_compensation": re.compile(r"1\s+Nonemployee.*?\$?([\d,\.]+)", re.I),
-}
-W9_REGEX = {
-    "taxpayer_id": re.compile(r"Part\s+I.*?TIN.*?(\d{2}-\d{7})", re.I)
-}
-
-def _images_from_file(path: str) -> List[Image.Image]:
-    if path.lower().endswith(".pdf"):
-        return convert_from_path(path, dpi=300)
-    return [Image.open(path)]
-
-def _ocr_text(path: str) -> str:
-    text_segments = [pytesseract.image_to_string(img) for img in _images_from_file(path)]
-    return "\n".join(text_segments)
-
-def _extract_fields(text: str, patterns: Dict[str, re.Pattern]) -> Dict[str, Any]:
-    data = {}
-    for key, pat in patterns.items():
-        match = pat.search(text)
-        if match:
-            raw = match.group(1).replace(",", "")
-            data[key] = float(raw) if raw.replace(".", "").isdigit() else raw
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from .extractors import extract_fields, get_scanner
+from .layouts import LAYOUTS, extract_with_layout
+from .preprocess import Tier, get_tier, preprocess
+
+# Bump whenever OCR settings or field patterns change so cached results are not reused
+EXTRACTOR_VERSION = "4"
+
+# Unknown documents only keep a text preview
+UNKNOWN_TEXT_LIMIT = 500
+
+# Pages rasterized per pdftoppm call; at most two ranges are held in memory at once
+OCR_PAGE_BATCH = int(os.environ.get("OCR_PAGE_BATCH", "4"))
+# tesseract runs as a subprocess, so threads are enough to OCR pages in parallel
+OCR_PAGE_WORKERS = int(os.environ.get("OCR_PAGE_WORKERS", "2"))
+# A PDF page whose embedded text has at least this many letters/digits is read, not OCR'd
+TEXT_LAYER_MIN_CHARS = int(os.environ.get("TEXT_LAYER_MIN_CHARS", "32"))
+
+_page_pool: Optional[ThreadPoolExecutor] = None
+_page_pool_lock = threading.Lock()
+
+def _get_page_pool() -> ThreadPoolExecutor:
+    # Created on first use rather than at import: the API process imports this module
+    # but never OCRs pages, and each spawned OCR worker builds its own pool on its first job
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ThreadPoolExecutor(max_workers=max(1, OCR_PAGE_WORKERS), thread_name_prefix="ocr-page")
+        return _page_pool
+
+def _is_pdf(path: str) -> bool:
+    # Stored uploads are named by content hash, so sniff the header instead of the extension
+    with open(path, "rb") as f:
+        return f.read(5) == b"%PDF-"
+
+def _text_layer(path: str) -> Optional[List[Optional[str]]]:
+    """Embedded text per PDF page via pdftotext, ``None`` for pages without usable text.
+
+    Returns None when the file is not a PDF or pdftotext is unavailable.
+    """
+    if not _is_pdf(path):
+        return None
+    try:
+        result = subprocess.run(
+            ["pdftotext", "-layout", "-enc", "UTF-8", path, "-"],
+            capture_output=True, timeout=60, check=True
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"pdftotext failed for {path}: {e}")
+        return None
+    # pdftotext ends every page with a form feed
+    pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+    if pages and not pages[-1].strip():
+        pages.pop()
+    return [
+        page if sum(ch.isalnum() for ch in page) >= TEXT_LAYER_MIN_CHARS else None
+        for page in pages
+    ]
+
+def _iter_pages(
+    path: str, text_layer: Optional[List[Optional[str]]], tier: Tier,
+    first_page: Optional[Image.Image] = None
+) -> Iterator[List[Union[str, Image.Image]]]:
+    """Yield a file's pages ``OCR_PAGE_BATCH`` at a time.
+
+    A page with a usable text layer is yielded as its text; only the others are
+    rasterized, one contiguous run of pages per pdftoppm call. ``first_page`` is
+    page 1 already rasterized (by the layout check) and is used instead of
+    rendering it again.
+    """
+    if not _is_pdf(path):
+        yield [first_page or Image.open(path)]
+        return
+    pages = int(pdfinfo_from_path(path)["Pages"])
+    for first in range(1, pages + 1, OCR_PAGE_BATCH):
+        last = min(first + OCR_PAGE_BATCH - 1, pages)
+        batch: List[Union[str, Image.Image, None]] = [
+            text_layer[page - 1] if text_layer and page <= len(text_layer) else None
+            for page in range(first, last + 1)
+        ]
+        if first_page is not None:
+            if batch[0] is None:
+                batch[0] = first_page
+            else:
+                first_page.close()
+            first_page = None
+        start = 0
+        while start < len(batch):
+            if batch[start] is not None:
+                start += 1
+                continue
+            end = start
+            while end + 1 < len(batch) and batch[end + 1] is None:
+                end += 1
+            batch[start:end + 1] = convert_from_path(
+                path, dpi=tier.dpi, first_page=first + start, last_page=first + end
+            )
+            start = end + 1
+        yield batch
+
+def _ocr_image(img: Image.Image, tier: Tier) -> Tuple[str, Dict[str, float]]:
+    """OCR one page after preprocessing; returns the text and per-stage milliseconds."""
+    timings: Dict[str, float] = {}
+    cleaned = img
+    try:
+        cleaned = preprocess(img, tier, timings)
+        return pytesseract.image_to_string(cleaned), timings
+    finally:
+        if cleaned is not img:
+            cleaned.close()
+        img.close()
+
+def _page_future(pool: ThreadPoolExecutor, page: Union[str, Image.Image], tier: Tier) -> Future:
+    if isinstance(page, str):
+        future: Future = Future()
+        future.set_result((page, {}))
+        return future
+    return pool.submit(_ocr_image, page, tier)
+
+def _ocr_text(
+    path: str,
+    is_complete: Optional[Callable[[str], bool]] = None,
+    text_layer: Optional[List[Optional[str]]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    tier: Optional[Tier] = None,
+    first_page: Optional[Image.Image] = None
+) -> str:
+    """Read a file page range by page range, stopping once ``is_complete(text so far)``.
+
+    Pages with a text layer are taken as-is. The rest are OCR'd concurrently on
+    the page pool. With ``is_complete`` each range is checked before the next one
+    is rasterized, so a form found early costs no further pages; without it the
+    next range is rasterized while the current one is OCR'd. Either way memory is
+    bounded by two ranges however long the document is. Page counts and
+    preprocessing timings are added to ``stats``.
+    """
+    tier = tier or get_tier()
+    pool = _get_page_pool()
+    segments: List[str] = []
+    pending: List[Future] = []
+    stats = stats if stats is not None else {}
+    stats.setdefault("text_layer_pages", 0)
+    stats.setdefault("ocr_pages", 0)
+    preprocess_ms = stats.setdefault("preprocess_ms", {})
+
+    def count(pages):
+        for page in pages:
+            stats["text_layer_pages" if isinstance(page, str) else "ocr_pages"] += 1
+
+    def collect(futures):
+        for future in futures:
+            text, timings = future.result()
+            segments.append(text)
+            for stage, ms in timings.items():
+                preprocess_ms[stage] = preprocess_ms.get(stage, 0.0) + ms
+
+    for pages in _iter_pages(path, text_layer, tier, first_page):
+        futures = [_page_future(pool, page, tier) for page in pages]
+        count(pages)
+        if is_complete is None:
+            collect(pending)
+            pending = futures
+            continue
+        collect(futures)
+        if is_complete("\n".join(segments)):
+            break
+    collect(pending)
+    return "\n".join(segments)
+
+def _first_page(path: str, tier: Tier) -> Image.Image:
+    if _is_pdf(path):
+        return convert_from_path(path, dpi=tier.dpi, first_page=1, last_page=1)[0]
+    return Image.open(path)
+
+def _extraction_path(stats: Dict[str, Any]) -> str:
+    if stats.get("layout"):
+        return "layout+ocr" if stats["ocr_pages"] else "layout"
+    if stats["text_layer_pages"] and stats["ocr_pages"]:
+        return "mixed"
+    return "text_layer" if stats["text_layer_pages"] else "ocr"
+
+def _finish_extraction(data: Dict[str, Any], document_type: str, stats: Dict[str, Any], started: float) -> Dict[str, Any]:
+    data["document_type"] = document_type
+    stats["extraction_path"] = _extraction_path(stats)
+    stats["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    stats["preprocess_ms"] = {stage: round(ms, 1) for stage, ms in stats.get("preprocess_ms", {}).items()}
+    data["extraction"] = stats
     return data
 
-def extract_document_data(file_path: str, content_type: str) -> Dict[str, Any]:
-    text = _ocr_text(file_path)
-    filename = os.path.basename(file_path).lower()
-
-    if "w2" in filename or "w-2" in filename:
-        data = _extract_fields(text, W2_REGEX)
-        data["document_type"] = "W-2"
-        return data
-    if "1099" in filename:
-        data = _extract_fields(text, NEC_REGEX)
-        data["document_type"] = "1099-NEC"
-        return data
-    if "w9" in filename or "w-9" in filename:
-        data = _extract_fields(text, W9_REGEX)
-        data["document_type"] = "W-9"
-        return data
-
-    return {"document_type": "Unknown", "raw_text": text[:500]}
+def extract_document_data(file_path: str, content_type: str, tier: Optional[str] = None) -> Dict[str, Any]:
+    """Read a tax document and return its fields; the form is identified from its content.
+
+    ``tier`` names the image preprocessing tier (``OCR_PREPROCESS_TIER`` by default).
+    """
+    started = time.perf_counter()
+    preprocess_tier = get_tier(tier)
+    stats: Dict[str, Any] = {"text_layer_pages": 0, "ocr_pages": 0,
+                             "preprocess_tier": preprocess_tier.name, "preprocess_ms": {}}
+
+    # Digitally generated PDFs carry their text; only scanned pages need OCR
+    text_layer = _text_layer(file_path)
+    stats["text_layer_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    first_page_has_text = bool(text_layer and text_layer[0] is not None)
+
+    # Known scanned layouts: OCR just the boxes we need, then full pages only if some were missed
+    template, box_data, page = None, {}, None
+    if LAYOUTS and not first_page_has_text:
+        page = _first_page(file_path, preprocess_tier)
+        cleaned = page
+        try:
+            # Box positions are page fractions, so keep the page geometry intact
+            cleaned = preprocess(page, preprocess_tier, stats["preprocess_ms"], keep_geometry=True)
+            template, box_data = extract_with_layout(cleaned)
+        except BaseException:
+            page.close()
+            raise
+        finally:
+            if cleaned is not page:
+                cleaned.close()
+        stats["layout"] = template.name if template else None
+        if template and all(region.field in box_data for region in template.regions):
+            page.close()
+            return _finish_extraction(box_data, template.document_type, stats, started)
+
+    # The page rendered for the layout check is OCR'd as page 1 rather than rendered again
+    text = _ocr_text(file_path, get_scanner().is_complete, text_layer, stats, preprocess_tier, page)
+    data = extract_fields(text)
+    document_type = data.pop("document_type")
+    if template and document_type in ("Unknown", template.document_type):
+        document_type = template.document_type
+        data.update(box_data)
+    if document_type == "Unknown":
+        data["raw_text"] = text[:UNKNOWN_TEXT_LIMIT]
+    return _finish_extraction(data, document_type, stats, started)
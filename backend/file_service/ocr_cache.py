@@ -0,0 +1,156 @@
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import OcrCacheEntry
+from .ocr import EXTRACTOR_VERSION
+from .preprocess import get_tier
+
+class OcrCache:
+    """OCR results keyed by file content, stored in the ``ocr_cache`` table.
+
+    The key combines the upload's SHA-256, ``EXTRACTOR_VERSION`` and the
+    preprocessing tier, which is everything ``extract_document_data`` depends on. Living in
+    the database, entries survive restarts and are shared by every worker; the
+    least recently used entries are deleted once there are more than ``maxsize``.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(content_hash: str, tier: Optional[str] = None) -> str:
+        return f"{content_hash}:{EXTRACTOR_VERSION}:{get_tier(tier).name}"
+
+    def get(self, db, content_hash: Optional[str], tier: Optional[str] = None, count_miss: bool = True) -> Optional[Dict[str, Any]]:
+        """Cached extracted data for a file, or None; commits the usage update."""
+        if not content_hash:
+            return None
+        key = self.key(content_hash, tier)
+        entry = db.get(OcrCacheEntry, key)
+        if entry is None:
+            if count_miss:
+                with self._lock:
+                    self.misses += 1
+            return None
+        db.execute(
+            update(OcrCacheEntry)
+            .where(OcrCacheEntry.key == key)
+            .values(hit_count=OcrCacheEntry.hit_count + 1, last_used_at=datetime.utcnow())
+        )
+        db.commit()
+        with self._lock:
+            self.hits += 1
+        return entry.extracted_data
+
+    def get_many(self, db, content_hashes: Iterable[str], tier: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Cached extracted data by content hash for every hash that has an entry."""
+        keys = {self.key(content_hash, tier): content_hash for content_hash in set(content_hashes) if content_hash}
+        if not keys:
+            return {}
+        rows = db.execute(
+            select(OcrCacheEntry.key, OcrCacheEntry.extracted_data).where(OcrCacheEntry.key.in_(keys))
+        ).all()
+        if rows:
+            db.execute(
+                update(OcrCacheEntry)
+                .where(OcrCacheEntry.key.in_([row.key for row in rows]))
+                .values(hit_count=OcrCacheEntry.hit_count + 1, last_used_at=datetime.utcnow())
+            )
+            db.commit()
+        with self._lock:
+            self.hits += len(rows)
+            self.misses += len(keys) - len(rows)
+        return {keys[row.key]: row.extracted_data for row in rows}
+
+    def put(self, db, content_hash: Optional[str], extracted_data: Dict[str, Any],
+            tier: Optional[str] = None) -> None:
+        if not content_hash:
+            return
+        db.add(OcrCacheEntry(
+            key=self.key(content_hash, tier),
+            content_hash=content_hash,
+            extractor_version=EXTRACTOR_VERSION,
+            extracted_data=extracted_data,
+            hit_count=0
+        ))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker cached the same file first
+            db.rollback()
+            return
+        self._evict(db)
+
+    def put_many(self, db, results: Mapping[str, Dict[str, Any]], tier: Optional[str] = None) -> None:
+        """Cache several results (by content hash) with one commit."""
+        entries = [
+            OcrCacheEntry(
+                key=self.key(content_hash, tier),
+                content_hash=content_hash,
+                extractor_version=EXTRACTOR_VERSION,
+                extracted_data=extracted_data,
+                hit_count=0
+            )
+            for content_hash, extracted_data in results.items() if content_hash
+        ]
+        if not entries:
+            return
+        db.add_all(entries)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Some were cached concurrently; store the rest one by one
+            db.rollback()
+            for content_hash, extracted_data in results.items():
+                self.put(db, content_hash, extracted_data, tier)
+            return
+        self._evict(db)
+
+    def _evict(self, db) -> None:
+        overflow = db.execute(select(func.count()).select_from(OcrCacheEntry)).scalar_one() - self.maxsize
+        if overflow <= 0:
+            return
+        oldest = select(OcrCacheEntry.key).order_by(OcrCacheEntry.last_used_at).limit(overflow)
+        removed = db.execute(delete(OcrCacheEntry).where(OcrCacheEntry.key.in_(oldest))).rowcount
+        db.commit()
+        with self._lock:
+            self.evictions += removed
+
+    def clear(self, db) -> None:
+        db.execute(delete(OcrCacheEntry))
+        db.commit()
+
+    def stats(self, db) -> Dict[str, Any]:
+        """Cache size and usage counters.
+
+        ``hits``, ``misses``, ``hit_rate`` and ``evictions`` are counted in memory by
+        this process since it started, so with several server workers each reports
+        only the lookups it served. ``total_hits`` is read from the table and covers
+        every process: all hits on the entries currently cached.
+        """
+        size, stored_hits = db.execute(
+            select(func.count(), func.coalesce(func.sum(OcrCacheEntry.hit_count), 0))
+        ).one()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": size,
+                "maxsize": self.maxsize,
+                "extractor_version": EXTRACTOR_VERSION,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "total_hits": stored_hits,
+            }
+
+ocr_cache = OcrCache(maxsize=int(os.environ.get("OCR_CACHE_SIZE", "10000")))
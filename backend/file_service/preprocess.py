@@ -0,0 +1,136 @@
+"""Image clean-up before OCR, in named latency/quality tiers.
+
+Each tier is an ordered list of stages. ``preprocess`` runs them on one page and
+records how long each stage took, so tiers can be compared with
+``benchmarks/bench_ocr.py``. The tier is chosen per deployment with
+``OCR_PREPROCESS_TIER`` and can be overridden per upload.
+"""
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+
+# Letter width, used to estimate the resolution of images without DPI metadata
+PAGE_WIDTH_INCHES = 8.5
+
+@dataclass(frozen=True)
+class Tier:
+    name: str
+    dpi: int  # PDFs are rasterized at this resolution and larger images scaled down to it
+    stages: Tuple[str, ...]
+
+TIERS: Dict[str, Tier] = {
+    "none": Tier("none", 300, ()),
+    "fast": Tier("fast", 200, ("grayscale", "downscale", "binarize")),
+    "balanced": Tier("balanced", 300, ("grayscale", "downscale")),
+    "accurate": Tier("accurate", 300, ("grayscale", "downscale", "denoise", "deskew", "binarize", "crop")),
+}
+
+DEFAULT_TIER = os.environ.get("OCR_PREPROCESS_TIER", "balanced")
+
+# Stages that move content on the page; skipped when box positions must be kept
+GEOMETRY_STAGES = ("crop",)
+
+def get_tier(name: Optional[str] = None) -> Tier:
+    tier = TIERS.get(name or DEFAULT_TIER)
+    if tier is None:
+        raise ValueError(f"Unknown preprocessing tier '{name}'; expected one of {', '.join(TIERS)}")
+    return tier
+
+def _grayscale(img: Image.Image, tier: Tier) -> Image.Image:
+    return img if img.mode == "L" else img.convert("L")
+
+def _downscale(img: Image.Image, tier: Tier) -> Image.Image:
+    dpi = img.info.get("dpi", (0, 0))[0] or img.width / PAGE_WIDTH_INCHES
+    if dpi <= tier.dpi * 1.05:
+        return img
+    scale = tier.dpi / dpi
+    resample = Image.BILINEAR if tier.name == "fast" else Image.LANCZOS
+    return img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), resample)
+
+def _denoise(img: Image.Image, tier: Tier) -> Image.Image:
+    return img.filter(ImageFilter.MedianFilter(3))
+
+def _otsu_threshold(img: Image.Image) -> int:
+    hist = np.asarray(img.histogram()[:256], dtype=np.float64)
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = weight_bg[-1] - weight_bg
+    cum_mean = np.cumsum(hist * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_bg = cum_mean / weight_bg
+        mean_fg = (cum_mean[-1] - cum_mean) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.nanargmax(between))
+
+def _binarize(img: Image.Image, tier: Tier) -> Image.Image:
+    if img.mode != "L":
+        img = img.convert("L")
+    threshold = _otsu_threshold(img)
+    return img.point([0 if level <= threshold else 255 for level in range(256)])
+
+def _skew_angle(img: Image.Image, max_angle: float = 3.0, step: float = 0.25) -> float:
+    """Angle that makes text rows most distinct (highest variance of row ink)."""
+    small = img.convert("L")
+    if small.width > 1000:
+        small = small.resize((1000, max(1, int(small.height * 1000 / small.width))))
+    ink = ImageOps.invert(small)
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        rows = np.asarray(ink.rotate(float(angle), fillcolor=0), dtype=np.float32).sum(axis=1)
+        score = float(np.var(rows))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+def _deskew(img: Image.Image, tier: Tier) -> Image.Image:
+    angle = _skew_angle(img)
+    if abs(angle) < 0.1:
+        return img
+    return img.rotate(angle, resample=Image.BILINEAR, fillcolor=255, expand=False)
+
+def _crop(img: Image.Image, tier: Tier, padding: int = 10) -> Image.Image:
+    ink = ImageOps.invert(img.convert("L")).point([0 if level < 64 else 255 for level in range(256)])
+    bbox = ink.getbbox()
+    if bbox is None:
+        return img
+    left, top, right, bottom = bbox
+    return img.crop((max(0, left - padding), max(0, top - padding),
+                     min(img.width, right + padding), min(img.height, bottom + padding)))
+
+STAGES: Dict[str, Callable[[Image.Image, Tier], Image.Image]] = {
+    "grayscale": _grayscale,
+    "downscale": _downscale,
+    "denoise": _denoise,
+    "deskew": _deskew,
+    "binarize": _binarize,
+    "crop": _crop,
+}
+
+def preprocess(
+    img: Image.Image,
+    tier: Tier,
+    timings: Optional[Dict[str, float]] = None,
+    keep_geometry: bool = False
+) -> Image.Image:
+    """Run ``tier``'s stages on a page, adding milliseconds per stage to ``timings``.
+
+    With ``keep_geometry`` stages that move content (margin cropping) are skipped,
+    for callers that locate boxes by page position. Intermediate images are
+    closed; the input image is left to the caller.
+    """
+    current = img
+    for stage in tier.stages:
+        if keep_geometry and stage in GEOMETRY_STAGES:
+            continue
+        started = time.perf_counter()
+        result = STAGES[stage](current, tier)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - started) * 1000
+        if result is not current and current is not img:
+            current.close()
+        current = result
+    return current
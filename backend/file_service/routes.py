@@ -1,92 +1,325 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.routing import APIRoute
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
+import asyncio
+import hashlib
 import os
-import json
-from database import SessionLocal
-from models import Document, TaxSubmission
+import tempfile
+from database import get_async_db, get_db
+from models import Document, OcrJob
 from auth.routes import get_current_user
-from .ocr import extract_document_data  # Real OCR instead of mock
+from admin.routes import is_admin
+from .jobs import (
+    apply_extraction, completed_ocr_job, enqueue_ocr_job, extract_stored, ocr_worker, sync_draft_with_documents,
+)
+from .ocr_cache import ocr_cache
+from .preprocess import get_tier
+from .storage import acquire, discard_unreferenced, ensure_stored, get_storage, release
+from tax_engine.cache import result_cache
 from tax_engine.mapping import map_document_to_form1040
 
-router = APIRouter()
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_BATCH_FILES = int(os.environ.get("MAX_BATCH_FILES", "20"))
+# Room for multipart boundaries, part headers and small form fields on top of the files
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+def _reject_oversized(request: Request, limit: int = MAX_UPLOAD_BYTES) -> None:
+    """Refuse a request whose declared length already exceeds the upload limit."""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the {limit} byte limit")
 
-def get_db():
-    db = SessionLocal()
+def body_limit(limit: int):
+    """Cap an endpoint's request body at ``limit`` bytes; enforced by ``UploadLimitRoute``."""
+    def decorate(endpoint):
+        endpoint.max_body_bytes = limit
+        return endpoint
+    return decorate
+
+class UploadLimitRoute(APIRoute):
+    """Applies an endpoint's ``body_limit`` to the ASGI receive stream.
+
+    FastAPI parses a multipart form, spooling the files to disk, before the
+    endpoint runs, so a check inside the endpoint comes too late. Here a declared
+    Content-Length over the limit is refused before anything is read, and a body
+    without one is cut off with 413 as soon as it passes the limit.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not hasattr(self.endpoint, "max_body_bytes"):
+            return handler
+
+        async def limited_handler(request: Request) -> Response:
+            limit = self.endpoint.max_body_bytes
+            _reject_oversized(request, limit)
+            receive = request.receive
+            received = 0
+
+            async def limited_receive():
+                nonlocal received
+                message = await receive()
+                if message["type"] == "http.request":
+                    received += len(message.get("body", b""))
+                    if received > limit:
+                        raise HTTPException(status_code=413, detail=f"Upload exceeds the {limit} byte limit")
+                return message
+
+            return await handler(Request(request.scope, limited_receive))
+
+        return limited_handler
+
+router = APIRouter(route_class=UploadLimitRoute)
+
+def _append_chunk(f, digest, chunk: bytes) -> None:
+    digest.update(chunk)
+    f.write(chunk)
+
+def _preprocess_tier(name: Optional[str]) -> str:
+    """Resolve a requested preprocessing tier (or the deployment default) to its name."""
+    try:
+        return get_tier(name).name
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _save_upload(file: UploadFile) -> Tuple[str, int, str]:
+    """Stream an upload into storage in fixed-size chunks; returns (sha256 hex, size, temp path).
+
+    The bytes go to a temporary file first, since the storage key is their hash,
+    and only one chunk is held in memory at a time. The temporary file is removed
+    if the upload turns out to be over the size limit or the write fails. The
+    caller records the reference with ``acquire`` in the transaction that saves
+    the document, then hands the temporary file to ``ensure_stored`` (or to
+    ``discard_unreferenced`` if saving failed).
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
+
+    storage = get_storage()
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=storage.temp_dir(), suffix=".part")
     try:
-        yield db
-    finally:
-        db.close()
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
+                # Hashing and disk writes block, so they run off the event loop
+                await run_in_threadpool(_append_chunk, f, digest, chunk)
+        content_hash = digest.hexdigest()
+        await asyncio.to_thread(storage.put, tmp_path, content_hash)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return content_hash, size, tmp_path
 
 @router.post("/upload")
+@body_limit(MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES)
 async def upload_file(
     file: UploadFile = File(...),
+    preprocess: Optional[str] = None,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    tier = _preprocess_tier(preprocess)
     file_id = str(uuid4())
-    filename = f"{file_id}_{file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
     
-    # Save uploaded file
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    # Save uploaded file; identical bytes are stored once
+    content_hash, file_size, tmp_path = await _save_upload(file)
     
-    # Extract data using real OCR
-    extracted_data = extract_document_data(file_path, file.content_type)
-    
-    # Save document to database
-    doc = Document(
-        id=file_id,
-        user_email=current_user.email,
-        filename=file.filename,
-        file_path=file_path,
-        content_type=file.content_type,
-        document_type=extracted_data.get("document_type", "Unknown"),
-        extracted_data=json.dumps(extracted_data)
-    )
-    db.add(doc)
-    db.commit()
-    db.refresh(doc)
+    try:
+        # Re-uploads of a file we have already read skip OCR entirely
+        cached_data = await db.run_sync(ocr_cache.get, content_hash, tier)
 
-    # Map extracted data to Form 1040 fields and auto-populate draft
-    auto_fields = map_document_to_form1040(extracted_data)
-    
-    if auto_fields:  # Only create/update draft if we have mappable data
-        # Check if user already has a draft tax submission
-        draft = db.query(TaxSubmission).filter(
-            TaxSubmission.user_email == current_user.email,
-            TaxSubmission.status == "draft"
-        ).first()
-
-        if draft:
-            # Merge new data with existing draft
-            existing_data = json.loads(draft.form_data) if draft.form_data else {}
-            merged_data = {**existing_data, **auto_fields}
-            draft.form_data = json.dumps(merged_data)
+        # Otherwise OCR runs in the background worker and fills the document in when it finishes
+        doc = Document(
+            id=file_id,
+            user_email=current_user.email,
+            user_id=current_user.id,
+            filename=file.filename,
+            file_path=content_hash,
+            content_type=file.content_type,
+            content_hash=content_hash,
+            file_size=file_size,
+            document_type="Pending",
+            extracted_data=None
+        )
+        db.add(doc)
+        await db.run_sync(acquire, content_hash, file_size)
+        auto_fields = None
+        if cached_data is not None:
+            # The draft merge is shared with the sync OCR worker, so it runs on the session's sync facade
+            auto_fields = await db.run_sync(apply_extraction, doc, cached_data)
+            job = completed_ocr_job(db, doc, tier)
         else:
-            # Create new draft submission
-            draft = TaxSubmission(
-                id=str(uuid4()),
-                user_email=current_user.email,
-                form_data=json.dumps(auto_fields),
-                status="draft"
-            )
-            db.add(draft)
-        
-        db.commit()
+            job = enqueue_ocr_job(db, doc, tier)
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        await db.run_sync(discard_unreferenced, content_hash, tmp_path)
+        raise
+    # A release of the same key may have deleted the bytes since _save_upload stored them
+    await asyncio.to_thread(ensure_stored, tmp_path, content_hash)
+    await db.refresh(doc)
+    if cached_data is not None:
+        result_cache.invalidate_user(current_user.email)
+    else:
+        ocr_worker.notify()
 
-    return {
+    response = {
         "id": doc.id,
         "filename": doc.filename,
-        "extracted_data": extracted_data,
-        "uploaded_at": doc.uploaded_at,
-        "auto_populated_fields": auto_fields if auto_fields else None
+        "size": doc.file_size,
+        "sha256": doc.content_hash,
+        "job_id": job.id,
+        "status": job.status,
+        "uploaded_at": doc.uploaded_at
+    }
+    if cached_data is not None:
+        response["extracted_data"] = cached_data
+        response["auto_populated_fields"] = auto_fields
+    return response
+
+@router.post("/upload-batch")
+@body_limit(MAX_UPLOAD_BYTES * MAX_BATCH_FILES + MULTIPART_OVERHEAD_BYTES)
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    preprocess: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Upload several documents, extract them concurrently and update the draft once"""
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FILES} files per batch")
+    tier = _preprocess_tier(preprocess)
+
+    saved: List[Dict[str, Any]] = []
+    tmp_paths: List[str] = []
+    try:
+        for file in files:
+            content_hash, file_size, tmp_path = await _save_upload(file)
+            tmp_paths.append(tmp_path)
+            saved.append({
+                "id": str(uuid4()),
+                "user_email": current_user.email,
+                "user_id": current_user.id,
+                "filename": file.filename,
+                "file_path": content_hash,
+                "content_type": file.content_type,
+                "content_hash": content_hash,
+                "file_size": file_size,
+            })
+    except BaseException:
+        for row, tmp_path in zip(saved, tmp_paths):
+            await db.run_sync(discard_unreferenced, row["file_path"], tmp_path)
+        raise
+
+    try:
+        # One cache lookup for the whole batch; identical files are extracted once
+        results = await db.run_sync(ocr_cache.get_many, [row["content_hash"] for row in saved], tier)
+        to_extract = {}
+        for row in saved:
+            if row["content_hash"] not in results:
+                to_extract.setdefault(row["content_hash"], row)
+        outcomes = await asyncio.gather(*(
+            asyncio.wrap_future(ocr_worker.submit(extract_stored, row["file_path"], row["content_type"], tier))
+            for row in to_extract.values()
+        ), return_exceptions=True)
+    except BaseException:
+        for row, tmp_path in zip(saved, tmp_paths):
+            await db.run_sync(discard_unreferenced, row["file_path"], tmp_path)
+        raise
+
+    extracted, errors = {}, {}
+    for content_hash, outcome in zip(to_extract, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"Batch extraction failed for {to_extract[content_hash]['filename']}: {outcome}")
+            errors[content_hash] = str(outcome) or type(outcome).__name__
+        else:
+            extracted[content_hash] = outcome
+    results.update(extracted)
+
+    documents = []
+    for row in saved:
+        data = results.get(row["content_hash"])
+        row["document_type"] = data.get("document_type", "Unknown") if data else "Unknown"
+        row["extracted_data"] = data
+        fields = map_document_to_form1040(data) if data else {}
+        documents.append({
+            "id": row["id"],
+            "filename": row["filename"],
+            "size": row["file_size"],
+            "sha256": row["content_hash"],
+            "document_type": row["document_type"],
+            "extracted_data": data,
+            "auto_populated_fields": fields or None,
+            "error": errors.get(row["content_hash"])
+        })
+
+    # The draft gets the same totals /upload would give: each distinct file counted once
+    try:
+        await db.execute(insert(Document), saved)
+        for row in saved:
+            await db.run_sync(acquire, row["file_path"], row["file_size"])
+        batch_fields = await db.run_sync(sync_draft_with_documents, current_user.email, current_user.id)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        print(f"Batch upload error: {e}")
+        for row, tmp_path in zip(saved, tmp_paths):
+            await db.run_sync(discard_unreferenced, row["file_path"], tmp_path)
+        raise HTTPException(status_code=500, detail="Failed to save documents")
+    for row, tmp_path in zip(saved, tmp_paths):
+        await asyncio.to_thread(ensure_stored, tmp_path, row["file_path"])
+
+    if batch_fields:
+        result_cache.invalidate_user(current_user.email)
+    await db.run_sync(ocr_cache.put_many, extracted, tier)
+
+    return {
+        "documents": documents,
+        "auto_populated_fields": batch_fields or None
     }
 
+@router.get("/jobs/{job_id}")
+def get_job_status(job_id: str, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Get the status of an OCR job"""
+    job = db.query(OcrJob).filter(
+        OcrJob.id == job_id,
+        OcrJob.user_email == current_user.email
+    ).first()
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    response = job.to_dict()
+    if job.status == "done":
+        doc = db.query(Document).filter(Document.id == job.document_id).first()
+        extracted_data = (doc.extracted_data if doc else None) or {}
+        response["document_type"] = doc.document_type if doc else None
+        response["extracted_data"] = extracted_data
+        response["auto_populated_fields"] = map_document_to_form1040(extracted_data) or None
+    return response
+
+@router.get("/ocr-cache-stats")
+def get_ocr_cache_stats(current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Get size and hit/miss counters for the OCR result cache (hit/miss are this worker's own)"""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return ocr_cache.stats(db)
+
 @router.get("/")
 def list_files(current_user = Depends(get_current_user), db: Session = Depends(get_db)):
     docs = db.query(Document).filter(Document.user_email == current_user.email).all()
@@ -96,7 +329,7 @@ def list_files(current_user = Depends(get_current_user), db: Session = Depends(g
                 "id": d.id,
                 "filename": d.filename,
                 "document_type": d.document_type,
-                "extracted_data": json.loads(d.extracted_data) if d.extracted_data else None,
+                "extracted_data": d.extracted_data,
                 "uploaded_at": d.uploaded_at.isoformat() if d.uploaded_at else None
             } for d in docs
         ]
@@ -105,11 +338,11 @@ def list_files(current_user = Depends(get_current_user), db: Session = Depends(g
 @router.get("/user-documents")
 async def get_user_documents(
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all documents for the current user"""
     try:
-        docs = db.query(Document).filter(Document.user_email == current_user.email).all()
+        docs = (await db.scalars(select(Document).where(Document.user_email == current_user.email))).all()
         
         documents = []
         for doc in docs:
@@ -118,7 +351,7 @@ async def get_user_documents(
                 "filename": doc.filename,
                 "document_type": doc.document_type,
                 "upload_date": doc.uploaded_at.isoformat() if doc.uploaded_at else None,
-                "extracted_data": json.loads(doc.extracted_data) if doc.extracted_data else None
+                "extracted_data": doc.extracted_data
             }
             documents.append(doc_data)
         
@@ -126,39 +359,100 @@ async def get_user_documents(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch documents: {str(e)}")
 
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our ETag."""
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
 @router.get("/download/{document_id}")
 async def download_file(
     document_id: str,
+    request: Request,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Download a specific document"""
+    """Stream a stored document, with Range and If-None-Match support"""
+    doc = await db.scalar(select(Document).where(
+        Document.id == document_id,
+        Document.user_email == current_user.email
+    ))
+    
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    storage = get_storage()
+    file_path = storage.local_path(doc.file_path) if doc.file_path else None
+    if file_path is None:
+        # Remote backends hand out a short-lived URL; the object store serves Range/ETag itself
+        url = storage.url(doc.file_path, doc.filename, doc.content_type) if doc.file_path else None
+        if url is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-store"})
+
+    try:
+        stat_result = os.stat(file_path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    # FileResponse answers Range/If-Range with 206 and streams from disk (zero-copy where
+    # the server supports pathsend); the content hash makes a strong, stable ETag
+    headers = {"Cache-Control": "private, max-age=0, must-revalidate"}
+    if doc.content_hash:
+        headers["ETag"] = f'"{doc.content_hash}"'
+    response = FileResponse(
+        file_path,
+        stat_result=stat_result,
+        media_type=doc.content_type or "application/octet-stream",
+        filename=doc.filename,
+        content_disposition_type="inline",
+        headers=headers
+    )
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, response.headers["etag"]):
+        return Response(status_code=304, headers={
+            "ETag": response.headers["etag"],
+            "Cache-Control": headers["Cache-Control"],
+        })
+    return response
+
+@router.delete("/{document_id}")
+def delete_file(document_id: str, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Delete a document; its stored file goes once no other document shares it"""
     doc = db.query(Document).filter(
         Document.id == document_id,
         Document.user_email == current_user.email
     ).first()
-    
+
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
-    
-    return {"download_url": f"/uploads/{doc.filename}", "filename": doc.filename}
+
+    key = doc.file_path
+    db.delete(doc)
+    if key:
+        release(db, key)
+    else:
+        db.commit()
+    return {"message": "Document deleted", "id": document_id}
 
 @router.get("/extracted-data/{document_id}")
 async def get_extracted_data(
     document_id: str,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get extracted data for a specific document"""
-    doc = db.query(Document).filter(
+    doc = await db.scalar(select(Document).where(
         Document.id == document_id,
         Document.user_email == current_user.email
-    ).first()
+    ))
     
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    extracted_data = json.loads(doc.extracted_data) if doc.extracted_data else {}
+    extracted_data = doc.extracted_data or {}
     
     return {
         "document_id": doc.id,
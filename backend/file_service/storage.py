@@ -0,0 +1,278 @@
+"""Content-addressed storage for uploaded files.
+
+An upload's storage key is the SHA-256 of its bytes, so identical files are
+stored once. ``StoredObject`` rows count how many documents reference each key
+and an object is deleted when its count drops to zero. Backends:
+
+* ``LocalStorage`` keeps objects under ``STORAGE_ROOT`` sharded by hash prefix
+  (``ab/cd/abcd...``) so no directory grows past a few thousand entries.
+* ``S3Storage`` keeps them in an S3-compatible bucket through an injected
+  client (boto3, or anything with the same methods, e.g. pointed at MinIO).
+
+Keys written before content addressing are plain relative paths
+(``uploads/<uuid>_<name>``); ``LocalStorage`` still resolves them.
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Iterator, Optional
+from urllib.parse import quote
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import StoredObject
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "local")
+STORAGE_ROOT = os.environ.get("STORAGE_ROOT", "uploads")
+S3_BUCKET = os.environ.get("S3_BUCKET", "")
+S3_PREFIX = os.environ.get("S3_PREFIX", "documents/")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL")  # e.g. a local MinIO
+S3_URL_EXPIRES = int(os.environ.get("S3_URL_EXPIRES", "300"))
+
+def is_content_key(key: str) -> bool:
+    return len(key) == 64 and all(ch in "0123456789abcdef" for ch in key)
+
+def shard_path(key: str) -> str:
+    return f"{key[:2]}/{key[2:4]}/{key}"
+
+def content_disposition(filename: str, disposition: str = "inline") -> str:
+    """A Content-Disposition value for ``filename``, encoded the way FileResponse does.
+
+    Names that need quoting (quotes, semicolons, non-ASCII) use the RFC 5987
+    ``filename*`` form, so they cannot break out of the header value.
+    """
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+class Storage(ABC):
+    """Where object bytes live; reference counting is handled by ``acquire``/``release``."""
+
+    def temp_dir(self) -> Optional[str]:
+        """Directory for in-progress uploads (same filesystem as the store when possible)."""
+        return None
+
+    @abstractmethod
+    def put(self, src_path: str, key: str) -> None:
+        """Store the finished upload at ``src_path`` under ``key``; the caller keeps ``src_path``."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove the object; a missing object is not an error."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether the object's bytes are currently stored."""
+
+    def local_path(self, key: str) -> Optional[str]:
+        """A filesystem path for ``key`` if the backend has one, else None."""
+        return None
+
+    @contextlib.contextmanager
+    def local_copy(self, key: str) -> Iterator[str]:
+        """A filesystem path holding the object's bytes for the duration of the block."""
+        path = self.local_path(key)
+        if path is not None:
+            yield path
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.temp_dir())
+        os.close(fd)
+        try:
+            self.download(key, tmp_path)
+            yield tmp_path
+        finally:
+            os.remove(tmp_path)
+
+    @abstractmethod
+    def download(self, key: str, dest_path: str) -> None:
+        """Copy the object's bytes to ``dest_path``."""
+
+    def url(self, key: str, filename: Optional[str] = None, content_type: Optional[str] = None) -> Optional[str]:
+        """A time-limited URL clients can fetch the object from, if the backend offers one."""
+        return None
+
+class LocalStorage(Storage):
+    def __init__(self, root: str = STORAGE_ROOT):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        if is_content_key(key):
+            return os.path.join(self.root, shard_path(key))
+        return key  # legacy uploads/<uuid>_<name> path
+
+    def temp_dir(self) -> str:
+        path = os.path.join(self.root, "tmp")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def put(self, src_path: str, key: str) -> None:
+        dest = self._path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        # A hard link is atomic and keeps the source for the caller; same key means
+        # same bytes, so an existing copy is left as it is
+        try:
+            os.link(src_path, dest)
+        except FileExistsError:
+            pass
+        except OSError:
+            # No hard links (e.g. the temp dir is on another filesystem)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest), suffix=".part")
+            os.close(fd)
+            try:
+                shutil.copyfile(src_path, tmp_path)
+                os.replace(tmp_path, dest)
+            except BaseException:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(tmp_path)
+                raise
+
+    def delete(self, key: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path(key))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+    def download(self, key: str, dest_path: str) -> None:
+        shutil.copyfile(self._path(key), dest_path)
+
+class S3Storage(Storage):
+    """Objects in an S3-compatible bucket; ``client`` follows the boto3 S3 client API."""
+
+    def __init__(self, client: Any, bucket: str, prefix: str = S3_PREFIX):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _object_key(self, key: str) -> str:
+        return self.prefix + (shard_path(key) if is_content_key(key) else key)
+
+    def put(self, src_path: str, key: str) -> None:
+        self.client.upload_file(src_path, self.bucket, self._object_key(key))
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except Exception as e:
+            # botocore's ClientError carries the HTTP status in ``response``
+            code = getattr(e, "response", {}).get("Error", {}).get("Code")
+            if code in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def download(self, key: str, dest_path: str) -> None:
+        self.client.download_file(self.bucket, self._object_key(key), dest_path)
+
+    def url(self, key: str, filename: Optional[str] = None, content_type: Optional[str] = None) -> Optional[str]:
+        params = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if filename:
+            params["ResponseContentDisposition"] = content_disposition(filename)
+        if content_type:
+            params["ResponseContentType"] = content_type
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=S3_URL_EXPIRES)
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+def configure_storage(storage: Storage) -> Storage:
+    """Replace the process-wide backend (e.g. an S3Storage with a client built elsewhere)."""
+    global _storage
+    with _storage_lock:
+        _storage = storage
+    return storage
+
+def get_storage() -> Storage:
+    """The configured backend, built from the environment on first use."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND == "s3":
+                import boto3  # only needed for the S3 backend
+                client = boto3.client("s3", endpoint_url=S3_ENDPOINT_URL)
+                _storage = S3Storage(client, S3_BUCKET)
+            elif STORAGE_BACKEND == "local":
+                _storage = LocalStorage()
+            else:
+                raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'")
+        return _storage
+
+def acquire(db, key: str, size: Optional[int]) -> None:
+    """Count one more reference to ``key``; the caller commits with the referencing row."""
+    values = {"key": key, "size": size, "refcount": 1, "created_at": datetime.utcnow()}
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(StoredObject).values(**values)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[StoredObject.key],
+            set_={"refcount": StoredObject.refcount + 1}
+        ))
+        return
+    updated = db.execute(
+        update(StoredObject).where(StoredObject.key == key).values(refcount=StoredObject.refcount + 1)
+    ).rowcount
+    if not updated:
+        db.add(StoredObject(**values))
+
+def release(db, key: str) -> bool:
+    """Drop one reference to ``key`` and commit (with any pending changes, such as
+    the document delete); the object is deleted once nothing references it.
+
+    The row stays locked until the commit, so an ``acquire`` of the same key waits
+    for it. The bytes are deleted before the commit for the same reason: an upload
+    that re-acquires the key commits after the delete, and ``ensure_stored`` then
+    puts its copy back. If the commit fails after the delete, only the document
+    being deleted (the last reference) has lost its bytes.
+    """
+    removed = True
+    if is_content_key(key):
+        locked = db.execute(
+            select(StoredObject.key).where(StoredObject.key == key).with_for_update()
+        ).first()
+        if locked is not None:
+            db.execute(
+                update(StoredObject).where(StoredObject.key == key).values(refcount=StoredObject.refcount - 1)
+            )
+            removed = db.execute(
+                delete(StoredObject).where(StoredObject.key == key, StoredObject.refcount <= 0)
+            ).rowcount > 0
+    if removed:
+        db.flush()
+        get_storage().delete(key)
+    db.commit()
+    return removed
+
+def ensure_stored(src_path: str, key: str) -> None:
+    """Finish an upload once its ``acquire`` has committed: put the bytes back if a
+    concurrent ``release`` or ``discard_unreferenced`` deleted the object after
+    ``put``, then remove the upload's temporary file."""
+    try:
+        storage = get_storage()
+        if not storage.exists(key):
+            storage.put(src_path, key)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(src_path)
+
+def discard_unreferenced(db, key: str, src_path: Optional[str] = None) -> None:
+    """Delete an object that was stored but never referenced (a failed upload),
+    along with the upload's temporary file."""
+    if src_path is not None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(src_path)
+    if db.get(StoredObject, key) is None:
+        get_storage().delete(key)
@@ -1,6 +1,21 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
-app = FastAPI()
+from file_service.jobs import ocr_worker
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resume OCR jobs left in the queue by a previous run
+    ocr_worker.start()
+    try:
+        yield
+    finally:
+        # stop() joins the dispatcher thread and shuts the process pool down
+        await asyncio.to_thread(ocr_worker.stop)
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 async def root():
@@ -8,4 +23,4 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "message": "Tax API is running"}
+    return {"status": "healthy", "message": "Tax API is running"}
\ No newline at end of file
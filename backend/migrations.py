@@ -0,0 +1,211 @@
+"""Lightweight schema migrations for databases created from older models.
+
+``Base.metadata.create_all`` only creates missing tables; columns and indexes
+added to existing tables never appear. ``migrate`` brings a database up to the
+current models in two steps:
+
+1. Schema sync: create missing tables, add missing columns (always nullable)
+   and create missing indexes. Safe to run on every deploy.
+2. Revisions: named data migrations (backfills), each applied once and
+   recorded in ``schema_migrations``.
+
+Run from the backend directory::
+
+    python migrations.py
+"""
+import json
+import sys
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column, DateTime, MetaData, String, Table, Text, cast, func, inspect, literal, select, text, update,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex
+
+from models import Base, Document, OcrCacheEntry, Payment, TaxSubmission, User, W9Form
+from tax_engine.tax_return import TaxReturn
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("revision", String, primary_key=True),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+def _quote(conn: Connection, name: str) -> str:
+    return conn.dialect.identifier_preparer.quote(name)
+
+def _column_ddl(conn: Connection, column: Column) -> str:
+    ddl = f"{_quote(conn, column.name)} {column.type.compile(dialect=conn.dialect)}"
+    for fk in column.foreign_keys:
+        target = fk.column
+        ddl += f" REFERENCES {_quote(conn, target.table.name)} ({_quote(conn, target.name)})"
+        if fk.ondelete:
+            ddl += f" ON DELETE {fk.ondelete}"
+    return ddl
+
+def _decode_json_object(raw: Optional[str]) -> Optional[Dict[str, Any]]:
+    """A JSON object stored as text, or None for NULL, '' or anything else."""
+    if not raw:
+        return None
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+def _merge_duplicate_drafts(conn: Connection) -> None:
+    """Fold each user's extra drafts into the newest one so only one draft remains.
+
+    Fields from newer drafts win; the older rows are kept with status "superseded".
+    """
+    table = TaxSubmission.__table__
+    is_draft = table.c.status == "draft"
+    emails = conn.execute(
+        select(table.c.user_email).where(is_draft).group_by(table.c.user_email).having(func.count() > 1)
+    ).scalars().all()
+    for email in emails:
+        # This runs before 0002_json_columns, so form_data may still be a TEXT column
+        # (Postgres hands it back undecoded) holding '' or malformed JSON: read and
+        # write it as text whatever the column type is at this point
+        rows = conn.execute(
+            select(table.c.id, cast(table.c.form_data, Text).label("form_data"))
+            .where(is_draft, table.c.user_email == email)
+            .order_by(table.c.submitted_at, table.c.id)
+        ).all()
+        merged = TaxReturn.parse(*(_decode_json_object(row.form_data) for row in rows))
+        keep = rows[-1].id
+        conn.execute(
+            update(table)
+            .where(table.c.id == keep)
+            .values({table.c.form_data: literal(json.dumps(merged.to_dict()), Text)})
+        )
+        conn.execute(
+            update(table)
+            .where(table.c.id.in_([row.id for row in rows[:-1]]))
+            .values(status="superseded")
+        )
+
+# Data fixes a new index needs before it can be created (e.g. duplicates under a unique index)
+BEFORE_INDEX: Dict[str, Callable[[Connection], None]] = {
+    "uq_tax_submissions_user_email_draft": _merge_duplicate_drafts,
+}
+
+def sync_schema(conn: Connection) -> List[str]:
+    """Create missing tables, columns and indexes; returns what was changed."""
+    changes = []
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            table.create(conn)
+            changes.append(f"create table {table.name}")
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                conn.execute(text(
+                    f"ALTER TABLE {_quote(conn, table.name)} ADD COLUMN {_column_ddl(conn, column)}"
+                ))
+                changes.append(f"add column {table.name}.{column.name}")
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                if index.name in BEFORE_INDEX:
+                    BEFORE_INDEX[index.name](conn)
+                conn.execute(CreateIndex(index))
+                changes.append(f"create index {index.name}")
+    return changes
+
+def _backfill_user_ids(conn: Connection) -> None:
+    """Set the integer user_id on rows that only carry user_email."""
+    for model in (Document, TaxSubmission, Payment, W9Form):
+        table = model.__table__
+        conn.execute(
+            update(table)
+            .where(table.c.user_id.is_(None))
+            .values(user_id=select(User.id).where(User.email == table.c.user_email).scalar_subquery())
+        )
+
+JSON_COLUMNS = (
+    (TaxSubmission.__table__, "form_data"),
+    (Document.__table__, "extracted_data"),
+    (OcrCacheEntry.__table__, "extracted_data"),
+)
+
+def _json_columns(conn: Connection) -> None:
+    """Convert JSON stored as text to the native type.
+
+    Postgres columns become JSONB. SQLite keeps JSON as text, so only values its
+    JSON functions would reject (empty or malformed strings) are cleared.
+    """
+    inspector = inspect(conn)
+    for table, name in JSON_COLUMNS:
+        column = _quote(conn, name)
+        if conn.dialect.name == "postgresql":
+            current = next(c["type"] for c in inspector.get_columns(table.name) if c["name"] == name)
+            if current.__class__.__name__ != "JSONB":
+                conn.execute(text(
+                    f"ALTER TABLE {_quote(conn, table.name)} ALTER COLUMN {column} "
+                    f"TYPE JSONB USING NULLIF({column}, '')::jsonb"
+                ))
+        elif conn.dialect.name == "sqlite":
+            conn.execute(text(
+                f"UPDATE {_quote(conn, table.name)} SET {column} = NULL "
+                f"WHERE {column} IS NOT NULL AND json_valid({column}) = 0"
+            ))
+
+def _w9_document_fk(conn: Connection) -> None:
+    """Make w9_forms.document_id a foreign key that is nulled when its document is deleted.
+
+    Only Postgres enforces the constraint here; SQLite runs without
+    ``PRAGMA foreign_keys`` and cannot alter a constraint in place.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    table = W9Form.__table__
+    for fk in inspect(conn).get_foreign_keys(table.name):
+        if fk["constrained_columns"] == ["document_id"]:
+            conn.execute(text(f"ALTER TABLE {_quote(conn, table.name)} DROP CONSTRAINT {_quote(conn, fk['name'])}"))
+    # Rows pointing at documents deleted before the constraint existed
+    conn.execute(
+        update(table)
+        .where(table.c.document_id.is_not(None), ~table.c.document_id.in_(select(Document.id)))
+        .values(document_id=None)
+    )
+    conn.execute(text(
+        f"ALTER TABLE {_quote(conn, table.name)} ADD CONSTRAINT w9_forms_document_id_fkey "
+        f"FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE SET NULL"
+    ))
+
+# Applied in order, each exactly once
+REVISIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_backfill_user_ids", _backfill_user_ids),
+    ("0002_json_columns", _json_columns),
+    ("0003_w9_document_fk", _w9_document_fk),
+]
+
+def migrate(engine: Engine = None) -> List[str]:
+    """Sync the schema and apply pending revisions; returns a log of what ran."""
+    if engine is None:
+        from database import engine
+    log = []
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        log += sync_schema(conn)
+        applied = set(conn.execute(select(schema_migrations.c.revision)).scalars())
+        for revision, apply in REVISIONS:
+            if revision in applied:
+                continue
+            apply(conn)
+            conn.execute(schema_migrations.insert().values(revision=revision, applied_at=datetime.utcnow()))
+            log.append(f"apply {revision}")
+    return log
+
+if __name__ == "__main__":
+    changes = migrate()
+    for change in changes:
+        print(change)
+    print("Schema is up to date" if not changes else f"{len(changes)} change(s) applied")
+    sys.exit(0)
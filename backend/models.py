@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean, ForeignKey, Index, JSON, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 Base = declarative_base()
 
+# JSONB on Postgres, JSON text elsewhere (SQLite's json1 functions still apply); None is SQL NULL
+JSONDocument = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql")
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -22,11 +26,14 @@ class Document(Base):
     __tablename__ = "documents"
     id = Column(String, primary_key=True, index=True)
     user_email = Column(String, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     filename = Column(String)
-    file_path = Column(String)
+    file_path = Column(String)  # storage key (see file_service/storage.py)
     content_type = Column(String)
+    content_hash = Column(String, index=True)  # SHA-256 of the uploaded bytes
+    file_size = Column(Integer)
     document_type = Column(String)  # W-2, 1099-NEC, W-9, etc.
-    extracted_data = Column(Text)  # JSON string
+    extracted_data = Column(JSONDocument)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
 
     def to_dict(self):
@@ -35,25 +42,85 @@ class Document(Base):
             "filename": self.filename,
             "file_path": self.file_path,
             "content_type": self.content_type,
+            "content_hash": self.content_hash,
+            "file_size": self.file_size,
             "document_type": self.document_type,
             "uploaded_at": self.uploaded_at.isoformat() if self.uploaded_at else None,
         }
 
+class OcrJob(Base):
+    __tablename__ = "ocr_jobs"
+    id = Column(String, primary_key=True, index=True)
+    document_id = Column(String, index=True)
+    user_email = Column(String, index=True)
+    status = Column(String, default="queued", index=True)  # queued, running, done, failed
+    preprocess_tier = Column(String)  # None means the deployment default
+    attempts = Column(Integer, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "document_id": self.document_id,
+            "status": self.status,
+            "preprocess_tier": self.preprocess_tier,
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+class OcrCacheEntry(Base):
+    __tablename__ = "ocr_cache"
+    key = Column(String, primary_key=True)  # content hash + extractor version + type hint
+    content_hash = Column(String, index=True)
+    extractor_version = Column(String)
+    extracted_data = Column(JSONDocument)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class StoredObject(Base):
+    __tablename__ = "stored_objects"
+    key = Column(String, primary_key=True)  # SHA-256 of the stored bytes
+    size = Column(Integer)
+    refcount = Column(Integer, default=0)  # documents pointing at this object
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class TaxSubmission(Base):
     __tablename__ = "tax_submissions"
+    # Draft lookups (user_email + status = 'draft') run on every upload, save and calculate;
+    # the partial unique index allows one draft per user and is the ON CONFLICT target
+    # when a draft is created
+    __table_args__ = (
+        Index("ix_tax_submissions_user_email_status", "user_email", "status"),
+        Index("uq_tax_submissions_user_email_draft", "user_email", unique=True,
+              postgresql_where=text("status = 'draft'"), sqlite_where=text("status = 'draft'")),
+    )
     id = Column(String, primary_key=True, index=True)
     user_email = Column(String, index=True)
-    form_data = Column(Text)  # JSON string
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    form_data = Column(JSONDocument)
     status = Column(String, default="pending")
     submitted_at = Column(DateTime, default=datetime.utcnow)
     tax_owed = Column(Float, default=0.0)
     refund_amount = Column(Float, default=0.0)
+    filing_status = Column(String)  # rule pack key, set when the return is submitted
+    state = Column(String)  # two-letter state of residence, set when the return is submitted
+    tax_year = Column(Integer)  # rule year the return was filed under, set when it is submitted
 
     def to_dict(self):
         return {
             "id": self.id,
             "user_email": self.user_email,
             "status": self.status,
+            "filing_status": self.filing_status,
+            "state": self.state,
+            "tax_year": self.tax_year,
             "submitted_at": self.submitted_at.isoformat() if self.submitted_at else None,
             "tax_owed": self.tax_owed,
             "refund_amount": self.refund_amount,
@@ -63,7 +130,8 @@ class Payment(Base):
     __tablename__ = "payments"
     id = Column(String, primary_key=True, index=True)
     user_email = Column(String, index=True)
-    submission_id = Column(String)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    submission_id = Column(String, ForeignKey("tax_submissions.id"), index=True)
     amount = Column(Float)
     status = Column(String, default="pending")
     payment_method = Column(String)
@@ -83,7 +151,9 @@ class W9Form(Base):
     __tablename__ = "w9_forms"
     id = Column(String, primary_key=True, index=True)
     user_email = Column(String, index=True)
-    document_id = Column(String)  # Reference to Document table
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    # Deleting the scanned document keeps the W-9 it was read into
+    document_id = Column(String, ForeignKey("documents.id", ondelete="SET NULL"), index=True)
     name = Column(String)
     business_name = Column(String)
     tax_classification = Column(String)
@@ -3,19 +3,12 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from uuid import uuid4
 from datetime import datetime
-from database import SessionLocal
+from database import get_db
 from models import Payment
 from auth.routes import get_current_user
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class PaymentRequest(BaseModel):
     amount: float
     payment_method: str
@@ -30,6 +23,7 @@ def make_payment(
     payment = Payment(
         id=payment_id,
         user_email=current_user.email,
+        user_id=current_user.id,
         amount=req.amount,
         status="success",
         payment_method=req.payment_method,
@@ -1,25 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
+from typing import Optional
 from uuid import uuid4
-import json
-from database import SessionLocal
+from database import get_db
 from models import TaxSubmission
 from auth.routes import get_current_user
+from tax_engine.rules import DEFAULT_TAX_YEAR, get_rule_pack, normalize_filing_status
+from tax_engine.state_rules import STATE_CODES, state_index
+from tax_engine.tax_return import TaxReturn
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class SubmissionRequest(BaseModel):
     form_data: dict
     tax_calculation: dict = None
     filing_type: str
+    state: Optional[str] = None  # state of residence; defaults to the profile's state
+    tax_year: int = DEFAULT_TAX_YEAR
+
+def _residence_state(requested: Optional[str], profile_state: Optional[str]) -> Optional[str]:
+    if requested:
+        return STATE_CODES[state_index(requested.strip())]
+    try:
+        return STATE_CODES[state_index((profile_state or "").strip())]
+    except ValueError:
+        # The profile field is free text; leave the state unset rather than guess
+        return None
 
 @router.post("/")
 def submit_tax_return(
@@ -27,12 +34,23 @@ def submit_tax_return(
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    try:
+        filing_status = normalize_filing_status(req.filing_type)
+        get_rule_pack(req.tax_year, filing_status)
+        state = _residence_state(req.state, current_user.state)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     submission_id = str(uuid4())
     submission = TaxSubmission(
         id=submission_id,
         user_email=current_user.email,
-        form_data=json.dumps(req.form_data),
+        user_id=current_user.id,
+        form_data=TaxReturn.parse(req.form_data).to_dict(),
         status="submitted",
+        filing_status=filing_status,
+        state=state,
+        tax_year=req.tax_year,
         tax_owed=req.tax_calculation.get("tax_owed", 0) if req.tax_calculation else 0,
         refund_amount=req.tax_calculation.get("refund", 0) if req.tax_calculation else 0
     )
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of JSON-serialisable parts, independent of dict key order."""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """Bounded LRU cache with a per-entry TTL, grouped by user for invalidation.
+
+    Entries live in this process only, so an invalidation reaches just the worker
+    that handled the write. Callers whose results depend on stored state put that
+    state (or a version of it) in the key; invalidation then only frees memory.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _drop(self, key: str) -> None:
+        _, user, _ = self._entries.pop(key)
+        keys = self._by_user.get(user)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key: str, user: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, user, value)
+            self._by_user.setdefault(user, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user: str) -> int:
+        with self._lock:
+            keys = list(self._by_user.get(user, ()))
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+result_cache = ResultCache(
+    maxsize=int(os.environ.get("TAX_RESULT_CACHE_SIZE", "4096")),
+    ttl=float(os.environ.get("TAX_RESULT_CACHE_TTL", "300")),
+)
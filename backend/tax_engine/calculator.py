@@ -1,48 +1,154 @@
-from typing import Dict, Any
+from typing import Dict, Any, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+from .graph import FORM_1040_GRAPH, LineGraph
+from .rules import DEFAULT_TAX_YEAR, RulePack, available_rule_packs, get_rule_pack
+from .state_rules import STATE_INDEX, state_index
+from .tax_return import ReturnModel, TaxReturn
+
+def _code_indices(values: Sequence[str], index: Mapping[str, int], resolve) -> np.ndarray:
+    """Map per-row codes to integers with one dict lookup each.
+
+    Only a batch with a value missing from ``index`` (a lower-case state, an
+    unknown code) goes through ``resolve``, which returns the index or raises.
+    """
+    try:
+        return np.fromiter(map(index.__getitem__, values), dtype=np.intp, count=len(values))
+    except (KeyError, TypeError):
+        return np.array([resolve(value) for value in values], dtype=np.intp)
 
 class TaxCalculator:
-    BRACKETS_2024_SINGLE = [
-        (0,     11000, 0.10),
-        (11000, 44725, 0.12),
-        (44725, 95375, 0.22),
-        (95375, 182100, 0.24),
-        (182100,231250, 0.32),
-        (231250,578125, 0.35),
-        (578125,float("inf"),0.37),
-    ]
-
-    def _tax_for_brackets(self, taxable: float) -> float:
-        tax = 0.0
-        for lower, upper, rate in self.BRACKETS_2024_SINGLE:
-            if taxable <= lower:
-                break
-            taxed_amount = min(taxable, upper) - lower
-            tax += taxed_amount * rate
-            if taxable < upper:
-                break
-        return round(tax, 2)
+    graph: LineGraph = FORM_1040_GRAPH
+
+    # Return fields the line graph reads; state_code comes from the `state` argument
+    COLUMN_FIELDS = tuple(name for name in FORM_1040_GRAPH.inputs if name != "state_code")
+
+    def __init__(self, tax_year: Optional[int] = None):
+        self.tax_year = tax_year or DEFAULT_TAX_YEAR
+
+    def rule_pack(self, filing_status: str = "single") -> RulePack:
+        return get_rule_pack(self.tax_year, filing_status)
+
+    def rules_version(self, filing_status: str = "single") -> str:
+        """Identify the federal and state rules a result was computed with."""
+        pack = self.rule_pack(filing_status)
+        return f"{pack.version}:{pack.state_table.version}:{filing_status}"
+
+    def _tax_for_brackets(self, taxable: float, filing_status: str = "single") -> float:
+        return self.rule_pack(filing_status).tax(taxable)
+
+    def columns_from_form_data(self, form_data: Union[ReturnModel, Mapping[str, Any]]) -> Dict[str, float]:
+        """One value per graph input, parsing raw form data into a TaxReturn first."""
+        tax_return = form_data if isinstance(form_data, ReturnModel) else TaxReturn.parse(form_data)
+        return tax_return.amounts(self.COLUMN_FIELDS)
 
     def calculate(
         self,
-        form_data: Dict[str, Any],
+        form_data: Union[ReturnModel, Mapping[str, Any]],
         filing_status: str = "single",
         state: str = "CA"
     ) -> Dict[str, Any]:
-        wages   = float(form_data.get("wages", 0))
-        biz_inc = float(form_data.get("business_income", 0))
-        other   = sum(float(v) for k, v in form_data.items()
-                      if k not in {"wages", "business_income",
-                                   "federal_withholding", "state_withholding"})
-        total_income = wages + biz_inc + other
-        standard_deduction = 11600  # single 2024
-        taxable_income = max(total_income - standard_deduction, 0)
-
-        federal_tax = self._tax_for_brackets(taxable_income)
-        result = {
-            "total_income": round(total_income, 2),
-            "deductions": standard_deduction,
-            "taxable_income": taxable_income,
-            "tax_owed": federal_tax,
-            "refund": 0  # fill in after subtracting withholding
+        pack = self.rule_pack(filing_status)
+        inputs = self.columns_from_form_data(form_data)
+        inputs["state_code"] = state_index(state)
+        return self._result(pack, self.graph.evaluate(inputs, pack))
+
+    def _result(self, pack: RulePack, lines: Dict[str, float]) -> Dict[str, Any]:
+        return {
+            "total_income": lines["total_income"],
+            "adjustments": lines["adjustments"],
+            "agi": lines["agi"],
+            "deductions": lines["deductions"],
+            "itemized_deductions": lines["itemized_deductions"],
+            "standard_deduction": pack.standard_deduction,
+            "taxable_income": lines["taxable_income"],
+            "tax_owed": lines["tax_owed"],
+            "total_withholding": lines["total_withholding"],
+            "refund": lines["refund_amount"],
+            "refund_amount": lines["refund_amount"],
+            "amount_due": lines["amount_due"],
+            "state_tax_owed": lines["state_tax_owed"],
+            "state_refund_amount": lines["state_refund_amount"],
+            "state_amount_due": lines["state_amount_due"],
+            "total_tax_owed": lines["total_tax_owed"],
+            "lines": lines,
+            "tax_year": pack.year,
+            "state_tax_year": pack.state_table.year,
+            "rule_pack_version": pack.version
         }
-        return result
\ No newline at end of file
+
+    def calculate_batch(
+        self,
+        wages: Sequence[float],
+        business_income: Optional[Sequence[float]] = None,
+        federal_withholding: Optional[Sequence[float]] = None,
+        filing_status: Union[str, Sequence[str]] = "single",
+        state_withholding: Optional[Sequence[float]] = None,
+        other_income: Optional[Sequence[float]] = None,
+        state: Union[str, Sequence[str]] = "CA",
+        **columns: Sequence[float]
+    ) -> Dict[str, np.ndarray]:
+        """Calculate many returns at once from columnar inputs.
+
+        Every column must have the same length; missing columns count as zero.
+        Extra keyword columns may name any other graph input (``interest_income``,
+        ``mortgage_interest``, ...). ``filing_status`` and ``state`` are either one
+        value for the whole batch or one per row. Row ``i`` of each output array
+        belongs to row ``i`` of the inputs.
+        """
+        wages = np.asarray(wages, dtype=np.float64)
+        n = wages.shape[0]
+
+        def column(values):
+            if values is None:
+                return np.zeros(n)
+            arr = np.asarray(values, dtype=np.float64)
+            if arr.shape != (n,):
+                raise ValueError("All batch columns must have the same length")
+            return arr
+
+        unknown = set(columns) - set(self.COLUMN_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown batch columns: {', '.join(sorted(unknown))}")
+        columns.update(
+            wages=wages,
+            business_income=business_income,
+            federal_withholding=federal_withholding,
+            state_withholding=state_withholding,
+            other_income=other_income,
+            state_code=(np.full(n, state_index(state)) if isinstance(state, str)
+                        else _code_indices(state, STATE_INDEX, state_index)),
+        )
+        inputs = {name: column(columns.get(name)) for name in self.graph.inputs}
+
+        if isinstance(filing_status, str):
+            return self.graph.evaluate(inputs, self.rule_pack(filing_status))
+
+        if len(filing_status) != n:
+            raise ValueError("All batch columns must have the same length")
+        names = available_rule_packs().get(self.tax_year, [])
+
+        def resolve(value) -> int:
+            self.rule_pack(value)  # raises for a status this year has no pack for
+            if value not in names:  # the year's rule file was loaded by that call
+                names.append(value)
+            return names.index(value)
+
+        codes = _code_indices(filing_status, {name: i for i, name in enumerate(names)}, resolve)
+        # A stable sort of the integer codes puts each status's rows together, in row order
+        order = np.argsort(codes, kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(names)))))
+
+        results = {line.name: np.empty(n) for line in self.graph.lines}
+        for i, name in enumerate(names):
+            if bounds[i] == bounds[i + 1]:
+                continue
+            rows = order[bounds[i]:bounds[i + 1]]
+            group = self.graph.evaluate(
+                {column: values[rows] for column, values in inputs.items()},
+                self.rule_pack(name)
+            )
+            for line, values in group.items():
+                results[line][rows] = values
+        return results
@@ -0,0 +1,78 @@
+"""Draft updates shared by the tax routes and the OCR worker."""
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from database import json_merge_patch
+from models import TaxSubmission
+from .tax_return import TaxReturn
+
+# Dialects whose INSERT supports ON CONFLICT against the one-draft-per-user index
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def _draft_conflict_target() -> Dict[str, Any]:
+    return {"index_elements": [TaxSubmission.user_email], "index_where": TaxSubmission.status == "draft"}
+
+def _new_draft(user_email: str, user_id: Optional[int], form_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": str(uuid4()), "user_email": user_email, "user_id": user_id,
+            "form_data": form_data, "status": "draft"}
+
+def merge_into_draft(db, user_email: str, *sources: Optional[Dict[str, Any]], user_id: Optional[int] = None) -> None:
+    """Fold form fields (a save, or mapped document fields) into the user's draft.
+
+    Later field sets override earlier ones. Only the changed fields are sent: on
+    Postgres and SQLite the database merges them into the stored JSON, so the
+    draft is not loaded and rewritten from Python. Creates the draft if the user
+    has none; the unique draft index makes two concurrent first saves merge into
+    one draft instead of creating two. The caller commits.
+    """
+    patch = TaxReturn.patch(*sources)
+    if not patch:
+        return
+    is_draft = (TaxSubmission.user_email == user_email, TaxSubmission.status == "draft")
+    dialect_name = db.get_bind().dialect.name
+    merged = json_merge_patch(TaxSubmission.form_data, patch, dialect_name)
+    if merged is not None:
+        if db.execute(update(TaxSubmission).where(*is_draft).values(form_data=merged)).rowcount:
+            return
+        insert = _UPSERT_INSERTS.get(dialect_name)
+        if insert is not None:
+            # Another request may create the draft between the UPDATE and this INSERT
+            db.execute(
+                insert(TaxSubmission)
+                .values(**_new_draft(user_email, user_id, TaxReturn.parse(patch).to_dict()))
+                .on_conflict_do_update(**_draft_conflict_target(), set_={"form_data": merged})
+            )
+            return
+
+    draft = db.query(TaxSubmission).filter(*is_draft).first()
+    if draft is None:
+        try:
+            with db.begin_nested():
+                db.add(TaxSubmission(**_new_draft(user_email, user_id, TaxReturn.parse(patch).to_dict())))
+            return
+        except IntegrityError:
+            # Lost the race to create it; merge into the draft that won
+            draft = db.query(TaxSubmission).filter(*is_draft).one()
+    draft.form_data = TaxReturn.parse(draft.form_data, patch).to_dict()
+
+def start_draft(db, user_email: str, user_id: Optional[int] = None) -> None:
+    """Create an empty draft unless the user already has one. The caller commits."""
+    insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is not None:
+        db.execute(
+            insert(TaxSubmission)
+            .values(**_new_draft(user_email, user_id, {}))
+            .on_conflict_do_nothing(**_draft_conflict_target())
+        )
+        return
+    is_draft = (TaxSubmission.user_email == user_email, TaxSubmission.status == "draft")
+    if db.query(TaxSubmission.id).filter(*is_draft).first() is None:
+        try:
+            with db.begin_nested():
+                db.add(TaxSubmission(**_new_draft(user_email, user_id, {})))
+        except IntegrityError:
+            pass
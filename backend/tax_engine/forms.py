@@ -0,0 +1,58 @@
+# Field definitions served by /forms/{form_type}; TaxReturn is generated from these
+FORM_TEMPLATES = {
+    "1040": {
+        "name": "Form 1040 - U.S. Individual Income Tax Return",
+        "description": "Main tax form for individual income tax returns",
+        "fields": [
+            {"name": "wages", "label": "Wages, salaries, tips (W-2)", "type": "number", "required": False},
+            {"name": "interest_income", "label": "Taxable interest", "type": "number", "required": False},
+            {"name": "dividend_income", "label": "Ordinary dividends", "type": "number", "required": False},
+            {"name": "business_income", "label": "Business income (1099-NEC)", "type": "number", "required": False},
+            {"name": "other_income", "label": "Additional income (Schedule 1)", "type": "number", "required": False},
+            {"name": "student_loan_interest", "label": "Student loan interest paid", "type": "number", "required": False},
+            {"name": "ira_contributions", "label": "Deductible traditional IRA contributions", "type": "number", "required": False},
+            {"name": "federal_withholding", "label": "Federal income tax withheld", "type": "number", "required": False},
+            {"name": "state_withholding", "label": "State income tax withheld", "type": "number", "required": False}
+        ]
+    },
+    "schedule_a": {
+        "name": "Schedule A - Itemized Deductions",
+        "description": "Use this form to itemize deductions instead of taking the standard deduction",
+        "fields": [
+            {"name": "medical_expenses", "label": "Medical and dental expenses", "type": "number", "required": False},
+            {"name": "state_local_taxes", "label": "State and local income taxes or sales taxes", "type": "number", "required": False},
+            {"name": "mortgage_interest", "label": "Home mortgage interest", "type": "number", "required": False},
+            {"name": "charitable_contributions", "label": "Gifts to charity", "type": "number", "required": False}
+        ]
+    },
+    "schedule_c": {
+        "name": "Schedule C - Profit or Loss From Business",
+        "description": "Use this form to report income or loss from a business you operated",
+        "fields": [
+            {"name": "gross_receipts", "label": "Gross receipts or sales", "type": "number", "required": False},
+            {"name": "business_expenses", "label": "Total expenses", "type": "number", "required": False},
+            {"name": "home_office", "label": "Home office deduction", "type": "number", "required": False},
+            {"name": "vehicle_expenses", "label": "Car and truck expenses", "type": "number", "required": False}
+        ]
+    },
+    "w9": {
+        "name": "Form W-9 - Request for Taxpayer Identification Number",
+        "description": "Give this form to the requester to provide your correct TIN",
+        "fields": [
+            {"name": "name", "label": "Name (as shown on your income tax return)", "type": "text", "required": True},
+            {"name": "business_name", "label": "Business name/disregarded entity name", "type": "text", "required": False},
+            {"name": "tax_classification", "label": "Federal tax classification", "type": "select", "required": True,
+             "options": ["Individual/sole proprietor", "C Corporation", "S Corporation", "Partnership", "Trust/estate", "LLC"]},
+            {"name": "address", "label": "Address (number, street, and apt. or suite no.)", "type": "text", "required": True},
+            {"name": "city", "label": "City", "type": "text", "required": True},
+            {"name": "state", "label": "State", "type": "text", "required": True},
+            {"name": "zip_code", "label": "ZIP code", "type": "text", "required": True},
+            {"name": "taxpayer_id", "label": "Taxpayer Identification Number (TIN)", "type": "text", "required": True},
+            {"name": "ssn", "label": "Social Security Number", "type": "text", "required": False},
+            {"name": "ein", "label": "Employer Identification Number", "type": "text", "required": False},
+            {"name": "account_numbers", "label": "Account number(s) (optional)", "type": "text", "required": False},
+            {"name": "requester_name", "label": "Requester's name and address", "type": "text", "required": False},
+            {"name": "requester_address", "label": "Requester's address", "type": "textarea", "required": False}
+        ]
+    }
+}
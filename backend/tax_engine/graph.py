@@ -0,0 +1,147 @@
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Tuple
+
+import numpy as np
+
+from .rules import RulePack
+
+MEDICAL_EXPENSE_FLOOR = 0.075  # Schedule A line 3: share of AGI that is not deductible
+STUDENT_LOAN_INTEREST_CAP = 2500.0  # Schedule 1 line 21 maximum
+
+class Line(NamedTuple):
+    name: str
+    form_line: str
+    inputs: Tuple[str, ...]
+    compute: Callable[[Dict[str, Any], RulePack], Any]
+
+def _tax(pack: RulePack, taxable):
+    if isinstance(taxable, np.ndarray):
+        return pack.tax_batch(taxable)
+    return pack.tax(float(taxable))
+
+def _round(value, ndigits: int):
+    if isinstance(value, np.ndarray):
+        return np.round(value, ndigits)
+    # np.round's scale-and-round-half-even, so a scalar return matches its batch row
+    scale = 10 ** ndigits
+    return round(value * scale) / scale
+
+def _max(a, b):
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.maximum(a, b)
+    return a if a >= b else b
+
+def _min(a, b):
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.minimum(a, b)
+    return a if a <= b else b
+
+def _state_tax(pack: RulePack, agi, state_code):
+    table = pack.state_table
+    if isinstance(agi, np.ndarray):
+        return table.tax_batch(np.asarray(state_code, dtype=np.intp), agi)
+    return table.tax(int(state_code), float(agi))
+
+# Line functions go through _round/_max/_min so the same graph prices one return
+# with plain float arithmetic or a whole batch with NumPy ufuncs.
+FORM_1040_LINES = (
+    Line("schedule_c_net_profit", "Schedule C line 31",
+         ("gross_receipts", "business_expenses", "home_office", "vehicle_expenses"),
+         lambda v, p: v["gross_receipts"] - v["business_expenses"] - v["home_office"] - v["vehicle_expenses"]),
+    Line("total_income", "Form 1040 line 9",
+         ("wages", "interest_income", "dividend_income", "business_income",
+          "schedule_c_net_profit", "other_income"),
+         lambda v, p: _round(v["wages"] + v["interest_income"] + v["dividend_income"] + v["business_income"]
+                               + v["schedule_c_net_profit"] + v["other_income"], 2)),
+    # Adjustments phase out with income before adjustments (the pack's "phaseouts" ranges)
+    Line("student_loan_interest_deduction", "Schedule 1 line 21",
+         ("total_income", "student_loan_interest"),
+         lambda v, p: _round(_min(v["student_loan_interest"], STUDENT_LOAN_INTEREST_CAP)
+                               * p.phaseout_multiplier("student_loan_interest", v["total_income"]), 2)),
+    Line("ira_deduction", "Schedule 1 line 20",
+         ("total_income", "ira_contributions"),
+         lambda v, p: _round(v["ira_contributions"] * p.phaseout_multiplier("ira_deduction", v["total_income"]), 2)),
+    Line("adjustments", "Schedule 1 line 26",
+         ("student_loan_interest_deduction", "ira_deduction"),
+         lambda v, p: v["student_loan_interest_deduction"] + v["ira_deduction"]),
+    Line("agi", "Form 1040 line 11",
+         ("total_income", "adjustments"),
+         lambda v, p: v["total_income"] - v["adjustments"]),
+    Line("itemized_deductions", "Schedule A line 17",
+         ("agi", "medical_expenses", "state_local_taxes", "mortgage_interest", "charitable_contributions"),
+         lambda v, p: (_max(v["medical_expenses"] - MEDICAL_EXPENSE_FLOOR * v["agi"], 0.0)
+                       + _min(v["state_local_taxes"], p.salt_cap)
+                       + v["mortgage_interest"] + v["charitable_contributions"])),
+    Line("deductions", "Form 1040 line 12",
+         ("itemized_deductions",),
+         lambda v, p: _max(v["itemized_deductions"], p.standard_deduction)),
+    Line("taxable_income", "Form 1040 line 15",
+         ("agi", "deductions"),
+         lambda v, p: _max(v["agi"] - v["deductions"], 0.0)),
+    Line("tax_owed", "Form 1040 line 16",
+         ("taxable_income",),
+         lambda v, p: _tax(p, v["taxable_income"])),
+    Line("total_withholding", "Form 1040 line 25d",
+         ("federal_withholding",),
+         lambda v, p: v["federal_withholding"]),
+    Line("refund_amount", "Form 1040 line 34",
+         ("total_withholding", "tax_owed"),
+         lambda v, p: _max(v["total_withholding"] - v["tax_owed"], 0.0)),
+    Line("amount_due", "Form 1040 line 37",
+         ("total_withholding", "tax_owed"),
+         lambda v, p: _max(v["tax_owed"] - v["total_withholding"], 0.0)),
+    # state_code is an index into state_rules.STATE_CODES
+    Line("state_tax_owed", "State return tax",
+         ("agi", "state_code"),
+         lambda v, p: _state_tax(p, v["agi"], v["state_code"])),
+    Line("state_refund_amount", "State return refund",
+         ("state_withholding", "state_tax_owed"),
+         lambda v, p: _max(v["state_withholding"] - v["state_tax_owed"], 0.0)),
+    Line("state_amount_due", "State return amount owed",
+         ("state_withholding", "state_tax_owed"),
+         lambda v, p: _max(v["state_tax_owed"] - v["state_withholding"], 0.0)),
+    Line("total_tax_owed", "Federal plus state tax",
+         ("tax_owed", "state_tax_owed"),
+         lambda v, p: v["tax_owed"] + v["state_tax_owed"]),
+)
+
+class LineGraph:
+    """Form lines ordered by dependency."""
+
+    def __init__(self, lines: Iterable[Line]):
+        lines = list(lines)
+        by_name = {line.name: line for line in lines}
+        if len(by_name) != len(lines):
+            raise ValueError("Duplicate line names in graph")
+
+        order: List[Line] = []
+        state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+        def visit(line: Line) -> None:
+            if state.get(line.name) == 2:
+                return
+            if state.get(line.name) == 1:
+                raise ValueError(f"Cycle in line graph at '{line.name}'")
+            state[line.name] = 1
+            for dep in line.inputs:
+                if dep in by_name:
+                    visit(by_name[dep])
+            state[line.name] = 2
+            order.append(line)
+
+        for line in lines:
+            visit(line)
+
+        self.lines: Tuple[Line, ...] = tuple(order)
+        self.names: Tuple[str, ...] = tuple(line.name for line in order)
+        self.inputs: Tuple[str, ...] = tuple(sorted(
+            {dep for line in lines for dep in line.inputs if dep not in by_name}
+        ))
+
+    def evaluate(self, inputs: Dict[str, Any], pack: RulePack) -> Dict[str, Any]:
+        """Compute every line in dependency order."""
+        values = dict(inputs)
+        for line in self.lines:
+            values[line.name] = line.compute(values, pack)
+        return {name: values[name] for name in self.names}
+
+FORM_1040_GRAPH = LineGraph(FORM_1040_LINES)
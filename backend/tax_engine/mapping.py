@@ -1,15 +1,37 @@
-from typing import Dict, Any
+from typing import Dict, Any, Iterable
+
+from .tax_return import parse_amount
+
+# Document type -> {Form 1040 field: extracted field}
+FORM_1040_FIELDS: Dict[str, Dict[str, str]] = {
+    "W-2": {"wages": "wages", "federal_withholding": "federal_withholding"},
+    "1099-NEC": {"business_income": "nonemployee_compensation", "federal_withholding": "federal_withholding"},
+    "1099-INT": {"interest_income": "interest_income", "federal_withholding": "federal_withholding"},
+    "1099-DIV": {"dividend_income": "ordinary_dividends", "federal_withholding": "federal_withholding"},
+    "1098": {"mortgage_interest": "mortgage_interest"},
+}
 
 def map_document_to_form1040(extracted: Dict[str, Any]) -> Dict[str, Any]:
-    """Return only the fields Form 1040 cares about."""
-    if extracted.get("document_type") == "W-2":
-        return {
-            "wages": extracted.get("wages", 0),
-            "federal_withholding": extracted.get("federal_withholding", 0),
-        }
-    if extracted.get("document_type") == "1099-NEC":
-        return {
-            "business_income": extracted.get("nonemployee_compensation", 0),
-            "federal_withholding": extracted.get("federal_withholding", 0),
-        }
-    return {}
\ No newline at end of file
+    """Return only the fields Form 1040 cares about.
+
+    A field the extractor did not find is left out rather than sent as 0, so it
+    never overwrites a value already on the draft.
+    """
+    fields = FORM_1040_FIELDS.get(extracted.get("document_type"), {})
+    return {
+        target: extracted[source]
+        for target, source in fields.items()
+        if extracted.get(source) is not None
+    }
+
+def combine_document_fields(field_sets: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+    """Add up mapped fields from several documents, e.g. the wages on two W-2s.
+
+    Every mapped field is an amount, so the draft gets the totals instead of
+    whichever document happened to be merged last.
+    """
+    totals: Dict[str, float] = {}
+    for fields in field_sets:
+        for name, value in fields.items():
+            totals[name] = round(totals.get(name, 0.0) + parse_amount(value), 2)
+    return totals
@@ -0,0 +1,248 @@
+"""Re-price stored tax submissions after the tax rules change.
+
+Run from the backend directory::
+
+    python -m tax_engine.recompute --chunk-size 2000 --workers 4 --status submitted
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select, update
+
+from database import SessionLocal
+from models import TaxSubmission
+from .calculator import TaxCalculator
+from .rules import get_rule_pack, normalize_filing_status
+from .state_rules import STATE_CODES, state_index
+from .tax_return import TaxReturn
+
+DEFAULT_CHUNK_SIZE = int(os.environ.get("RECOMPUTE_CHUNK_SIZE", "2000"))
+DEFAULT_WORKERS = int(os.environ.get("RECOMPUTE_WORKERS", str(os.cpu_count() or 1)))
+# Failed rows listed in the job status; the count covers all of them
+MAX_REPORTED_FAILURES = 20
+# Upper bounds for job parameters taken from the admin API
+MAX_CHUNK_SIZE = 50_000
+MAX_WORKERS = 64
+# Drafts and superseded rows are never re-priced unless asked for
+DEFAULT_STATUSES = ("submitted",)
+
+# (id, form_data, filing_status, state, tax_year) as selected from tax_submissions
+Row = Tuple[str, Optional[Dict[str, Any]], Optional[str], Optional[str], Optional[int]]
+
+def recompute_chunk(rows: Sequence[Row]) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+    """Price one chunk of ``(id, form_data dict, filing_status, state, tax_year)`` rows; runs in a worker process.
+
+    Each row is priced under the rules for the year it was filed, one batch per
+    year. Returns the updates for the rows that priced and ``{"id", "error"}`` for
+    those that did not (no filing status, state or year stored with the
+    submission, or one no rule pack covers), so one bad row does not fail its chunk.
+    """
+    # tax_year -> (ids, statuses, states, columns)
+    years: Dict[int, Tuple[List[str], List[str], List[str], Dict[str, List[float]]]] = {}
+    failures = []
+    calculator = TaxCalculator()
+    for submission_id, form_data, filing_status, state, tax_year in rows:
+        tax_return = TaxReturn.parse(form_data if isinstance(form_data, dict) else None)
+        try:
+            if not filing_status:
+                raise ValueError("Submission has no filing status")
+            if not state:
+                raise ValueError("Submission has no state of residence")
+            if not tax_year:
+                raise ValueError("Submission has no tax year")
+            status = normalize_filing_status(filing_status)
+            get_rule_pack(tax_year, status)
+            state = STATE_CODES[state_index(state.strip())]
+        except ValueError as e:
+            failures.append({"id": submission_id, "error": str(e)})
+            continue
+        ids, statuses, states, columns = years.setdefault(tax_year, ([], [], [], {}))
+        ids.append(submission_id)
+        statuses.append(status)
+        states.append(state)
+        for name, value in calculator.columns_from_form_data(tax_return).items():
+            columns.setdefault(name, []).append(value)
+
+    updates = []
+    for tax_year, (ids, statuses, states, columns) in years.items():
+        results = TaxCalculator(tax_year=tax_year).calculate_batch(
+            filing_status=statuses, state=states, **columns
+        )
+        tax_owed = np.round(results["tax_owed"], 2).tolist()
+        refund = np.round(results["refund_amount"], 2).tolist()
+        updates += [
+            {"id": submission_id, "tax_owed": tax_owed[i], "refund_amount": refund[i]}
+            for i, submission_id in enumerate(ids)
+        ]
+    return updates, failures
+
+def _iter_chunks(db, stmt, chunk_size: int) -> Iterator[List[Row]]:
+    if db.get_bind().dialect.name == "sqlite":
+        # An open SQLite read cursor blocks the writer's commits, so page by key instead
+        last_id = None
+        while True:
+            page_stmt = stmt if last_id is None else stmt.where(TaxSubmission.id > last_id)
+            rows = [tuple(row) for row in db.execute(page_stmt.limit(chunk_size))]
+            db.rollback()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield rows
+    else:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=chunk_size))
+        for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+
+class RecomputeProgress:
+    def __init__(self):
+        self.status = "idle"
+        self.total = 0
+        self.processed = 0
+        self.failed = 0
+        self.failures: List[Dict[str, str]] = []
+        self.error: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "failed": self.failed,
+            "failures": self.failures,
+            "percent": round(100.0 * self.processed / self.total, 1) if self.total else 0.0,
+            "error": self.error,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+def run_recompute(
+    statuses: Optional[Sequence[str]] = None,
+    tax_year: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = DEFAULT_WORKERS,
+    progress: Optional[RecomputeProgress] = None,
+    on_progress: Optional[Callable[[RecomputeProgress], None]] = None,
+) -> RecomputeProgress:
+    """Stream submissions, price them in a process pool and bulk-update the results.
+
+    Only submissions whose status is in ``statuses`` (``DEFAULT_STATUSES`` when not
+    given) are re-priced, and only those filed for ``tax_year`` when one is given.
+    Rows are read through a server-side cursor in ``chunk_size`` partitions (keyset
+    pages on SQLite) and at most ``2 * workers`` chunks are in flight, so memory stays bounded however many
+    rows there are. Each finished chunk is written and committed on its own. Rows
+    that cannot be priced are left unchanged and counted in ``progress.failed``.
+    """
+    progress = progress or RecomputeProgress()
+    progress.status = "running"
+    progress.started_at = datetime.utcnow()
+
+    conditions = [TaxSubmission.status.in_(DEFAULT_STATUSES if statuses is None else statuses)]
+    if tax_year is not None:
+        conditions.append(TaxSubmission.tax_year == tax_year)
+    stmt = select(
+        TaxSubmission.id, TaxSubmission.form_data, TaxSubmission.filing_status, TaxSubmission.state,
+        TaxSubmission.tax_year,
+    ).where(*conditions).order_by(TaxSubmission.id)
+    count_stmt = select(func.count()).select_from(TaxSubmission).where(*conditions)
+
+    read_db = SessionLocal()
+    write_db = SessionLocal()
+    try:
+        progress.total = read_db.execute(count_stmt).scalar_one()
+
+        in_flight: Dict[Future, int] = {}
+
+        def write_back(done) -> None:
+            for future in done:
+                chunk_len = in_flight.pop(future)
+                updates, failures = future.result()
+                if updates:
+                    write_db.execute(update(TaxSubmission), updates)
+                    write_db.commit()
+                progress.processed += chunk_len
+                progress.failed += len(failures)
+                progress.failures += failures[:MAX_REPORTED_FAILURES - len(progress.failures)]
+                if on_progress:
+                    on_progress(progress)
+
+        # The admin API runs this next to server threads, which a forked worker would copy mid-lock
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for rows in _iter_chunks(read_db, stmt, chunk_size):
+                in_flight[pool.submit(recompute_chunk, rows)] = len(rows)
+                if len(in_flight) >= 2 * workers:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    write_back(done)
+            write_back(list(in_flight))
+
+        progress.status = "done"
+    except Exception as e:
+        write_db.rollback()
+        progress.status = "failed"
+        progress.failed += progress.total - progress.processed
+        progress.error = str(e)
+        print(f"Recompute error: {e}")
+    finally:
+        read_db.close()
+        write_db.close()
+        progress.finished_at = datetime.utcnow()
+    return progress
+
+# The admin endpoint runs one job at a time in a background thread
+current_job = RecomputeProgress()
+_job_lock = threading.Lock()
+
+def start_recompute_job(**kwargs) -> RecomputeProgress:
+    global current_job
+    with _job_lock:
+        if current_job.status == "running":
+            raise RuntimeError("A recompute job is already running")
+        current_job = RecomputeProgress()
+        current_job.status = "running"
+        threading.Thread(
+            target=run_recompute, kwargs={**kwargs, "progress": current_job}, daemon=True
+        ).start()
+        return current_job
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Recompute tax_owed/refund_amount for stored submissions")
+    parser.add_argument("--status", action="append", dest="statuses",
+                        help="only recompute submissions with this status (repeatable; default: submitted)")
+    parser.add_argument("--tax-year", type=int, default=None,
+                        help="only recompute submissions filed for this tax year")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args(argv)
+    if not 0 < args.chunk_size <= MAX_CHUNK_SIZE:
+        parser.error(f"--chunk-size must be between 1 and {MAX_CHUNK_SIZE}")
+    if not 0 < args.workers <= MAX_WORKERS:
+        parser.error(f"--workers must be between 1 and {MAX_WORKERS}")
+
+    started = time.monotonic()
+
+    def report(p: RecomputeProgress) -> None:
+        elapsed = time.monotonic() - started
+        rate = p.processed / elapsed if elapsed else 0.0
+        print(f"{p.processed}/{p.total} submissions ({rate:.0f}/s)", flush=True)
+
+    progress = run_recompute(
+        statuses=args.statuses,
+        tax_year=args.tax_year,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        on_progress=report,
+    )
+    print(json.dumps(progress.to_dict()))
+    return 0 if progress.status == "done" else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,158 +1,242 @@
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from typing import Dict, Any, Optional
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from pydantic import BaseModel, Field
+from typing import Annotated, Dict, Any, List, Optional, Union
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import TaxSubmission
 from auth.routes import get_current_user
+from admin.routes import is_admin
+from .cache import fingerprint, result_cache
+from .drafts import merge_into_draft, start_draft
 from .calculator import TaxCalculator
-import json
+from .forms import FORM_TEMPLATES
+from .rules import DEFAULT_TAX_YEAR, available_rule_packs, normalize_filing_status
+from .tax_return import TaxReturn
+import math
+import numpy as np
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class TaxCalculationRequest(BaseModel):
     form_1040: Optional[Dict[str, Any]] = {}
     schedule_a: Optional[Dict[str, Any]] = {}
     schedule_c: Optional[Dict[str, Any]] = {}
     filing_status: str = "single"
     state: str = "CA"
+    tax_year: Optional[int] = None
+
+class TaxBatchRequest(BaseModel):
+    wages: List[float]
+    business_income: Optional[List[float]] = None
+    federal_withholding: Optional[List[float]] = None
+    state_withholding: Optional[List[float]] = None
+    other_income: Optional[List[float]] = None
+    # Any other line-graph input, e.g. {"mortgage_interest": [...]}
+    columns: Optional[Dict[str, List[float]]] = None
+    filing_status: Union[str, List[str]] = "single"
+    state: Union[str, List[str]] = "CA"
+    tax_year: Optional[int] = None
+
+MAX_SWEEP_DELTAS = 10_000
+
+class TaxSweepRequest(TaxCalculationRequest):
+    # Field name -> deltas to add to that field; the grid is their cartesian product
+    deltas: Dict[str, Annotated[List[float], Field(max_length=MAX_SWEEP_DELTAS)]]
 
 class FormSaveRequest(BaseModel):
     form_type: str
     form_data: Dict[str, Any]
 
+MAX_BATCH_SIZE = 100_000
+MAX_SWEEP_POINTS = 100_000
+
+def _is_draft(user_email: str):
+    return TaxSubmission.user_email == user_email, TaxSubmission.status == "draft"
+
+async def _get_draft(db: AsyncSession, user_email: str) -> Optional[TaxSubmission]:
+    return await db.scalar(select(TaxSubmission).where(*_is_draft(user_email)).limit(1))
+
+def _draft_data(draft: Optional[TaxSubmission]) -> Optional[Dict[str, Any]]:
+    if draft and draft.form_data:
+        return draft.form_data
+    return None
+
+def _build_return(request: TaxCalculationRequest, draft_data: Optional[Dict[str, Any]]) -> TaxReturn:
+    # Start with the form data from the request
+    tax_return = TaxReturn.parse(request.form_1040, request.schedule_a, request.schedule_c)
+    if draft_data:
+        # Merge draft data, but let request data override
+        tax_return.fill_from(TaxReturn.parse(draft_data))
+    return tax_return
+
 @router.post("/calculate")
 async def calculate_taxes(
     request: TaxCalculationRequest,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Calculate taxes based on form data, including auto-populated data from uploaded documents"""
     try:
-        calculator = TaxCalculator()
-        
-        # Start with the form data from the request
-        combined_data = {}
-        if request.form_1040:
-            combined_data.update(request.form_1040)
-        if request.schedule_a:
-            combined_data.update(request.schedule_a)
-        if request.schedule_c:
-            combined_data.update(request.schedule_c)
+        calculator = TaxCalculator(tax_year=request.tax_year)
+        # Accept stored spellings such as "Married Filing Jointly", as the recompute job does
+        filing_status = normalize_filing_status(request.filing_status)
         
         # Pull any auto-populated data from draft submission
-        draft = db.query(TaxSubmission).filter(
-            TaxSubmission.user_email == current_user.email,
-            TaxSubmission.status == "draft"
-        ).first()
+        draft = await _get_draft(db, current_user.email)
+        draft_data = _draft_data(draft)
         
-        if draft and draft.form_data:
-            draft_data = json.loads(draft.form_data)
-            # Merge draft data, but let request data override
-            for key, value in draft_data.items():
-                if key not in combined_data or combined_data[key] == 0:
-                    combined_data[key] = value
+        # The draft is part of the key, so a draft changed by another worker process
+        # (or the OCR worker) never serves a stale result
+        cache_key = fingerprint(
+            current_user.email,
+            _build_return(request, None).to_dict(),
+            draft_data,
+            filing_status,
+            request.state,
+            calculator.rules_version(filing_status)
+        )
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Ensure numeric values and handle empty/null values
-        for key, value in combined_data.items():
-            if value is None or value == "":
-                combined_data[key] = 0.0
-            elif isinstance(value, str):
-                try:
-                    # Try to convert string to float
-                    combined_data[key] = float(value.replace(',', '')) if value.replace(',', '').replace('.', '').replace('-', '').isdigit() else 0.0
-                except (ValueError, AttributeError):
-                    combined_data[key] = 0.0
-            elif isinstance(value, (int, float)):
-                combined_data[key] = float(value)
-            else:
-                combined_data[key] = 0.0
+        tax_return = _build_return(request, draft_data)
         
-        # Calculate taxes using the calculator
+        # A full scalar pass is cheaper than loading and storing line state with the draft
         result = calculator.calculate(
-            form_data=combined_data,
-            filing_status=request.filing_status,
+            form_data=tax_return,
+            filing_status=filing_status,
             state=request.state
         )
         
-        # Add withholding information and calculate refund/amount due
-        federal_withholding = combined_data.get("federal_withholding", 0)
-        state_withholding = combined_data.get("state_withholding", 0)
-        total_withholding = federal_withholding + state_withholding
-        
-        tax_owed = result.get("tax_owed", 0)
-        
-        # Calculate refund or amount due
-        if total_withholding > tax_owed:
-            refund_amount = total_withholding - tax_owed
-            amount_due = 0
-        else:
-            refund_amount = 0
-            amount_due = tax_owed - total_withholding
-        
         # Update result with additional fields expected by frontend
         result.update({
-            "total_income": result.get("total_income", 0),
             "total_deductions": result.get("deductions", 0),
-            "total_withholding": total_withholding,
-            "federal_withholding": federal_withholding,
-            "state_withholding": state_withholding,
-            "refund_amount": refund_amount,
-            "amount_due": amount_due,
-            "taxable_income": result.get("taxable_income", 0),
-            "agi": result.get("total_income", 0),  # AGI same as total income for simple calc
-            "filing_status": request.filing_status,
+            "federal_withholding": tax_return.amount("federal_withholding"),
+            "state_withholding": tax_return.amount("state_withholding"),
+            "filing_status": filing_status,
             "state": request.state,
-            "auto_populated_data": draft_data if draft and draft.form_data else {}
+            "auto_populated_data": draft_data or {}
         })
         
+        result_cache.set(cache_key, current_user.email, result)
         return result
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Tax calculation error: {e}")
         raise HTTPException(status_code=500, detail=f"Tax calculation failed: {str(e)}")
 
+@router.post("/calculate-batch")
+async def calculate_taxes_batch(
+    request: TaxBatchRequest,
+    current_user = Depends(get_current_user)
+):
+    """Calculate many returns in one vectorized pass; results keep the request order"""
+    count = len(request.wages)
+    if count > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_SIZE} returns)")
+
+    try:
+        calculator = TaxCalculator(tax_year=request.tax_year)
+        columns = calculator.calculate_batch(
+            wages=request.wages,
+            business_income=request.business_income,
+            federal_withholding=request.federal_withholding,
+            filing_status=(normalize_filing_status(request.filing_status) if isinstance(request.filing_status, str)
+                           else [normalize_filing_status(status) for status in request.filing_status]),
+            state_withholding=request.state_withholding,
+            other_income=request.other_income,
+            state=request.state,
+            **(request.columns or {})
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Batch tax calculation error: {e}")
+        raise HTTPException(status_code=500, detail=f"Batch tax calculation failed: {str(e)}")
+
+    names = list(columns.keys())
+    rows = zip(*(columns[name].tolist() for name in names))
+    return {
+        "count": count,
+        "results": [dict(zip(names, row)) for row in rows]
+    }
+
+@router.post("/calculate-sweep")
+async def calculate_tax_sweep(
+    request: TaxSweepRequest,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Evaluate a grid of what-if deltas over one return in a single vectorized pass"""
+    if not request.deltas or any(len(values) == 0 for values in request.deltas.values()):
+        raise HTTPException(status_code=400, detail="Each swept field needs at least one delta")
+    fields = list(request.deltas.keys())
+    unknown = [name for name in fields if name not in TaxCalculator.COLUMN_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot sweep unknown fields: {', '.join(unknown)}")
+    shape = [len(request.deltas[name]) for name in fields]
+    # Python ints: np.prod wraps around in int64 and can make a huge grid look small
+    points = math.prod(shape)
+    if points > MAX_SWEEP_POINTS:
+        raise HTTPException(status_code=413, detail=f"Sweep too large (max {MAX_SWEEP_POINTS} points)")
+
+    try:
+        calculator = TaxCalculator(tax_year=request.tax_year)
+        draft_data = _draft_data(await _get_draft(db, current_user.email))
+        base = calculator.columns_from_form_data(_build_return(request, draft_data))
+
+        # Broadcast the base return over the grid, then add each field's deltas to its column
+        columns = {name: np.full(points, value, dtype=np.float64) for name, value in base.items()}
+        grids = np.meshgrid(*(np.asarray(request.deltas[name], dtype=np.float64) for name in fields), indexing="ij")
+        for name, grid in zip(fields, grids):
+            columns[name] += grid.ravel()
+
+        results = calculator.calculate_batch(
+            filing_status=normalize_filing_status(request.filing_status), state=request.state, **columns
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Tax sweep error: {e}")
+        raise HTTPException(status_code=500, detail=f"Tax sweep failed: {str(e)}")
+
+    return {
+        "fields": fields,
+        "axes": request.deltas,
+        "shape": shape,
+        "base": base,
+        "tax_owed": results["tax_owed"].reshape(shape).tolist(),
+        "refund_amount": results["refund_amount"].reshape(shape).tolist(),
+        "amount_due": results["amount_due"].reshape(shape).tolist(),
+        "state_tax_owed": results["state_tax_owed"].reshape(shape).tolist(),
+        "state_refund_amount": results["state_refund_amount"].reshape(shape).tolist()
+    }
+
 @router.post("/save-form")
 async def save_form(
     request: FormSaveRequest,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Save form data to draft submission"""
     try:
         form_type = request.form_type.upper()
         
-        # Find or create draft submission
-        draft = db.query(TaxSubmission).filter(
-            TaxSubmission.user_email == current_user.email,
-            TaxSubmission.status == "draft"
-        ).first()
-        
-        if draft:
-            # Update existing draft
-            existing_data = json.loads(draft.form_data) if draft.form_data else {}
-            merged_data = {**existing_data, **request.form_data}
-            draft.form_data = json.dumps(merged_data)
-        else:
-            # Create new draft
-            from uuid import uuid4
-            draft = TaxSubmission(
-                id=str(uuid4()),
-                user_email=current_user.email,
-                form_data=json.dumps(request.form_data),
-                status="draft"
-            )
-            db.add(draft)
+        # Only the submitted fields are sent; the database merges them into the stored draft
+        await db.run_sync(merge_into_draft, current_user.email, request.form_data, user_id=current_user.id)
+        await db.flush()
+        summary = select(TaxSubmission.id, TaxSubmission.submitted_at).where(*_is_draft(current_user.email)).limit(1)
+        draft = (await db.execute(summary)).first()
+        if draft is None:
+            # Nothing to merge yet; still start the draft
+            await db.run_sync(start_draft, current_user.email, user_id=current_user.id)
+            draft = (await db.execute(summary)).first()
         
-        db.commit()
-        db.refresh(draft)
+        await db.commit()
+        result_cache.invalidate_user(current_user.email)
         
         return {
             "message": f"{form_type} form saved successfully",
@@ -169,19 +253,16 @@ async def save_form(
 @router.get("/draft")
 async def get_draft_form(
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get the current draft form data for the user"""
     try:
-        draft = db.query(TaxSubmission).filter(
-            TaxSubmission.user_email == current_user.email,
-            TaxSubmission.status == "draft"
-        ).first()
+        draft = await _get_draft(db, current_user.email)
         
         if not draft:
             return {"form_data": {}, "message": "No draft found"}
         
-        form_data = json.loads(draft.form_data) if draft.form_data else {}
+        form_data = draft.form_data or {}
         
         return {
             "draft_id": draft.id,
@@ -193,68 +274,20 @@ async def get_draft_form(
         print(f"Get draft error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get draft: {str(e)}")
 
+@router.get("/cache-stats")
+async def get_cache_stats(current_user = Depends(get_current_user)):
+    """Get hit/miss counters for the tax result cache"""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return result_cache.stats()
+
 @router.get("/forms/{form_type}")
 async def get_form_template(form_type: str):
     """Get form template with field definitions"""
-    templates = {
-        "1040": {
-            "name": "Form 1040 - U.S. Individual Income Tax Return",
-            "description": "Main tax form for individual income tax returns",
-            "fields": [
-                {"name": "wages", "label": "Wages, salaries, tips (W-2)", "type": "number", "required": False},
-                {"name": "interest_income", "label": "Taxable interest", "type": "number", "required": False},
-                {"name": "dividend_income", "label": "Ordinary dividends", "type": "number", "required": False},
-                {"name": "business_income", "label": "Business income (1099-NEC)", "type": "number", "required": False},
-                {"name": "federal_withholding", "label": "Federal income tax withheld", "type": "number", "required": False},
-                {"name": "state_withholding", "label": "State income tax withheld", "type": "number", "required": False}
-            ]
-        },
-        "schedule_a": {
-            "name": "Schedule A - Itemized Deductions",
-            "description": "Use this form to itemize deductions instead of taking the standard deduction",
-            "fields": [
-                {"name": "medical_expenses", "label": "Medical and dental expenses", "type": "number", "required": False},
-                {"name": "state_local_taxes", "label": "State and local income taxes or sales taxes", "type": "number", "required": False},
-                {"name": "mortgage_interest", "label": "Home mortgage interest", "type": "number", "required": False},
-                {"name": "charitable_contributions", "label": "Gifts to charity", "type": "number", "required": False}
-            ]
-        },
-        "schedule_c": {
-            "name": "Schedule C - Profit or Loss From Business",
-            "description": "Use this form to report income or loss from a business you operated",
-            "fields": [
-                {"name": "gross_receipts", "label": "Gross receipts or sales", "type": "number", "required": False},
-                {"name": "business_expenses", "label": "Total expenses", "type": "number", "required": False},
-                {"name": "home_office", "label": "Home office deduction", "type": "number", "required": False},
-                {"name": "vehicle_expenses", "label": "Car and truck expenses", "type": "number", "required": False}
-            ]
-        },
-        "w9": {
-            "name": "Form W-9 - Request for Taxpayer Identification Number",
-            "description": "Give this form to the requester to provide your correct TIN",
-            "fields": [
-                {"name": "name", "label": "Name (as shown on your income tax return)", "type": "text", "required": True},
-                {"name": "business_name", "label": "Business name/disregarded entity name", "type": "text", "required": False},
-                {"name": "tax_classification", "label": "Federal tax classification", "type": "select", "required": True,
-                 "options": ["Individual/sole proprietor", "C Corporation", "S Corporation", "Partnership", "Trust/estate", "LLC"]},
-                {"name": "address", "label": "Address (number, street, and apt. or suite no.)", "type": "text", "required": True},
-                {"name": "city", "label": "City", "type": "text", "required": True},
-                {"name": "state", "label": "State", "type": "text", "required": True},
-                {"name": "zip_code", "label": "ZIP code", "type": "text", "required": True},
-                {"name": "taxpayer_id", "label": "Taxpayer Identification Number (TIN)", "type": "text", "required": True},
-                {"name": "ssn", "label": "Social Security Number", "type": "text", "required": False},
-                {"name": "ein", "label": "Employer Identification Number", "type": "text", "required": False},
-                {"name": "account_numbers", "label": "Account number(s) (optional)", "type": "text", "required": False},
-                {"name": "requester_name", "label": "Requester's name and address", "type": "text", "required": False},
-                {"name": "requester_address", "label": "Requester's address", "type": "textarea", "required": False}
-            ]
-        }
-    }
-    
-    if form_type not in templates:
+    if form_type not in FORM_TEMPLATES:
         raise HTTPException(status_code=404, detail=f"Form type '{form_type}' not found")
     
-    return templates[form_type]
+    return FORM_TEMPLATES[form_type]
 
 @router.get("/forms")
 async def get_available_forms():
@@ -281,6 +314,17 @@ async def get_filing_status_options():
         ]
     }
 
+@router.get("/tax-years")
+async def get_tax_years():
+    """Get the tax years and filing statuses with loaded rule packs"""
+    return {
+        "default_tax_year": DEFAULT_TAX_YEAR,
+        "tax_years": [
+            {"year": year, "filing_statuses": statuses}
+            for year, statuses in available_rule_packs().items()
+        ]
+    }
+
 @router.get("/states")
 async def get_state_options():
     """Get available state options for tax calculation"""
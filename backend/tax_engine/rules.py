@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass
+from functools import cached_property
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Tuple
+
+import numpy as np
+
+from .state_rules import StateTaxTable, get_state_table
+
+RULES_DIR = os.environ.get(
+    "TAX_RULES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rule_packs")
+)
+DEFAULT_TAX_YEAR = int(os.environ.get("TAX_DEFAULT_YEAR", "2024"))
+
+class Bracket(NamedTuple):
+    lower: float
+    upper: float
+    rate: float
+    base: float  # tax owed on all income below `lower`
+
+class Phaseout(NamedTuple):
+    start: float
+    end: float
+
+    def multiplier(self, income):
+        """Share of the benefit still allowed at this income (1.0 below start, 0.0 past end).
+
+        ``income`` is a float or an array of incomes (one per batch row).
+        """
+        if not isinstance(income, np.ndarray):
+            if income >= self.end:
+                return 0.0
+            if income <= self.start:
+                return 1.0
+            return (self.end - income) / (self.end - self.start)
+        if self.end <= self.start:
+            return np.where(income >= self.end, 0.0, 1.0)
+        return np.clip((self.end - income) / (self.end - self.start), 0.0, 1.0)
+
+@dataclass(frozen=True, eq=False)
+class RulePack:
+    """Compiled federal rules for one tax year and filing status."""
+    year: int
+    filing_status: str
+    version: str
+    standard_deduction: float
+    salt_cap: float
+    brackets: Tuple[Bracket, ...]
+    phaseouts: Mapping[str, Phaseout]
+    # Columnar copies of `brackets` for bisect and searchsorted lookups
+    lowers: Tuple[float, ...]
+    lowers_array: np.ndarray
+    rates_array: np.ndarray
+    bases_array: np.ndarray
+
+    def tax(self, taxable: float) -> float:
+        if taxable <= 0:
+            return 0.0
+        bracket = self.brackets[bisect_right(self.lowers, taxable) - 1]
+        # Rounds half-cents the way np.round does in tax_batch, so both agree to the cent
+        return round((bracket.base + (taxable - bracket.lower) * bracket.rate) * 100) / 100
+
+    def tax_batch(self, taxable: np.ndarray) -> np.ndarray:
+        idx = np.searchsorted(self.lowers_array, taxable, side="right") - 1
+        np.clip(idx, 0, None, out=idx)
+        tax = self.bases_array[idx] + (taxable - self.lowers_array[idx]) * self.rates_array[idx]
+        return np.round(np.maximum(tax, 0.0), 2)
+
+    @cached_property
+    def state_table(self) -> StateTaxTable:
+        """State schedules for this pack's year and filing status, looked up once."""
+        return get_state_table(self.year, self.filing_status)
+
+    def phaseout_multiplier(self, name: str, income):
+        phaseout = self.phaseouts.get(name)
+        return phaseout.multiplier(income) if phaseout else 1.0
+
+def _readonly(values) -> np.ndarray:
+    arr = np.array(values, dtype=np.float64)
+    arr.flags.writeable = False
+    return arr
+
+def compile_rule_pack(year: int, filing_status: str, rules: Dict, version: str) -> RulePack:
+    pairs = sorted((float(lower), float(rate)) for lower, rate in rules["brackets"])
+    if not pairs or pairs[0][0] != 0:
+        raise ValueError(f"Brackets for {year}/{filing_status} must start at 0")
+
+    brackets = []
+    base = 0.0
+    for i, (lower, rate) in enumerate(pairs):
+        upper = pairs[i + 1][0] if i + 1 < len(pairs) else float("inf")
+        brackets.append(Bracket(lower, upper, rate, base))
+        if upper != float("inf"):
+            base += (upper - lower) * rate
+
+    phaseouts = {
+        name: Phaseout(float(start), float(end))
+        for name, (start, end) in rules.get("phaseouts", {}).items()
+    }
+    return RulePack(
+        year=year,
+        filing_status=filing_status,
+        version=version,
+        standard_deduction=float(rules["standard_deduction"]),
+        salt_cap=float(rules.get("salt_cap", 10000)),
+        brackets=tuple(brackets),
+        phaseouts=MappingProxyType(phaseouts),
+        lowers=tuple(b.lower for b in brackets),
+        lowers_array=_readonly([b.lower for b in brackets]),
+        rates_array=_readonly([b.rate for b in brackets]),
+        bases_array=_readonly([b.base for b in brackets]),
+    )
+
+_packs: Dict[Tuple[int, str], RulePack] = {}
+_loaded_years = set()
+_lock = threading.Lock()
+
+def _load_year_file(path: str) -> int:
+    with open(path, "rb") as f:
+        raw = f.read()
+    spec = json.loads(raw)
+    year = int(spec["year"])
+    version = f"{year}-{hashlib.sha256(raw).hexdigest()[:12]}"
+    compiled = {
+        (year, status): compile_rule_pack(year, status, rules, version)
+        for status, rules in spec["filing_statuses"].items()
+    }
+    with _lock:
+        _packs.update(compiled)
+        _loaded_years.add(year)
+    return year
+
+def load_rule_packs(rules_dir: str = RULES_DIR) -> List[int]:
+    """Compile every ``<year>.json`` in the rules directory."""
+    years = []
+    for name in sorted(os.listdir(rules_dir)):
+        if name.endswith(".json"):
+            years.append(_load_year_file(os.path.join(rules_dir, name)))
+    return years
+
+def normalize_filing_status(value: str) -> str:
+    """Map stored spellings ("Single", "married filing jointly") to a pack key."""
+    return "_".join(value.strip().lower().replace("-", " ").split())
+
+def get_rule_pack(year: int, filing_status: str) -> RulePack:
+    """Return the compiled pack, picking up a newly added year file on first use."""
+    pack = _packs.get((year, filing_status))
+    if pack is not None:
+        return pack
+
+    if year not in _loaded_years:
+        path = os.path.join(RULES_DIR, f"{year}.json")
+        if os.path.exists(path):
+            _load_year_file(path)
+            pack = _packs.get((year, filing_status))
+            if pack is not None:
+                return pack
+
+    if year not in _loaded_years:
+        raise ValueError(f"No tax rules available for year {year}")
+    raise ValueError(f"Unsupported filing status '{filing_status}' for {year}")
+
+def available_rule_packs() -> Dict[int, List[str]]:
+    years: Dict[int, List[str]] = {}
+    for year, status in sorted(_packs):
+        years.setdefault(year, []).append(status)
+    return years
+
+load_rule_packs()
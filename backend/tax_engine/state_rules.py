@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Mapping, Tuple
+
+import numpy as np
+
+STATE_RULES_DIR = os.environ.get(
+    "STATE_TAX_RULES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state_packs")
+)
+
+# Fixed order so a state's index means the same thing in every table and stored line state
+STATE_CODES: Tuple[str, ...] = (
+    "AK", "AL", "AR", "AZ", "CA", "CO", "CT", "DE", "FL", "GA",
+    "HI", "IA", "ID", "IL", "IN", "KS", "KY", "LA", "MA", "MD",
+    "ME", "MI", "MN", "MO", "MS", "MT", "NC", "ND", "NE", "NH",
+    "NJ", "NM", "NV", "NY", "OH", "OK", "OR", "PA", "RI", "SC",
+    "SD", "TN", "TX", "UT", "VA", "VT", "WA", "WI", "WV", "WY",
+)
+STATE_INDEX: Mapping[str, int] = MappingProxyType({code: i for i, code in enumerate(STATE_CODES)})
+JOINT_STATUSES = ("married_filing_jointly", "qualifying_widow")
+
+def state_index(code: str) -> int:
+    try:
+        return STATE_INDEX[code.upper()]
+    except (KeyError, AttributeError):
+        raise ValueError(f"Unsupported state '{code}'")
+
+@dataclass(frozen=True, eq=False)
+class StateTaxTable:
+    """Every state's schedule for one year and filing status, padded into 2-D arrays.
+
+    Row ``i`` belongs to ``STATE_CODES[i]``; unused bracket slots have an infinite
+    lower bound so they are never selected.
+    """
+    year: int
+    filing_status: str
+    version: str
+    deductions: np.ndarray  # (states,)
+    lowers: np.ndarray      # (states, brackets)
+    rates: np.ndarray
+    bases: np.ndarray
+    # Unpadded per-state tuples of the same schedules for bisect lookups on one return
+    schedules: Tuple[Tuple[float, Tuple[float, ...], Tuple[float, ...], Tuple[float, ...]], ...]
+    # Every state's real lower bounds in one sorted array, state i's shifted by i * span,
+    # so one searchsorted finds the bracket for a whole mixed-state batch
+    flat_lowers: np.ndarray
+    flat_offsets: np.ndarray  # (states,) index of each state's first bound in flat_lowers
+    span: float
+
+    def tax(self, state: int, agi: float) -> float:
+        deduction, lowers, rates, bases = self.schedules[state]
+        taxable = agi - deduction
+        if taxable <= 0:
+            return 0.0
+        k = bisect_right(lowers, taxable) - 1
+        if k < 0:
+            return 0.0
+        # Rounds half-cents the way np.round does in tax_batch, so both agree to the cent
+        return round((bases[k] + (taxable - lowers[k]) * rates[k]) * 100) / 100
+
+    def tax_batch(self, states: np.ndarray, agi: np.ndarray) -> np.ndarray:
+        taxable = np.maximum(agi - self.deductions[states], 0.0)
+        # Past the highest bound every row is in its state's top bracket, so capping
+        # keeps the shifted keys inside each state's range
+        keys = states * self.span + np.minimum(taxable, self.span - 1.0)
+        k = np.searchsorted(self.flat_lowers, keys, side="right") - 1 - self.flat_offsets[states]
+        np.clip(k, 0, None, out=k)
+        tax = self.bases[states, k] + (taxable - self.lowers[states, k]) * self.rates[states, k]
+        return np.round(np.maximum(tax, 0.0), 2)
+
+def _schedule(spec: Dict, filing_status: str, joint_multiplier: float) -> Tuple[float, list]:
+    if filing_status in spec:
+        spec = spec[filing_status]
+        return float(spec["deduction"]), sorted((float(l), float(r)) for l, r in spec["brackets"])
+    scale = joint_multiplier if filing_status in JOINT_STATUSES else 1.0
+    return (float(spec["deduction"]) * scale,
+            sorted((float(l) * scale, float(r)) for l, r in spec["brackets"]))
+
+def compile_state_table(year: int, filing_status: str, spec: Dict, version: str) -> StateTaxTable:
+    states = spec["states"]
+    missing = [code for code in STATE_CODES if code not in states]
+    if missing:
+        raise ValueError(f"State rules for {year} are missing {', '.join(missing)}")
+    joint_multiplier = float(spec.get("joint_multiplier", 1))
+
+    schedules = [_schedule(states[code], filing_status, joint_multiplier) for code in STATE_CODES]
+    empty = [code for code, (_, brackets) in zip(STATE_CODES, schedules) if not brackets]
+    if empty:
+        raise ValueError(f"State rules for {year} have no brackets for {', '.join(empty)}")
+    width = max(len(brackets) for _, brackets in schedules)
+    shape = (len(STATE_CODES), width)
+    lowers = np.full(shape, np.inf)
+    rates = np.zeros(shape)
+    bases = np.zeros(shape)
+    for i, (_, brackets) in enumerate(schedules):
+        base = 0.0
+        for k, (lower, rate) in enumerate(brackets):
+            lowers[i, k], rates[i, k], bases[i, k] = lower, rate, base
+            if k + 1 < len(brackets):
+                base += (brackets[k + 1][0] - lower) * rate
+
+    deductions = np.array([deduction for deduction, _ in schedules])
+    real = np.isfinite(lowers)
+    span = float(lowers[real].max()) + 1.0
+    flat_lowers = (np.arange(len(STATE_CODES))[:, None] * span + lowers)[real]
+    counts = real.sum(axis=1)
+    flat_offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+    for arr in (deductions, lowers, rates, bases, flat_lowers, flat_offsets):
+        arr.flags.writeable = False
+    per_state = tuple(
+        (float(deductions[i]),) + tuple(tuple(row[:count].tolist()) for row in (lowers[i], rates[i], bases[i]))
+        for i, count in enumerate(counts)
+    )
+    return StateTaxTable(year, filing_status, version, deductions, lowers, rates, bases,
+                         per_state, flat_lowers, flat_offsets, span)
+
+_tables: Dict[Tuple[int, str], StateTaxTable] = {}
+_specs: Dict[int, Tuple[Dict, str]] = {}
+_lock = threading.Lock()
+
+def load_state_rules(rules_dir: str = STATE_RULES_DIR) -> None:
+    for name in sorted(os.listdir(rules_dir)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(rules_dir, name), "rb") as f:
+            raw = f.read()
+        spec = json.loads(raw)
+        year = int(spec["year"])
+        with _lock:
+            _specs[year] = (spec, f"{year}-{hashlib.sha256(raw).hexdigest()[:12]}")
+
+def get_state_table(year: int, filing_status: str) -> StateTaxTable:
+    """Return the compiled table for ``year``, or for the closest year with state rules.
+
+    State schedules are published separately from the federal ones, so a tax year
+    may have no state file yet. The returned table's ``year`` is the one actually
+    used, and calculation results report it as ``state_tax_year``.
+    """
+    if year not in _specs:
+        if not _specs:
+            raise ValueError("No state tax rules loaded")
+        year = min(_specs, key=lambda y: (abs(y - year), -y))
+    table = _tables.get((year, filing_status))
+    if table is None:
+        spec, version = _specs[year]
+        table = compile_state_table(year, filing_status, spec, version)
+        with _lock:
+            _tables[(year, filing_status)] = table
+    return table
+
+load_state_rules()
@@ -0,0 +1,150 @@
+import re
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Tuple
+
+from .forms import FORM_TEMPLATES
+
+# Fields kept with a return that are not on any form template
+EXTRA_FIELDS = [
+    {"name": "filing_status", "type": "text"},
+]
+
+_AMOUNT_RE = re.compile(r"-?(?:\d+\.?\d*|\.\d+)")
+
+def parse_amount(value: Any) -> float:
+    """Coerce a submitted amount ("1,234.50", 1234.5, "", None) to float; anything else is 0."""
+    # bool is an int subclass, but a checkbox value is not an amount
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        cleaned = value.replace(",", "").replace("$", "").strip()
+        if _AMOUNT_RE.fullmatch(cleaned):
+            return float(cleaned)
+    return 0.0
+
+def parse_text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return value if isinstance(value, str) else str(value)
+
+class ReturnModel:
+    """Fixed-schema return: one slot per template field, ``None`` while unset.
+
+    Concrete classes are generated by ``build_return_model``; keys that are not
+    template fields are dropped when parsing, so they never count as income.
+    """
+    __slots__ = ()
+
+    FIELDS: Tuple[str, ...] = ()
+    NUMBER_FIELDS: Tuple[str, ...] = ()
+    TEXT_FIELDS: Tuple[str, ...] = ()
+    _PARSERS: Mapping[str, Callable[[Any], Any]] = {}
+
+    def __init__(self, **values: Any):
+        # Replaced per generated class by a straight-line version (see _compile_init)
+        for name in self.FIELDS:
+            setattr(self, name, None)
+        if values:
+            self.set_values(values)
+
+    @classmethod
+    def parse(cls, *sources: Optional[Mapping[str, Any]]) -> "ReturnModel":
+        """Parse and validate raw dicts in one pass; later sources override earlier ones."""
+        ret = cls()
+        for source in sources:
+            if source:
+                ret.set_values(source)
+        return ret
+
+    @classmethod
+    def patch(cls, *sources: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+        """Parsed values for only the template fields present in ``sources``.
+
+        Applied as a JSON merge patch to a stored ``to_dict()`` this gives the same
+        result as ``parse(stored, *sources).to_dict()``: a ``None`` (cleared text
+        field) removes the key.
+        """
+        parsers = cls._PARSERS
+        patch: Dict[str, Any] = {}
+        for source in sources:
+            if source:
+                for key, value in source.items():
+                    parser = parsers.get(key)
+                    if parser is not None:
+                        patch[key] = parser(value)
+        return patch
+
+    def set_values(self, values: Mapping[str, Any]) -> "ReturnModel":
+        parsers = self._PARSERS
+        for key, value in values.items():
+            parser = parsers.get(key)
+            if parser is not None:
+                setattr(self, key, parser(value))
+        return self
+
+    def update(self, other: "ReturnModel") -> "ReturnModel":
+        """Overwrite this return with every field that is set on ``other``."""
+        for name in self.FIELDS:
+            value = getattr(other, name)
+            if value is not None:
+                setattr(self, name, value)
+        return self
+
+    def fill_from(self, other: "ReturnModel") -> "ReturnModel":
+        """Take values from ``other`` for fields that are unset or zero here."""
+        for name in self.FIELDS:
+            value = getattr(other, name)
+            if value is not None and not getattr(self, name):
+                setattr(self, name, value)
+        return self
+
+    def amount(self, name: str) -> float:
+        return getattr(self, name) or 0.0
+
+    def amounts(self, names: Iterable[str]) -> Dict[str, float]:
+        return {name: getattr(self, name) or 0.0 for name in names}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Only the fields that are set, ready to store as draft JSON."""
+        data = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+def _compile_init(fields: Tuple[str, ...]) -> Callable[..., None]:
+    body = "".join(f"    self.{name} = None\n" for name in fields)
+    source = f"def __init__(self, **values):\n{body}    if values:\n        self.set_values(values)\n"
+    namespace: Dict[str, Any] = {}
+    exec(source, namespace)
+    return namespace["__init__"]
+
+def build_return_model(templates: Mapping[str, Dict[str, Any]], name: str = "TaxReturn") -> type:
+    numbers, texts = [], []
+    for template in templates.values():
+        for field in template["fields"]:
+            target = numbers if field["type"] == "number" else texts
+            if field["name"] not in numbers and field["name"] not in texts:
+                target.append(field["name"])
+    for field in EXTRA_FIELDS:
+        if field["name"] not in numbers and field["name"] not in texts:
+            texts.append(field["name"])
+
+    parsers = {field: parse_amount for field in numbers}
+    parsers.update({field: parse_text for field in texts})
+    fields = tuple(numbers + texts)
+    if not all(field.isidentifier() for field in fields):
+        raise ValueError("Form field names must be valid identifiers")
+    return type(name, (ReturnModel,), {
+        "__slots__": fields,
+        "__init__": _compile_init(fields),
+        "FIELDS": fields,
+        "NUMBER_FIELDS": tuple(numbers),
+        "TEXT_FIELDS": tuple(texts),
+        "_PARSERS": parsers,
+    })
+
+TaxReturn = build_return_model(FORM_TEMPLATES)
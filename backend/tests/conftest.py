@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+import pytest
+
+# database.py builds its engines at import time, so point it at a scratch SQLite file first
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="tax-tests-"), "test.db")
+
+import database  # noqa: E402
+from models import Base, User  # noqa: E402
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(database.engine)
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(database.engine)
+
+@pytest.fixture
+def user(db):
+    account = User(email="a@example.com", name="A", state="NY")
+    db.add(account)
+    db.commit()
+    return account
+
+def _client(user, router, prefix):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from auth.routes import get_current_user
+
+    app = FastAPI()
+    app.include_router(router, prefix=prefix)
+    app.dependency_overrides[get_current_user] = lambda: user
+    return TestClient(app)
+
+@pytest.fixture
+def file_client(user):
+    """TestClient for the file routes, signed in as ``user``."""
+    from file_service.routes import router
+    with _client(user, router, "/api/files") as client:
+        yield client
+
+@pytest.fixture
+def tax_client(user):
+    """TestClient for the tax routes, signed in as ``user``."""
+    from tax_engine.routes import router
+    with _client(user, router, "/api/tax") as client:
+        yield client
+
+@pytest.fixture
+def admin_client(db):
+    """TestClient for the admin routes, signed in as an admin."""
+    from admin.routes import router
+    account = User(email="admin@example.com", name="Admin")
+    db.add(account)
+    db.commit()
+    with _client(account, router, "/api/admin") as client:
+        yield client
@@ -0,0 +1,81 @@
+import random
+
+import numpy as np
+import pytest
+
+from tax_engine.calculator import TaxCalculator
+from tax_engine.rules import available_rule_packs
+from tax_engine.state_rules import STATE_CODES
+
+FILING_STATUSES = available_rule_packs()[2024]
+
+def _returns(seed, per_state=4):
+    """Random returns covering every state, with phase-outs, itemizing and Schedule C in play."""
+    rng = random.Random(seed)
+    rows = []
+    for state in STATE_CODES:
+        for _ in range(per_state):
+            rows.append((state, {
+                "wages": round(rng.uniform(0, 400000), 2),
+                "business_income": round(rng.uniform(0, 40000), 2),
+                "interest_income": round(rng.uniform(0, 3000), 2),
+                "gross_receipts": round(rng.uniform(0, 80000), 2),
+                "business_expenses": round(rng.uniform(0, 30000), 2),
+                "student_loan_interest": round(rng.uniform(0, 3000), 2),
+                "ira_contributions": round(rng.uniform(0, 7000), 2),
+                "mortgage_interest": round(rng.uniform(0, 30000), 2),
+                "state_local_taxes": round(rng.uniform(0, 20000), 2),
+                "medical_expenses": round(rng.uniform(0, 15000), 2),
+                "federal_withholding": round(rng.uniform(0, 60000), 2),
+                "state_withholding": round(rng.uniform(0, 15000), 2),
+            }))
+    return rows
+
+@pytest.mark.parametrize("filing_status", FILING_STATUSES)
+def test_batch_matches_single_returns(filing_status):
+    calculator = TaxCalculator(tax_year=2024)
+    rows = _returns(seed=len(filing_status))
+    columns = {name: [form[name] for _, form in rows] for name in rows[0][1]}
+    batch = calculator.calculate_batch(
+        filing_status=filing_status, state=[state for state, _ in rows], **columns
+    )
+    for i, (state, form) in enumerate(rows):
+        single = calculator.calculate(form, filing_status, state)
+        assert {name: batch[name][i] for name in single["lines"]} == single["lines"], (state, form)
+
+def test_batch_with_mixed_filing_statuses_keeps_row_order():
+    calculator = TaxCalculator(tax_year=2024)
+    rows = _returns(seed=1, per_state=1)
+    statuses = [FILING_STATUSES[i % len(FILING_STATUSES)] for i in range(len(rows))]
+    columns = {name: [form[name] for _, form in rows] for name in rows[0][1]}
+    batch = calculator.calculate_batch(filing_status=statuses, state=[state for state, _ in rows], **columns)
+    for i, ((state, form), status) in enumerate(zip(rows, statuses)):
+        assert batch["tax_owed"][i] == calculator.calculate(form, status, state)["tax_owed"]
+        assert batch["state_tax_owed"][i] == calculator.calculate(form, status, state)["state_tax_owed"]
+
+def test_batch_per_row_codes_accept_any_case_and_numpy_strings():
+    calculator = TaxCalculator(tax_year=2024)
+    wages = [40000.0, 90000.0, 150000.0]
+    statuses = ["single", "head_of_household", "single"]
+    exact = calculator.calculate_batch(wages=wages, filing_status=statuses, state=["NY", "CA", "TX"])
+    mixed = calculator.calculate_batch(wages=wages, filing_status=np.array(statuses), state=["ny", "CA", "tx"])
+    assert all(np.array_equal(exact[name], mixed[name]) for name in exact)
+
+def test_batch_rejects_ragged_and_unknown_columns():
+    calculator = TaxCalculator(tax_year=2024)
+    with pytest.raises(ValueError):
+        calculator.calculate_batch(wages=[1.0, 2.0], federal_withholding=[1.0])
+    with pytest.raises(ValueError):
+        calculator.calculate_batch(wages=[1.0], lottery=[1.0])
+    with pytest.raises(ValueError):
+        calculator.calculate_batch(wages=[1.0], state="ZZ")
+    with pytest.raises(ValueError, match="Unsupported state 'ZZ'"):
+        calculator.calculate_batch(wages=[1.0, 2.0], state=["CA", "ZZ"])
+    with pytest.raises(ValueError, match="Unsupported filing status 'astronaut'"):
+        calculator.calculate_batch(wages=[1.0, 2.0], filing_status=["single", "astronaut"])
+    with pytest.raises(ValueError):
+        calculator.calculate_batch(wages=[1.0, 2.0], filing_status=["single"])
+
+def test_empty_batch():
+    result = TaxCalculator(tax_year=2024).calculate_batch(wages=[])
+    assert all(isinstance(values, np.ndarray) and values.shape == (0,) for values in result.values())
@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import create_engine, exc as sa_exc, text
+
+import database
+from database import MeteredQueuePool, PoolMetrics, pool_metrics
+
+class LocalMeteredPool(MeteredQueuePool):
+    metrics = PoolMetrics()
+
+@pytest.fixture
+def metered_engine(tmp_path):
+    LocalMeteredPool.metrics.reset()
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=LocalMeteredPool,
+                           pool_size=1, max_overflow=1, pool_timeout=0.05)
+    yield engine
+    engine.dispose()
+
+def test_metrics_count_waits_overflow_and_timeouts():
+    metrics = PoolMetrics()
+    metrics.record(2.0, overflowed=False)
+    metrics.record(4.0, overflowed=True)
+    metrics.record(50.0, overflowed=False, timed_out=True)
+    assert metrics.snapshot() == {
+        "checkouts": 2,
+        "wait_ms_total": 56.0,
+        "wait_ms_avg": 28.0,
+        "wait_ms_max": 50.0,
+        "overflow_events": 1,
+        "timeouts": 1,
+    }
+    metrics.reset()
+    assert metrics.snapshot()["checkouts"] == 0 and metrics.snapshot()["wait_ms_max"] == 0.0
+
+def test_metered_pool_records_checkouts(metered_engine):
+    metrics = LocalMeteredPool.metrics
+    first = metered_engine.connect()
+    assert (metrics.checkouts, metrics.overflow_events) == (1, 0)
+    second = metered_engine.connect()  # past pool_size, within max_overflow
+    assert (metrics.checkouts, metrics.overflow_events) == (2, 1)
+
+    with pytest.raises(sa_exc.TimeoutError):
+        metered_engine.connect()
+    assert metrics.timeouts == 1
+    assert metrics.wait_ms_max >= 40.0
+
+    second.close()
+    first.close()
+    with metered_engine.connect():  # a returned connection is reused, not an overflow
+        pass
+    assert (metrics.checkouts, metrics.overflow_events) == (3, 1)
+
+def test_db_pool_endpoint_reports_both_pools(db, admin_client):
+    db.execute(text("SELECT 1"))
+    status = admin_client.get("/api/admin/db-pool").json()
+    assert status["pool_class"] == "MeteredQueuePool"
+    assert status["pool_size"] == database.DB_POOL_SIZE
+    assert status["checkouts"] >= 1
+    assert status["async"]["pool_class"] == "MeteredAsyncQueuePool"
+
+def test_reset_endpoint_zeroes_the_counters(db, admin_client):
+    db.execute(text("SELECT 1"))
+    assert pool_metrics.checkouts >= 1
+    status = admin_client.post("/api/admin/db-pool/reset").json()
+    assert (status["checkouts"], status["timeouts"], status["wait_ms_total"]) == (0, 0, 0.0)
+    assert status["async"]["checkouts"] == 0
+
+def test_db_pool_endpoints_are_admin_only(user, admin_client):
+    from auth.routes import get_current_user
+    admin_client.app.dependency_overrides[get_current_user] = lambda: user
+    assert admin_client.get("/api/admin/db-pool").status_code == 403
+    assert admin_client.post("/api/admin/db-pool/reset").status_code == 403
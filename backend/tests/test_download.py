@@ -0,0 +1,63 @@
+import hashlib
+
+import pytest
+
+from file_service import storage
+from file_service.storage import LocalStorage, configure_storage
+from models import Document
+
+CONTENT = bytes(range(256)) * 40  # 10 KiB
+
+@pytest.fixture
+def stored_doc(db, user, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_storage", None)
+    local = configure_storage(LocalStorage(str(tmp_path / "store")))
+    key = hashlib.sha256(CONTENT).hexdigest()
+    src = tmp_path / "upload"
+    src.write_bytes(CONTENT)
+    local.put(str(src), key)
+    db.add(Document(id="doc-1", user_email=user.email, user_id=user.id, filename="w2.pdf",
+                    file_path=key, content_hash=key, content_type="application/pdf", file_size=len(CONTENT)))
+    db.commit()
+    return key
+
+def test_full_download(file_client, stored_doc):
+    response = file_client.get("/api/files/download/doc-1")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == f'"{stored_doc}"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "application/pdf"
+
+def test_range_request_returns_partial_content(file_client, stored_doc):
+    response = file_client.get("/api/files/download/doc-1", headers={"Range": "bytes=100-1123"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:1124]
+    assert response.headers["content-range"] == f"bytes 100-1123/{len(CONTENT)}"
+
+def test_suffix_range(file_client, stored_doc):
+    response = file_client.get("/api/files/download/doc-1", headers={"Range": "bytes=-16"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[-16:]
+
+def test_unsatisfiable_range(file_client, stored_doc):
+    response = file_client.get("/api/files/download/doc-1", headers={"Range": f"bytes={len(CONTENT)}-"})
+    assert response.status_code == 416
+
+@pytest.mark.parametrize("if_none_match", ['"{key}"', 'W/"{key}"', '"other", "{key}"', "*"])
+def test_matching_etag_returns_not_modified(file_client, stored_doc, if_none_match):
+    response = file_client.get("/api/files/download/doc-1",
+                               headers={"If-None-Match": if_none_match.format(key=stored_doc)})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == f'"{stored_doc}"'
+
+def test_stale_etag_downloads_again(file_client, stored_doc):
+    response = file_client.get("/api/files/download/doc-1", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+def test_other_users_document_is_not_found(db, file_client, stored_doc):
+    db.add(Document(id="doc-2", user_email="b@example.com", file_path=stored_doc, content_hash=stored_doc))
+    db.commit()
+    assert file_client.get("/api/files/download/doc-2").status_code == 404
@@ -0,0 +1,197 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, false, text
+from sqlalchemy import update as sql_update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+import database
+from models import TaxSubmission
+from tax_engine import drafts
+from tax_engine.drafts import merge_into_draft, start_draft
+from tax_engine.tax_return import TaxReturn
+
+@pytest.fixture(params=["database", "python"])
+def merge_path(request, monkeypatch):
+    """Run each test with the SQL merge (json_patch) and with the Python fallback."""
+    if request.param == "python":
+        monkeypatch.setattr(drafts, "json_merge_patch", lambda column, patch, dialect_name: None)
+    return request.param
+
+def _drafts(db, user_email="a@example.com"):
+    db.expire_all()
+    return db.query(TaxSubmission).filter_by(user_email=user_email, status="draft").all()
+
+def test_creates_draft_when_missing(db, merge_path):
+    merge_into_draft(db, "a@example.com", {"wages": "1,500", "lottery": 9}, user_id=7)
+    db.commit()
+    [draft] = _drafts(db)
+    assert draft.form_data == {"wages": 1500.0}
+    assert draft.user_id == 7
+
+def test_nothing_to_merge_creates_nothing(db, merge_path):
+    merge_into_draft(db, "a@example.com", {"lottery": 9}, None)
+    db.commit()
+    assert _drafts(db) == []
+
+def test_sequential_saves_match_parse(db, merge_path):
+    saves = [
+        {"wages": 100, "state": "NY", "filing_status": "single"},
+        {"interest_income": "25.50", "state": None},
+        {"wages": "", "filing_status": "married_filing_jointly", "unknown": "x"},
+        {"dividend_income": 3},
+    ]
+    expected = {}
+    for save in saves:
+        merge_into_draft(db, "a@example.com", save)
+        db.commit()
+        expected = TaxReturn.parse(expected, save).to_dict()
+        [draft] = _drafts(db)
+        assert draft.form_data == expected
+    assert "state" not in expected
+
+def test_later_sources_override(db, merge_path):
+    merge_into_draft(db, "a@example.com", {"wages": 1, "state": "CA"}, {"wages": 2})
+    db.commit()
+    assert _drafts(db)[0].form_data == {"wages": 2.0, "state": "CA"}
+
+def test_null_form_data_is_merged_into(db, merge_path):
+    db.add(TaxSubmission(id="d1", user_email="a@example.com", status="draft", form_data=None))
+    db.commit()
+    merge_into_draft(db, "a@example.com", {"wages": 5})
+    db.commit()
+    [draft] = _drafts(db)
+    assert draft.id == "d1"
+    assert draft.form_data == {"wages": 5.0}
+
+def test_only_the_users_draft_changes(db, merge_path):
+    db.add_all([
+        TaxSubmission(id="mine", user_email="a@example.com", status="draft", form_data={"wages": 1.0}),
+        TaxSubmission(id="filed", user_email="a@example.com", status="submitted", form_data={"wages": 1.0}),
+        TaxSubmission(id="theirs", user_email="b@example.com", status="draft", form_data={"wages": 1.0}),
+    ])
+    db.commit()
+    merge_into_draft(db, "a@example.com", {"wages": 9})
+    db.commit()
+    db.expire_all()
+    values = {row.id: row.form_data for row in db.query(TaxSubmission)}
+    assert values == {"mine": {"wages": 9.0}, "filed": {"wages": 1.0}, "theirs": {"wages": 1.0}}
+
+def test_one_draft_per_user(db):
+    db.add(TaxSubmission(id="d1", user_email="a@example.com", status="draft", form_data={}))
+    db.add(TaxSubmission(id="s1", user_email="a@example.com", status="submitted", form_data={}))
+    db.commit()
+    db.add(TaxSubmission(id="d2", user_email="a@example.com", status="draft", form_data={}))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+def test_draft_created_by_a_concurrent_save_is_merged_into(db, monkeypatch):
+    """The UPDATE misses a draft another request has just inserted; the INSERT merges into it."""
+    db.add(TaxSubmission(id="d1", user_email="a@example.com", status="draft", form_data={"wages": 1.0}))
+    db.commit()
+    monkeypatch.setattr(drafts, "update", lambda model: sql_update(model).where(false()))
+    merge_into_draft(db, "a@example.com", {"state": "CA"})
+    db.commit()
+    [draft] = _drafts(db)
+    assert draft.id == "d1"
+    assert draft.form_data == {"wages": 1.0, "state": "CA"}
+
+def test_python_merge_recovers_from_a_lost_create(db, monkeypatch):
+    monkeypatch.setattr(drafts, "json_merge_patch", lambda column, patch, dialect_name: None)
+    db.add(TaxSubmission(id="d1", user_email="a@example.com", status="draft", form_data={"wages": 1.0}))
+    db.commit()
+    real_query = db.query
+    lookups = []
+
+    def query(*entities):
+        q = real_query(*entities)
+        lookups.append(q)
+        # The first lookup runs before the other request's draft is visible
+        return q.filter(false()) if len(lookups) == 1 else q
+
+    monkeypatch.setattr(db, "query", query)
+    merge_into_draft(db, "a@example.com", {"state": "CA"})
+    db.commit()
+    monkeypatch.undo()
+    [draft] = _drafts(db)
+    assert draft.form_data == {"wages": 1.0, "state": "CA"}
+
+def test_start_draft_keeps_an_existing_draft(db):
+    start_draft(db, "a@example.com", user_id=3)
+    db.commit()
+    merge_into_draft(db, "a@example.com", {"wages": 4})
+    start_draft(db, "a@example.com", user_id=3)
+    db.commit()
+    [draft] = _drafts(db)
+    assert draft.form_data == {"wages": 4.0}
+    assert draft.user_id == 3
+
+def test_migration_merges_duplicate_drafts(db):
+    from migrations import migrate, schema_migrations
+    with database.engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_tax_submissions_user_email_draft"))
+    db.add_all([
+        TaxSubmission(id="old", user_email="a@example.com", status="draft",
+                      form_data={"wages": 1.0, "state": "CA"}, submitted_at=datetime(2024, 1, 1)),
+        TaxSubmission(id="new", user_email="a@example.com", status="draft",
+                      form_data={"wages": 2.0}, submitted_at=datetime(2024, 2, 1)),
+    ])
+    db.commit()
+    try:
+        assert "create index uq_tax_submissions_user_email_draft" in migrate(database.engine)
+    finally:
+        schema_migrations.drop(database.engine, checkfirst=True)
+    db.expire_all()
+    statuses = {row.id: (row.status, row.form_data) for row in db.query(TaxSubmission)}
+    assert statuses == {
+        "old": ("superseded", {"wages": 1.0, "state": "CA"}),
+        "new": ("draft", {"wages": 2.0, "state": "CA"}),
+    }
+
+def test_migration_merges_drafts_stored_as_raw_text(db):
+    """Before 0002_json_columns form_data can be TEXT holding JSON strings, '' or junk."""
+    from migrations import migrate, schema_migrations
+    with database.engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_tax_submissions_user_email_draft"))
+        conn.execute(text(
+            "INSERT INTO tax_submissions (id, user_email, status, form_data, submitted_at) VALUES "
+            "('t1', 'a@example.com', 'draft', '{\"wages\": 1500.0, \"state\": \"CA\"}', '2024-01-01'), "
+            "('t2', 'a@example.com', 'draft', '', '2024-02-01'), "
+            "('t3', 'a@example.com', 'draft', '{\"interest_income\": 20', '2024-03-01'), "
+            "('t4', 'a@example.com', 'draft', '{\"dividend_income\": 7}', '2024-04-01')"
+        ))
+    try:
+        migrate(database.engine)
+    finally:
+        schema_migrations.drop(database.engine, checkfirst=True)
+    db.expire_all()
+    [draft] = _drafts(db)
+    assert draft.id == "t4"
+    assert draft.form_data == {"wages": 1500.0, "state": "CA", "dividend_income": 7.0}
+
+def test_sqlite_merges_in_the_database(db):
+    db.add(TaxSubmission(id="d1", user_email="a@example.com", status="draft", form_data={"wages": 1.0}))
+    db.commit()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", record)
+    try:
+        merge_into_draft(db, "a@example.com", {"state": "CA"})
+        db.commit()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", record)
+    assert len(statements) == 1
+    assert statements[0].startswith("UPDATE tax_submissions SET form_data=json_patch(")
+    assert _drafts(db)[0].form_data == {"wages": 1.0, "state": "CA"}
+
+def test_postgres_merge_expression():
+    expr = database.json_merge_patch(TaxSubmission.form_data, {"wages": 1.0}, "postgresql")
+    sql = str(expr.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("jsonb_strip_nulls(coalesce(tax_submissions.form_data")
+    assert "||" in sql
+    assert database.json_merge_patch(TaxSubmission.form_data, {}, "mysql") is None
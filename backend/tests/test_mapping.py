@@ -0,0 +1,22 @@
+from tax_engine.mapping import combine_document_fields, map_document_to_form1040
+
+def test_map_leaves_out_fields_not_found():
+    assert map_document_to_form1040({"document_type": "1099-INT", "interest_income": 120.0}) == {
+        "interest_income": 120.0
+    }
+    assert map_document_to_form1040({"document_type": "1099-DIV", "federal_withholding": None}) == {}
+    assert map_document_to_form1040({"document_type": "W-9", "name": "Jane"}) == {}
+
+def test_map_keeps_a_real_zero():
+    fields = map_document_to_form1040({"document_type": "W-2", "wages": 50000.0, "federal_withholding": 0.0})
+    assert fields == {"wages": 50000.0, "federal_withholding": 0.0}
+
+def test_combine_sums_amounts_across_documents():
+    w2_a = {"wages": 50000.0, "federal_withholding": 5000.0}
+    w2_b = {"wages": "30,000.10", "federal_withholding": 2500}
+    nec = {"business_income": 12000.0}
+    assert combine_document_fields([w2_a, w2_b, nec, {}]) == {
+        "wages": 80000.1,
+        "federal_withholding": 7500.0,
+        "business_income": 12000.0,
+    }
@@ -0,0 +1,66 @@
+import pytest
+
+from file_service import ocr_cache as ocr_cache_module
+from file_service.ocr_cache import OcrCache, ocr_cache
+from models import OcrCacheEntry, User
+
+W2 = {"document_type": "W-2", "wages": 52000.0}
+HASH_A, HASH_B, HASH_C = "a" * 64, "b" * 64, "c" * 64
+
+@pytest.fixture
+def cache():
+    return OcrCache(maxsize=2)
+
+def test_entries_are_keyed_by_preprocessing_tier(db, cache):
+    cache.put(db, HASH_A, W2, "fast")
+    assert cache.get(db, HASH_A, "fast") == W2
+    assert cache.get(db, HASH_A, "accurate") is None
+    assert cache.get(db, HASH_A) is None  # the deployment default tier
+    assert cache.get_many(db, [HASH_A, HASH_B], "fast") == {HASH_A: W2}
+    assert (cache.hits, cache.misses) == (2, 3)
+
+def test_least_recently_used_entry_is_evicted(db, cache):
+    cache.put(db, HASH_A, W2)
+    cache.put(db, HASH_B, W2)
+    assert cache.get(db, HASH_A) == W2  # B is now the least recently used
+    cache.put(db, HASH_C, W2)
+
+    assert cache.evictions == 1
+    assert cache.get(db, HASH_B) is None
+    assert cache.get(db, HASH_A) == W2 and cache.get(db, HASH_C) == W2
+
+def test_new_extractor_version_misses_old_entries(db, cache, monkeypatch):
+    cache.put(db, HASH_A, W2)
+    old_version = ocr_cache_module.EXTRACTOR_VERSION
+    monkeypatch.setattr(ocr_cache_module, "EXTRACTOR_VERSION", "next")
+    assert cache.get(db, HASH_A) is None
+
+    cache.put(db, HASH_A, {**W2, "wages": 52001.0})
+    assert cache.get(db, HASH_A)["wages"] == 52001.0
+    versions = sorted(entry.extractor_version for entry in db.query(OcrCacheEntry))
+    assert versions == sorted([old_version, "next"])
+
+def test_stats_endpoint_reports_counters_to_admins_only(db, user, file_client, monkeypatch):
+    from auth.routes import get_current_user
+    assert file_client.get("/api/files/ocr-cache-stats").status_code == 403
+
+    for counter in ("hits", "misses", "evictions"):
+        monkeypatch.setattr(ocr_cache, counter, 0)
+    ocr_cache.put(db, HASH_A, W2)
+    ocr_cache.get(db, HASH_A)
+    ocr_cache.get(db, HASH_A)
+    ocr_cache.get(db, HASH_B)
+
+    admin = User(email="admin@example.com", name="Admin")
+    file_client.app.dependency_overrides[get_current_user] = lambda: admin
+    stats = file_client.get("/api/files/ocr-cache-stats").json()
+    assert stats == {
+        "size": 1,
+        "maxsize": ocr_cache.maxsize,
+        "extractor_version": ocr_cache_module.EXTRACTOR_VERSION,
+        "hits": 2,
+        "misses": 1,
+        "hit_rate": 0.6667,
+        "evictions": 0,
+        "total_hits": 2,
+    }
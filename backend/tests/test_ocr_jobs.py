@@ -0,0 +1,176 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import pytest
+
+from file_service import jobs
+from file_service.jobs import OcrWorker, enqueue_ocr_job
+from file_service.ocr_cache import ocr_cache
+from models import Document, OcrJob, TaxSubmission
+
+W2 = {"document_type": "W-2", "wages": 52000.0, "federal_withholding": 6100.0}
+
+class InlinePool:
+    """Runs submitted work immediately, or leaves it pending when ``hold`` is set."""
+
+    def __init__(self, hold: bool = False):
+        self.hold = hold
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.submitted.append((future, fn, args))
+        if not self.hold:
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        return future
+
+class BrokenPool:
+    """A pool whose worker process died: it refuses all new work."""
+
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        raise BrokenProcessPool("A child process terminated abruptly")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+@pytest.fixture
+def extract(monkeypatch):
+    """Stub out OCR; set ``extract.result`` to the data or exception to produce."""
+    def fake(key, content_type, tier=None):
+        fake.calls.append(key)
+        if isinstance(fake.result, Exception):
+            raise fake.result
+        return fake.result
+    fake.calls, fake.result = [], W2
+    monkeypatch.setattr(jobs, "extract_stored", fake)
+    return fake
+
+@pytest.fixture
+def worker():
+    worker = OcrWorker(workers=2)
+    worker._pool = InlinePool()
+    return worker
+
+def _queue(db, doc_id="doc-1", content_hash="a" * 64):
+    doc = Document(id=doc_id, user_email="a@example.com", file_path=content_hash, content_hash=content_hash,
+                   content_type="application/pdf", document_type="Pending")
+    db.add(doc)
+    job = enqueue_ocr_job(db, doc)
+    db.commit()
+    return job.id
+
+def _job(db, job_id):
+    db.expire_all()
+    return db.get(OcrJob, job_id)
+
+def test_dispatch_claims_and_applies_a_job(db, worker, extract):
+    job_id = _queue(db)
+    worker._dispatch()
+
+    job = _job(db, job_id)
+    assert (job.status, job.attempts, job.error) == ("done", 1, None)
+    assert job.finished_at is not None
+    doc = db.get(Document, "doc-1")
+    assert doc.document_type == "W-2" and doc.extracted_data == W2
+    draft = db.query(TaxSubmission).filter_by(user_email="a@example.com", status="draft").one()
+    assert draft.form_data == {"wages": 52000.0, "federal_withholding": 6100.0}
+    assert ocr_cache.get(db, "a" * 64, count_miss=False) == W2
+
+def test_dispatch_claims_at_most_one_job_per_free_worker(db, worker, extract):
+    worker._pool = InlinePool(hold=True)
+    job_ids = [_queue(db, f"doc-{i}", str(i) * 64) for i in range(3)]
+    worker._dispatch()
+    worker._dispatch()  # both workers busy; nothing more is claimed
+    assert [_job(db, job_id).status for job_id in job_ids] == ["running", "running", "queued"]
+    assert len(worker._pool.submitted) == 2
+
+def test_a_job_claimed_elsewhere_is_skipped(db, worker, extract):
+    job_id = _queue(db)
+    db.get(OcrJob, job_id).status = "running"
+    db.commit()
+    worker._dispatch()
+    assert extract.calls == []
+
+def test_cached_result_skips_ocr(db, worker, extract):
+    job_id = _queue(db)
+    ocr_cache.put(db, "a" * 64, W2)
+    worker._dispatch()
+    assert _job(db, job_id).status == "done"
+    assert extract.calls == []
+
+def test_failed_job_is_retried_then_marked_failed(db, worker, extract, monkeypatch):
+    monkeypatch.setattr(jobs, "OCR_MAX_ATTEMPTS", 2)
+    extract.result = RuntimeError("tesseract crashed")
+    job_id = _queue(db)
+
+    worker._dispatch()
+    job = _job(db, job_id)
+    assert (job.status, job.attempts, job.error) == ("queued", 1, "tesseract crashed")
+
+    worker._dispatch()
+    job = _job(db, job_id)
+    assert (job.status, job.attempts) == ("failed", 2)
+    assert job.finished_at is not None
+    assert db.get(Document, "doc-1").document_type == "Unknown"
+
+def test_retry_succeeds_after_a_failure(db, worker, extract):
+    extract.result = RuntimeError("timeout")
+    job_id = _queue(db)
+    worker._dispatch()
+    extract.result = W2
+    worker._dispatch()
+    job = _job(db, job_id)
+    assert (job.status, job.attempts, job.error) == ("done", 2, None)
+
+def test_cancelled_job_goes_back_to_the_queue(db, worker, extract):
+    worker._pool = InlinePool(hold=True)
+    job_id = _queue(db)
+    worker._dispatch()
+    future, _, _ = worker._pool.submitted[0]
+    future.cancel()
+    job = _job(db, job_id)
+    assert (job.status, job.attempts) == ("queued", 0)
+
+def test_stale_running_jobs_are_requeued(db, worker, monkeypatch):
+    monkeypatch.setattr(jobs, "OCR_MAX_ATTEMPTS", 3)
+    old = datetime.utcnow() - timedelta(seconds=jobs.OCR_JOB_TIMEOUT + 60)
+    db.add_all([
+        OcrJob(id="stale", document_id="d1", status="running", attempts=1, started_at=old),
+        OcrJob(id="exhausted", document_id="d2", status="running", attempts=3, started_at=old),
+        OcrJob(id="recent", document_id="d3", status="running", attempts=1, started_at=datetime.utcnow()),
+        OcrJob(id="in-flight", document_id="d4", status="running", attempts=1, started_at=old),
+    ])
+    db.commit()
+    worker._in_flight[Future()] = "in-flight"
+
+    worker._requeue_stale()
+    statuses = {job_id: _job(db, job_id).status for job_id in ("stale", "exhausted", "recent", "in-flight")}
+    assert statuses == {"stale": "queued", "exhausted": "failed", "recent": "running", "in-flight": "running"}
+    assert _job(db, "stale").error == "Worker stopped before the job finished"
+
+def test_broken_pool_is_replaced_and_the_job_requeued(db, worker, extract, monkeypatch):
+    broken = worker._pool = BrokenPool()
+    monkeypatch.setattr(worker, "_new_pool", InlinePool)
+    job_id = _queue(db)
+
+    worker._dispatch()
+    job = _job(db, job_id)
+    assert (job.status, job.attempts) == ("queued", 0)
+    assert broken.shut_down and isinstance(worker._pool, InlinePool)
+
+    worker._dispatch()
+    assert _job(db, job_id).status == "done"
+
+def test_submit_retries_on_a_fresh_pool(worker, monkeypatch):
+    worker._pool = BrokenPool()
+    monkeypatch.setattr(worker, "start", lambda: None)
+    monkeypatch.setattr(worker, "_new_pool", InlinePool)
+    assert worker.submit(len, "abc").result() == 3
+    assert isinstance(worker._pool, InlinePool)
@@ -0,0 +1,63 @@
+import pytest
+from PIL import Image, ImageDraw
+
+from file_service import preprocess as preprocess_module
+from file_service.preprocess import TIERS, get_tier, preprocess
+
+def _page(width=1700, height=2200, dpi=400):
+    """A white page with a block of dark 'text' in the middle, saved at ``dpi``."""
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    for row in range(height // 3, 2 * height // 3, 40):
+        draw.rectangle((width // 4, row, 3 * width // 4, row + 12), fill=(40, 40, 40))
+    img.info["dpi"] = (dpi, dpi)
+    return img
+
+def test_tier_selection_and_default(monkeypatch):
+    assert get_tier("fast") is TIERS["fast"]
+    monkeypatch.setattr(preprocess_module, "DEFAULT_TIER", "accurate")
+    assert get_tier() is TIERS["accurate"]
+    assert get_tier("") is TIERS["accurate"]
+
+def test_unknown_tier_is_an_error():
+    with pytest.raises(ValueError, match="Unknown preprocessing tier 'sharpest'"):
+        get_tier("sharpest")
+
+def test_unknown_tier_on_upload_is_a_bad_request(file_client):
+    response = file_client.post("/api/files/upload?preprocess=sharpest",
+                                files={"file": ("w2.pdf", b"%PDF", "application/pdf")})
+    assert response.status_code == 400
+
+def test_fast_tier_downscales_and_binarizes():
+    timings = {}
+    page = _page()
+    cleaned = preprocess(page, TIERS["fast"], timings)
+    assert cleaned.mode == "L"
+    assert cleaned.width == 1700 * 200 // 400
+    assert sum(cleaned.histogram()[1:255]) == 0  # only black and white left
+    assert set(timings) == set(TIERS["fast"].stages)
+    assert all(ms >= 0 for ms in timings.values())
+    assert page.mode == "RGB"  # the caller's image is left alone
+
+def test_none_tier_returns_the_page_unchanged():
+    page, timings = _page(), {}
+    assert preprocess(page, TIERS["none"], timings) is page
+    assert timings == {}
+
+def test_timings_accumulate_across_pages():
+    timings = {}
+    preprocess(_page(), TIERS["balanced"], timings)
+    first = dict(timings)
+    preprocess(_page(), TIERS["balanced"], timings)
+    assert set(timings) == {"grayscale", "downscale"}
+    assert all(timings[stage] >= first[stage] for stage in timings)
+
+def test_accurate_tier_crops_unless_geometry_is_kept():
+    page = _page(width=850, height=1100, dpi=100)
+    cropped = preprocess(page, TIERS["accurate"])
+    assert cropped.width < page.width and cropped.height < page.height
+
+    timings = {}
+    kept = preprocess(page, TIERS["accurate"], timings, keep_geometry=True)
+    assert kept.size == page.size
+    assert "crop" not in timings
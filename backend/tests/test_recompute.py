@@ -0,0 +1,72 @@
+import pytest
+
+from models import TaxSubmission
+from tax_engine.calculator import TaxCalculator
+from tax_engine.recompute import recompute_chunk, run_recompute
+
+FORM = {"wages": 60000.0, "federal_withholding": 9000.0}
+
+def _expected(year, filing_status="single", state="CA"):
+    result = TaxCalculator(tax_year=year).calculate(FORM, filing_status, state)
+    return result["tax_owed"], result["refund_amount"]
+
+def test_chunk_prices_each_row_under_its_own_year():
+    updates, failures = recompute_chunk([
+        ("s-2024", FORM, "single", "CA", 2024),
+        ("s-2023", FORM, "Single", "ca", 2023),
+        ("s-mfj", FORM, "married_filing_jointly", "NY", 2024),
+    ])
+    assert failures == []
+    priced = {u["id"]: (u["tax_owed"], u["refund_amount"]) for u in updates}
+    assert priced == {
+        "s-2024": _expected(2024),
+        "s-2023": _expected(2023),
+        "s-mfj": _expected(2024, "married_filing_jointly", "NY"),
+    }
+    assert priced["s-2023"] != priced["s-2024"]
+
+def test_chunk_reports_rows_it_cannot_price():
+    updates, failures = recompute_chunk([
+        ("ok", FORM, "single", "CA", 2024),
+        ("no-status", FORM, None, "CA", 2024),
+        ("no-state", FORM, "single", None, 2024),
+        ("no-year", FORM, "single", "CA", None),
+        ("bad-year", FORM, "single", "CA", 1990),
+        ("bad-state", FORM, "single", "ZZ", 2024),
+    ])
+    assert [u["id"] for u in updates] == ["ok"]
+    assert [f["id"] for f in failures] == ["no-status", "no-state", "no-year", "bad-year", "bad-state"]
+    assert failures[0]["error"] == "Submission has no filing status"
+
+def _submission(db, submission_id, status="submitted", tax_year=2024):
+    db.add(TaxSubmission(id=submission_id, user_email=f"{submission_id}@example.com", form_data=FORM,
+                         status=status, filing_status="single", state="CA", tax_year=tax_year,
+                         tax_owed=0.0, refund_amount=0.0))
+
+def _priced(db):
+    db.expire_all()
+    return {s.id: (s.tax_owed, s.refund_amount) for s in db.query(TaxSubmission)}
+
+def test_run_recompute_updates_submitted_returns_only(db):
+    _submission(db, "a")
+    _submission(db, "b", tax_year=2023)
+    _submission(db, "draft", status="draft")
+    db.commit()
+
+    progress = run_recompute(chunk_size=1, workers=1)
+    assert (progress.status, progress.total, progress.processed, progress.failed) == ("done", 2, 2, 0)
+    assert _priced(db) == {"a": _expected(2024), "b": _expected(2023), "draft": (0.0, 0.0)}
+
+@pytest.mark.parametrize("kwargs, repriced", [
+    ({"tax_year": 2023}, {"b"}),
+    ({"statuses": ["submitted", "draft"]}, {"a", "b", "draft"}),
+])
+def test_run_recompute_filters(db, kwargs, repriced):
+    _submission(db, "a")
+    _submission(db, "b", tax_year=2023)
+    _submission(db, "draft", status="draft")
+    db.commit()
+
+    progress = run_recompute(chunk_size=2, workers=1, **kwargs)
+    assert progress.status == "done"
+    assert {i for i, priced in _priced(db).items() if priced != (0.0, 0.0)} == repriced
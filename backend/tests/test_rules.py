@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pytest
+
+from tax_engine import rules
+from tax_engine.rules import (
+    available_rule_packs, compile_rule_pack, get_rule_pack, load_rule_packs, normalize_filing_status,
+)
+
+FILING_STATUSES = ["head_of_household", "married_filing_jointly", "married_filing_separately",
+                   "qualifying_widow", "single"]
+
+def test_both_years_load_every_filing_status():
+    packs = available_rule_packs()
+    assert packs[2023] == FILING_STATUSES
+    assert packs[2024] == FILING_STATUSES
+
+@pytest.mark.parametrize("year, status, deduction, first_bracket_top", [
+    (2023, "single", 13850, 11000),
+    (2024, "single", 14600, 11600),
+    (2024, "married_filing_jointly", 29200, 23200),
+])
+def test_pack_values(year, status, deduction, first_bracket_top):
+    pack = get_rule_pack(year, status)
+    assert pack.year == year and pack.filing_status == status
+    assert pack.version.startswith(f"{year}-")
+    assert pack.standard_deduction == deduction
+    assert pack.brackets[0].lower == 0 and pack.brackets[0].upper == first_bracket_top
+    assert pack.brackets[-1].upper == float("inf")
+
+def test_bracket_bases_accumulate_lower_brackets():
+    pack = get_rule_pack(2024, "single")
+    for previous, bracket in zip(pack.brackets, pack.brackets[1:]):
+        assert bracket.base == pytest.approx(previous.base + (bracket.lower - previous.lower) * previous.rate)
+    assert pack.tax(0) == 0.0
+    assert pack.tax(11600) == 1160.0
+    assert pack.tax(20000) == 1160.0 + round((20000 - 11600) * 0.12, 2)
+
+def test_years_differ():
+    assert get_rule_pack(2023, "single").tax(100000) != get_rule_pack(2024, "single").tax(100000)
+
+def test_tax_batch_matches_tax():
+    pack = get_rule_pack(2023, "head_of_household")
+    taxable = np.array([-5.0, 0.0, 15700.0, 59850.0, 123456.78, 2_000_000.0])
+    assert pack.tax_batch(taxable).tolist() == [pack.tax(float(x)) for x in taxable]
+
+def test_phaseout_multiplier():
+    pack = get_rule_pack(2024, "single")
+    start, end = pack.phaseouts["student_loan_interest"]
+    assert pack.phaseout_multiplier("student_loan_interest", start) == 1.0
+    assert pack.phaseout_multiplier("student_loan_interest", (start + end) / 2) == 0.5
+    assert pack.phaseout_multiplier("student_loan_interest", end) == 0.0
+    assert pack.phaseout_multiplier("student_loan_interest", np.array([start, end])).tolist() == [1.0, 0.0]
+    assert pack.phaseout_multiplier("no_such_benefit", 10**9) == 1.0
+
+def test_unknown_year_and_status():
+    with pytest.raises(ValueError, match="year 1999"):
+        get_rule_pack(1999, "single")
+    with pytest.raises(ValueError, match="filing status"):
+        get_rule_pack(2024, "Single")
+
+@pytest.mark.parametrize("value, expected", [
+    ("Single", "single"),
+    ("Married Filing Jointly", "married_filing_jointly"),
+    ("  head-of-household ", "head_of_household"),
+])
+def test_normalize_filing_status(value, expected):
+    assert normalize_filing_status(value) == expected
+
+def test_brackets_must_start_at_zero():
+    with pytest.raises(ValueError, match="start at 0"):
+        compile_rule_pack(2024, "single", {"standard_deduction": 0, "brackets": [[100, 0.1]]}, "v")
+
+def test_new_year_file_is_picked_up_on_first_use(tmp_path, monkeypatch):
+    spec = {"year": 2031, "filing_statuses": {"single": {"standard_deduction": 1000, "brackets": [[0, 0.2]]}}}
+    (tmp_path / "2031.json").write_text(json.dumps(spec))
+    monkeypatch.setattr(rules, "RULES_DIR", str(tmp_path))
+    monkeypatch.setattr(rules, "_packs", dict(rules._packs))
+    monkeypatch.setattr(rules, "_loaded_years", set(rules._loaded_years))
+    assert get_rule_pack(2031, "single").tax(5000) == 1000.0
+    assert load_rule_packs(str(tmp_path)) == [2031]
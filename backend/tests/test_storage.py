@@ -0,0 +1,180 @@
+import hashlib
+import os
+
+import pytest
+
+from file_service import storage
+from file_service.storage import (
+    LocalStorage, S3Storage, acquire, configure_storage, discard_unreferenced, ensure_stored, release, shard_path,
+)
+from models import Document, StoredObject
+
+@pytest.fixture
+def local(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_storage", None)
+    return configure_storage(LocalStorage(str(tmp_path / "store")))
+
+def _upload(local, data: bytes):
+    """Write ``data`` to a temp file and store it; returns (key, temp path)."""
+    key = hashlib.sha256(data).hexdigest()
+    src = os.path.join(local.temp_dir(), f"{key}.upload")
+    with open(src, "wb") as f:
+        f.write(data)
+    local.put(src, key)
+    return key, src
+
+def _refcount(db, key):
+    db.expire_all()
+    row = db.get(StoredObject, key)
+    return row.refcount if row else None
+
+def test_objects_are_sharded_by_hash(local):
+    key, _ = _upload(local, b"w2")
+    assert local.local_path(key) == os.path.join(local.root, shard_path(key))
+    assert shard_path(key) == f"{key[:2]}/{key[2:4]}/{key}"
+    assert local.exists(key)
+
+def test_acquire_counts_references(db, local):
+    key, _ = _upload(local, b"same bytes")
+    acquire(db, key, 10)
+    acquire(db, key, 10)
+    db.commit()
+    assert _refcount(db, key) == 2
+
+def test_shared_object_survives_until_the_last_release(db, local):
+    key, _ = _upload(local, b"shared")
+    acquire(db, key, 6)
+    acquire(db, key, 6)
+    db.commit()
+
+    assert release(db, key) is False
+    assert _refcount(db, key) == 1
+    assert local.exists(key)
+
+    assert release(db, key) is True
+    assert _refcount(db, key) is None
+    assert not local.exists(key)
+
+def test_release_of_a_legacy_path_deletes_it(db, local, tmp_path):
+    legacy = tmp_path / "uploads" / "1234_w2.pdf"
+    legacy.parent.mkdir()
+    legacy.write_bytes(b"old")
+    assert release(db, str(legacy)) is True
+    assert not legacy.exists()
+
+def test_ensure_stored_restores_an_object_deleted_by_a_concurrent_release(db, local):
+    key, src = _upload(local, b"raced")
+    acquire(db, key, 5)
+    db.commit()
+    local.delete(key)  # a release of the previous last reference won the race
+    ensure_stored(src, key)
+    assert local.exists(key)
+    assert not os.path.exists(src)
+
+def test_discard_unreferenced_keeps_referenced_objects(db, local):
+    kept, kept_src = _upload(local, b"referenced")
+    acquire(db, kept, 10)
+    db.commit()
+    dropped, dropped_src = _upload(local, b"failed upload")
+
+    discard_unreferenced(db, kept, kept_src)
+    discard_unreferenced(db, dropped, dropped_src)
+    assert local.exists(kept)
+    assert not local.exists(dropped)
+    assert not os.path.exists(kept_src) and not os.path.exists(dropped_src)
+
+def test_deleting_one_of_two_documents_keeps_the_shared_file(db, local, user, file_client):
+    key, _ = _upload(local, b"one W-2 uploaded twice")
+    for doc_id in ("doc-1", "doc-2"):
+        db.add(Document(id=doc_id, user_email=user.email, user_id=user.id, file_path=key, content_hash=key))
+        acquire(db, key, 22)
+    db.commit()
+
+    assert file_client.delete("/api/files/doc-1").status_code == 200
+    assert _refcount(db, key) == 1
+    assert local.exists(key)
+
+    assert file_client.delete("/api/files/doc-2").status_code == 200
+    assert _refcount(db, key) is None
+    assert not local.exists(key)
+    assert file_client.delete("/api/files/doc-2").status_code == 404
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+class FakeS3Client:
+    """The boto3 S3 client calls S3Storage makes, backed by a dict."""
+
+    def __init__(self):
+        self.objects = {}
+        self.presigned = []
+
+    def upload_file(self, src_path, bucket, key):
+        with open(src_path, "rb") as f:
+            self.objects[(bucket, key)] = f.read()
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def head_object(self, Bucket, Key):
+        if Key == "documents/denied":
+            raise ClientError("403")
+        if (Bucket, Key) not in self.objects:
+            raise ClientError("404")
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def download_file(self, bucket, key, dest_path):
+        with open(dest_path, "wb") as f:
+            f.write(self.objects[(bucket, key)])
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        self.presigned.append((operation, Params, ExpiresIn))
+        return f"https://s3.example.com/{Params['Bucket']}/{Params['Key']}?signed"
+
+@pytest.fixture
+def s3():
+    return S3Storage(FakeS3Client(), "docs", prefix="documents/")
+
+def test_s3_put_exists_delete(s3, tmp_path):
+    key = hashlib.sha256(b"w2").hexdigest()
+    src = tmp_path / "upload"
+    src.write_bytes(b"w2")
+    s3.put(str(src), key)
+    assert s3.client.objects == {("docs", f"documents/{shard_path(key)}"): b"w2"}
+    assert src.exists()  # the caller keeps its temp file
+    assert s3.exists(key)
+
+    s3.delete(key)
+    assert not s3.exists(key)
+    s3.delete(key)  # already gone
+
+def test_s3_exists_raises_other_errors(s3):
+    with pytest.raises(ClientError):
+        s3.exists("denied")
+
+def test_s3_local_copy_is_a_temporary_download(s3):
+    key = hashlib.sha256(b"1099").hexdigest()
+    s3.client.objects[("docs", f"documents/{shard_path(key)}")] = b"1099"
+    with s3.local_copy(key) as path:
+        with open(path, "rb") as f:
+            assert f.read() == b"1099"
+    assert not os.path.exists(path)
+
+@pytest.mark.parametrize("filename, disposition", [
+    ("w2.pdf", 'inline; filename="w2.pdf"'),
+    ('w2"; x=".pdf', "inline; filename*=utf-8''w2%22%3B%20x%3D%22.pdf"),
+    ("reçu 2024.pdf", "inline; filename*=utf-8''re%C3%A7u%202024.pdf"),
+])
+def test_s3_url_encodes_the_filename(s3, filename, disposition):
+    key = "a" * 64
+    assert s3.url(key, filename, "application/pdf") == f"https://s3.example.com/docs/documents/{shard_path(key)}?signed"
+    operation, params, expires = s3.client.presigned[-1]
+    assert operation == "get_object" and expires == storage.S3_URL_EXPIRES
+    assert params == {
+        "Bucket": "docs",
+        "Key": f"documents/{shard_path(key)}",
+        "ResponseContentDisposition": disposition,
+        "ResponseContentType": "application/pdf",
+    }
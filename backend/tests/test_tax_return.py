@@ -0,0 +1,90 @@
+import pytest
+
+from tax_engine.tax_return import TaxReturn, build_return_model, parse_amount
+
+def merge_patch(target, patch):
+    """RFC 7396 merge of a flat patch, as json_patch / jsonb || + strip_nulls apply it."""
+    merged = dict(target)
+    for key, value in patch.items():
+        if value is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = value
+    return merged
+
+@pytest.mark.parametrize("value, expected", [
+    (1234.5, 1234.5),
+    (12, 12.0),
+    ("1,234.50", 1234.5),
+    ("$ 99", 99.0),
+    ("-.5", -0.5),
+    ("", 0.0),
+    (None, 0.0),
+    ("12abc", 0.0),
+    ([1], 0.0),
+    (True, 0.0),
+    (False, 0.0),
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+def test_parse_later_sources_override():
+    ret = TaxReturn.parse({"wages": "100", "state": "CA"}, None, {"wages": 250})
+    assert ret.wages == 250.0
+    assert ret.state == "CA"
+
+def test_parse_drops_unknown_keys():
+    ret = TaxReturn.parse({"wages": 10, "lottery": 1_000_000, "__class__": "x"})
+    assert ret.to_dict() == {"wages": 10.0}
+    assert not hasattr(ret, "lottery")
+
+def test_to_dict_only_has_set_fields():
+    ret = TaxReturn(wages="5", filing_status="single")
+    assert ret.to_dict() == {"wages": 5.0, "filing_status": "single"}
+    assert TaxReturn().to_dict() == {}
+
+def test_slots_reject_unknown_attributes():
+    ret = TaxReturn()
+    with pytest.raises(AttributeError):
+        ret.lottery = 1
+
+def test_patch_keeps_only_template_fields():
+    patch = TaxReturn.patch({"wages": "1,000", "lottery": 5}, {"state": None, "interest_income": True})
+    assert patch == {"wages": 1000.0, "state": None, "interest_income": 0.0}
+
+def test_patch_of_nothing_is_empty():
+    assert TaxReturn.patch() == {}
+    assert TaxReturn.patch(None, {}, {"unknown": 1}) == {}
+
+@pytest.mark.parametrize("stored, sources", [
+    ({}, [{"wages": 10}]),
+    ({"wages": 10.0, "state": "NY"}, [{"state": None}]),
+    ({"wages": 10.0, "state": "NY"}, [{"wages": ""}, {"state": "CA", "other": 1}]),
+    ({"filing_status": "single"}, [{"filing_status": "married_filing_jointly"}, {"filing_status": None}]),
+    ({"wages": 10.0}, [{"name": 123}]),
+])
+def test_patch_merges_like_parse(stored, sources):
+    expected = TaxReturn.parse(stored, *sources).to_dict()
+    assert merge_patch(stored, TaxReturn.patch(*sources)) == expected
+
+def test_update_and_fill_from():
+    base = TaxReturn.parse({"wages": 100, "state": "CA"})
+    base.update(TaxReturn.parse({"state": "NY"}))
+    assert base.to_dict() == {"wages": 100.0, "state": "NY"}
+
+    ret = TaxReturn.parse({"wages": 0, "interest_income": 5})
+    ret.fill_from(TaxReturn.parse({"wages": 70, "interest_income": 9, "dividend_income": 3}))
+    assert ret.to_dict() == {"wages": 70.0, "interest_income": 5.0, "dividend_income": 3.0}
+
+def test_build_return_model_from_templates():
+    model = build_return_model({
+        "a": {"fields": [{"name": "amount", "type": "number"}, {"name": "note", "type": "text"}]},
+        "b": {"fields": [{"name": "amount", "type": "text"}]},
+    }, name="Small")
+    assert model.NUMBER_FIELDS == ("amount",)
+    assert "note" in model.TEXT_FIELDS and "filing_status" in model.TEXT_FIELDS
+    assert model.parse({"amount": "3", "note": 4}).to_dict() == {"amount": 3.0, "note": "4"}
+
+def test_build_return_model_rejects_bad_field_names():
+    with pytest.raises(ValueError):
+        build_return_model({"a": {"fields": [{"name": "not valid", "type": "number"}]}})
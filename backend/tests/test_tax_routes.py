@@ -0,0 +1,93 @@
+import pytest
+
+from tax_engine import routes
+from tax_engine.cache import result_cache
+from tax_engine.calculator import TaxCalculator
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    result_cache.clear()
+    yield
+    result_cache.clear()
+
+def _calculate(client, **body):
+    response = client.post("/api/tax/calculate", json={"form_1040": {"wages": 85000, "federal_withholding": 9000},
+                                                      **body})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+@pytest.mark.parametrize("spelling, status", [
+    ("Single", "single"),
+    ("Married Filing Jointly", "married_filing_jointly"),
+    ("head-of-household", "head_of_household"),
+])
+def test_calculate_accepts_stored_filing_status_spellings(tax_client, spelling, status):
+    result = _calculate(tax_client, filing_status=spelling, state="NY")
+    expected = TaxCalculator().calculate({"wages": 85000, "federal_withholding": 9000}, status, "NY")
+    assert result["filing_status"] == status
+    assert result["tax_owed"] == expected["tax_owed"]
+    assert result["state_tax_owed"] == expected["state_tax_owed"]
+
+def test_calculate_reports_the_state_rules_year_used(tax_client):
+    result = _calculate(tax_client)
+    assert (result["tax_year"], result["state_tax_year"]) == (2024, 2024)
+    # Only 2024 state schedules exist, so a 2023 return says so
+    result = _calculate(tax_client, tax_year=2023)
+    assert (result["tax_year"], result["state_tax_year"]) == (2023, 2024)
+
+def test_unknown_filing_status_is_a_bad_request(tax_client):
+    response = tax_client.post("/api/tax/calculate", json={"filing_status": "Astronaut"})
+    assert response.status_code == 400
+
+def test_repeated_calculation_is_served_from_the_cache(tax_client):
+    first = _calculate(tax_client)
+    hits = result_cache.hits
+    assert _calculate(tax_client, filing_status="Single") == first
+    assert result_cache.hits == hits + 1
+
+def test_saving_the_draft_changes_the_result(tax_client):
+    before = _calculate(tax_client)
+    response = tax_client.post("/api/tax/save-form",
+                               json={"form_type": "1040", "form_data": {"interest_income": 4000}})
+    assert response.status_code == 200
+    after = _calculate(tax_client)
+    assert after["total_income"] == before["total_income"] + 4000
+    assert after["auto_populated_data"] == {"interest_income": 4000.0}
+
+def _sweep(client, deltas, **body):
+    return client.post("/api/tax/calculate-sweep", json={
+        "form_1040": {"wages": 85000, "federal_withholding": 9000}, "state": "NY", "deltas": deltas, **body
+    })
+
+def test_sweep_expands_the_grid_in_field_order(tax_client):
+    deltas = {"wages": [0, 10000, -5000], "mortgage_interest": [0, 20000]}
+    response = _sweep(tax_client, deltas, filing_status="Married Filing Jointly")
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["fields"] == ["wages", "mortgage_interest"]
+    assert body["shape"] == [3, 2]
+    assert body["base"]["wages"] == 85000.0
+
+    calculator = TaxCalculator()
+    for i, wage_delta in enumerate(deltas["wages"]):
+        for j, mortgage in enumerate(deltas["mortgage_interest"]):
+            form = {"wages": 85000 + wage_delta, "federal_withholding": 9000, "mortgage_interest": mortgage}
+            expected = calculator.calculate(form, "married_filing_jointly", "NY")
+            assert body["tax_owed"][i][j] == expected["tax_owed"]
+            assert body["state_tax_owed"][i][j] == expected["state_tax_owed"]
+            assert body["refund_amount"][i][j] == expected["refund_amount"]
+
+def test_sweep_over_the_point_cap_is_refused(tax_client, monkeypatch):
+    monkeypatch.setattr(routes, "MAX_SWEEP_POINTS", 20)
+    assert _sweep(tax_client, {"wages": list(range(5)), "interest_income": list(range(4))}).status_code == 200
+    response = _sweep(tax_client, {"wages": list(range(5)), "interest_income": list(range(5))})
+    assert response.status_code == 413
+
+@pytest.mark.parametrize("deltas", [
+    {"lottery_winnings": [0, 100]},
+    {"wages": [0, 100], "state_code": [1]},
+    {},
+    {"wages": []},
+])
+def test_sweep_rejects_unknown_or_empty_fields(tax_client, deltas):
+    assert _sweep(tax_client, deltas).status_code == 400
@@ -0,0 +1,115 @@
+import hashlib
+import os
+from concurrent.futures import Future
+
+import pytest
+
+from file_service import routes, storage
+from file_service.jobs import ocr_worker
+from file_service.ocr_cache import ocr_cache
+from file_service.storage import LocalStorage, configure_storage
+from models import Document, StoredObject, TaxSubmission
+
+W2_A, W2_B = b"w2 from employer a", b"w2 from employer b"
+EXTRACTED = {
+    hashlib.sha256(W2_A).hexdigest(): {"document_type": "W-2", "wages": 50000.0, "federal_withholding": 5000.0},
+    hashlib.sha256(W2_B).hexdigest(): {"document_type": "W-2", "wages": 30000.0, "federal_withholding": 2500.0},
+}
+
+@pytest.fixture
+def local(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_storage", None)
+    return configure_storage(LocalStorage(str(tmp_path / "store")))
+
+@pytest.fixture
+def ocr(monkeypatch):
+    """Run batch extraction inline, answering from EXTRACTED by storage key."""
+    def submit(fn, key, content_type, tier=None):
+        submit.calls.append(key)
+        future = Future()
+        future.set_result(EXTRACTED[key])
+        return future
+    submit.calls = []
+    monkeypatch.setattr(ocr_worker, "submit", submit)
+    return submit
+
+def _files(*contents):
+    return [("files", (f"w2-{i}.pdf", data, "application/pdf")) for i, data in enumerate(contents)]
+
+def _draft(db):
+    db.expire_all()
+    return db.query(TaxSubmission).filter_by(user_email="a@example.com", status="draft").one().form_data
+
+def test_batch_counts_a_duplicate_file_once(db, file_client, local, ocr):
+    response = file_client.post("/api/files/upload-batch", files=_files(W2_A, W2_A, W2_B))
+    assert response.status_code == 200
+    assert len(response.json()["documents"]) == 3
+    assert len(ocr.calls) == 2
+    totals = {"wages": 80000.0, "federal_withholding": 7500.0}
+    assert response.json()["auto_populated_fields"] == totals
+    assert _draft(db) == totals
+
+def test_upload_and_batch_give_the_same_draft(db, file_client, local, ocr):
+    for key, data in EXTRACTED.items():
+        ocr_cache.put(db, key, data)
+
+    response = file_client.post("/api/files/upload", files={"file": ("w2.pdf", W2_A, "application/pdf")})
+    assert response.json()["auto_populated_fields"] == {"wages": 50000.0, "federal_withholding": 5000.0}
+    assert _draft(db) == {"wages": 50000.0, "federal_withholding": 5000.0}
+
+    # W2_A is already on the draft, so only W2_B adds to it
+    file_client.post("/api/files/upload-batch", files=_files(W2_A, W2_B))
+    assert _draft(db) == {"wages": 80000.0, "federal_withholding": 7500.0}
+
+    file_client.post("/api/files/upload", files={"file": ("again.pdf", W2_B, "application/pdf")})
+    assert _draft(db) == {"wages": 80000.0, "federal_withholding": 7500.0}
+
+@pytest.mark.parametrize("failing", ["get_many", "submit"])
+def test_batch_discards_stored_files_when_extraction_fails_to_start(db, file_client, local, ocr, monkeypatch, failing):
+    def boom(*args, **kwargs):
+        raise RuntimeError("unavailable")
+    monkeypatch.setattr(ocr_cache if failing == "get_many" else ocr_worker, failing, boom)
+
+    with pytest.raises(RuntimeError):
+        file_client.post("/api/files/upload-batch", files=_files(W2_A, W2_B))
+    assert not any(local.exists(key) for key in EXTRACTED)
+    assert os.listdir(local.temp_dir()) == []
+    assert db.query(StoredObject).count() == 0
+    assert db.query(Document).count() == 0
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """Record multipart parses, to check an oversized body is refused without one."""
+    from starlette.formparsers import MultiPartParser
+    parse = MultiPartParser.parse
+
+    async def spy(self):
+        spy.calls += 1
+        return await parse(self)
+    spy.calls = 0
+    monkeypatch.setattr(MultiPartParser, "parse", spy)
+    return spy
+
+def test_declared_length_over_the_limit_is_refused_before_parsing(db, file_client, local, parsed, monkeypatch):
+    monkeypatch.setattr(routes.upload_file, "max_body_bytes", 1024)
+    response = file_client.post("/api/files/upload", files={"file": ("big.pdf", b"x" * 4096, "application/pdf")})
+    assert response.status_code == 413
+    assert parsed.calls == 0
+    assert db.query(Document).count() == 0
+
+def test_body_without_a_length_is_cut_off_at_the_limit(db, file_client, local, monkeypatch):
+    monkeypatch.setattr(routes.upload_batch, "max_body_bytes", 1024)
+    body = (b"--b\r\nContent-Disposition: form-data; name=\"files\"; filename=\"big.pdf\"\r\n"
+            b"Content-Type: application/pdf\r\n\r\n" + b"x" * 4096 + b"\r\n--b--\r\n")
+    response = file_client.post("/api/files/upload-batch", content=iter([body]),
+                                headers={"Content-Type": "multipart/form-data; boundary=b"})
+    assert "content-length" not in response.request.headers
+    assert response.status_code == 413
+    assert db.query(Document).count() == 0
+
+def test_file_over_the_per_file_limit_leaves_nothing_behind(db, file_client, local, monkeypatch):
+    monkeypatch.setattr(routes, "MAX_UPLOAD_BYTES", 1024)
+    response = file_client.post("/api/files/upload-batch", files=_files(W2_A, b"x" * 4096))
+    assert response.status_code == 413
+    assert os.listdir(local.temp_dir()) == []
+    assert db.query(StoredObject).count() == 0